@@ -0,0 +1,152 @@
+""" Host check (CPython, no network) that a 1 Hz display task keeps its cadence while AsyncLazyRequest reads a slow
+    response, as AsyncLL2Sync.update_launch_data() does. A local server dribbles a detailed LL2 response (with
+    Content-Length, and chunked, both also gzip-encoded) over several seconds. Meanwhile the display task records how late
+    each of its ticks is. The launches must equal those parsed from the file, and no tick may be later than <tolerance> seconds.
+    Then a keep-alive server answers three requests: the second must reuse the pooled connection (medea.asyncPool), and
+    the third, after the server closed it, must reconnect. Last, an image is read with AsyncLazyRequest.read() without a
+    pool, as CountdownClock.fetch_flag() does: its bytes must arrive intact, and a body that is cut off must raise OSError.
+    Usage: python bench/async_cadence.py [--rate 4000] [--tolerance 0.1]
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "..")) # Appended, so lib/zlib.py does not shadow the standard library
+sys.path.append(os.path.join(HERE, "..", "lib"))
+os.environ["TZ"] = "UTC" # utils.iso8601_to_unix() relies on time.mktime() using UTC, like on MicroPython
+time.tzset()
+
+import medea
+from launch import LaunchParser
+
+FIXTURE = os.path.join(HERE, "fixtures", "upcoming_normal.json")
+
+
+def chunked(data, size): # <data> with "Transfer-Encoding: chunked"
+    parts = [b"%x\r\n" % len(data[i:i + size]) + data[i:i + size] + b"\r\n" for i in range(0, len(data), size)]
+    return b"".join(parts) + b"0\r\n\r\n"
+
+async def serve(reader, writer, response, rate): # Sends <response> at <rate> bytes/s, in pieces of 256 bytes
+    while (await reader.readline()) not in (b"\r\n", b""): pass
+    try:
+        for i in range(0, len(response), 256):
+            if reader.at_eof(): # Client closed the connection early
+                break
+            writer.write(response[i:i + 256])
+            await writer.drain()
+            await asyncio.sleep(256/rate)
+    except ConnectionError: # Client stopped reading early
+        pass
+    writer.close()
+
+async def display(ticks): # Ticks at whole seconds like CountdownClock.show(), recording how late every tick is
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    n = 0
+    while True:
+        n += 1
+        await asyncio.sleep(start + n - loop.time())
+        ticks.append(loop.time() - (start + n))
+
+async def fetch(url, count): # Parses the launches of the response like AsyncLL2Sync.update_launch_data()
+    request = await medea.AsyncLazyRequest(url, timeout=5.0).open()
+    t = time.perf_counter()
+    launches = await request.drive(LaunchParser().steps(request.tokenize(lazy=True), count=count))
+    return launches, time.perf_counter() - t, request.bytes_saved
+
+async def fetch_body(url): # Reads the body as is, like CountdownClock.fetch_flag()
+    request = await medea.AsyncLazyRequest(url, timeout=5.0, pool=None).open()
+    t = time.perf_counter()
+    return await request.read(), time.perf_counter() - t, request.bytes_saved
+
+async def check(name, response, rate, count, expected, tolerance):
+    handlers = []
+    server = await asyncio.start_server(lambda r, w: handlers.append(asyncio.create_task(serve(r, w, response, rate))), "127.0.0.1", 0)
+    url = "http://127.0.0.1:%d/launches/" % server.sockets[0].getsockname()[1]
+    ticks = []
+    task = asyncio.create_task(display(ticks))
+    try:
+        if count == "body": # <expected> are the bytes of the body, or OSError if it is cut off
+            result, dt, saved = await fetch_body(url)
+            ok = result == expected
+        else:
+            launches, dt, saved = await fetch(url, count)
+            ok = [l.to_list() for l in launches] == expected
+    except OSError as e:
+        dt, saved, ok = 0., None, expected is OSError
+    task.cancel()
+    await asyncio.wait(handlers) # The server notices when the client stopped reading early
+    server.close()
+    late = max(ticks) if ticks else 0.
+    print(f"    {name:22s} {dt:5.2f} s, {len(ticks)} display ticks, latest {late*1e3:6.1f} ms, bytes saved {saved}, {'body' if count == 'body' else 'launches'} {'ok' if ok else 'DIFFER'}")
+    return ok and late <= tolerance and len(ticks) >= int(dt) - 1
+
+async def keepalive(response, expected): # Three requests to a server that keeps the connection open for two responses
+    connections = []
+    async def serve_two(reader, writer):
+        connections.append(writer)
+        for i in range(2):
+            while (line := await reader.readline()) not in (b"\r\n", b""): pass
+            if not line: break
+            writer.write(response)
+            await writer.drain()
+        writer.close()
+    server = await asyncio.start_server(serve_two, "127.0.0.1", 0)
+    url = "http://127.0.0.1:%d/launches/" % server.sockets[0].getsockname()[1]
+    hits, misses = medea.asyncPool.hits, medea.asyncPool.misses
+    ok = True
+    for i in range(3):
+        launches, dt, saved = await fetch(url, None)
+        ok = ok and [l.to_list() for l in launches] == expected
+        await asyncio.sleep(0.05) # The server closes the connection after its second response
+    medea.asyncPool.close()
+    await asyncio.sleep(0.05) # The server sees the pooled connection close
+    server.close()
+    hits, misses = medea.asyncPool.hits - hits, medea.asyncPool.misses - misses
+    print(f"    {'keep-alive':22s} 3 requests over {len(connections)} connections, pool hits/misses {hits}/{misses}, launches {'ok' if ok else 'DIFFER'}")
+    return ok and len(connections) == 2 and (hits, misses) == (1, 2)
+
+
+async def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--rate", type=float, default=4000, help="bytes per second sent by the server")
+    argparser.add_argument("--tolerance", type=float, default=0.1, help="maximal lateness of a display tick in seconds")
+    args = argparser.parse_args()
+
+    with open(FIXTURE, "rb") as f:
+        body = f.read()
+    expected = [l.to_list() for l in LaunchParser().parse(medea.tokenizeFile(FIXTURE), skip=False)]
+    header = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+    compressed = gzip.compress(body)
+    cases = [
+        ("content-length", header + b"Content-Length: %d\r\n\r\n" % len(body) + body, None),
+        ("chunked", header + b"Transfer-Encoding: chunked\r\n\r\n" + chunked(body, 1000), None),
+        ("content-length, stop", header + b"Content-Length: %d\r\n\r\n" % len(body) + body, 1),
+        ("gzip", header + b"Content-Encoding: gzip\r\nContent-Length: %d\r\n\r\n" % len(compressed) + compressed, None),
+        ("gzip, chunked", header + b"Content-Encoding: gzip\r\nTransfer-Encoding: chunked\r\n\r\n" + chunked(compressed, 1000), None),
+    ]
+    print(f"Display cadence while reading {os.path.basename(FIXTURE)} ({len(body)} bytes at {args.rate:.0f} bytes/s)")
+    passed = True
+    for name, response, count in cases:
+        passed = await check(name, response, args.rate, count, expected, args.tolerance) and passed
+    passed = await keepalive(cases[3][1], expected) and passed
+    image = os.urandom(8000) # Not JSON, and does not compress
+    zipped = gzip.compress(image)
+    images = [
+        ("image", header + b"Content-Length: %d\r\n\r\n" % len(image) + image, image),
+        ("image, until close", header + b"Connection: close\r\n\r\n" + image, image),
+        ("image, gzip, chunked", header + b"Content-Encoding: gzip\r\nTransfer-Encoding: chunked\r\n\r\n" + chunked(zipped, 1000), image),
+        ("image, cut off", header + b"Content-Length: %d\r\n\r\n" % len(image) + image[:5000], OSError),
+    ]
+    for name, response, result in images:
+        passed = await check(name, response, args.rate, "body", result, args.tolerance) and passed
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,62 @@
+""" Host benchmark (CPython) of medea on a detailed LL2 launch response: how many tokens, bytes read and time are saved
+    by skipping the subtrees that LaunchParser (used by LL2Sync.update_launch_data()) is not subscribed to, and by
+    stopping once the launch is complete (count=1, as for a request of a single launch in detailed mode).
+    Usage: python bench/bench_medea.py [fixture.json ...]
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "..")) # Appended, so lib/zlib.py does not shadow the standard library
+sys.path.append(os.path.join(HERE, "..", "lib"))
+import medea
+from launch import LaunchParser
+
+MODES = (("full", False, None), ("skip", True, None), ("skip+stop", True, 1)) # (name, skip, count)
+
+
+def counted(tokens, counter): # Passes tokens (and messages sent back) through, while counting them in counter[0]
+    msg = None
+    try:
+        while True:
+            try:
+                token = tokens.send(msg)
+            except StopIteration:
+                return
+            counter[0] += 1
+            msg = yield token
+    finally:
+        tokens.close()
+
+def read(chunks, counter): # Passes chunks through, while counting their bytes in counter[0]
+    for chunk in chunks:
+        counter[0] += len(chunk)
+        yield chunk
+
+
+def run(path, skip, count, repeat):
+    parser = LaunchParser()
+    tokens, size = [0], [0]
+    parser.parse(counted(medea.ChunkTokenizer(True).tokenizeChunks(read(medea.generateFileChunks(path), size)), tokens), skip, count)
+    t = time.perf_counter()
+    for _ in range(repeat):
+        parser.parse(medea.tokenizeFile(path, lazy=True), skip, count)
+    return tokens[0], size[0], (time.perf_counter() - t)/repeat
+
+
+def main(paths, repeat=50):
+    for path in paths:
+        print(f"{os.path.basename(path)} ({os.path.getsize(path)} bytes)")
+        results = []
+        for name, skip, count in MODES:
+            tokens, size, dt = run(path, skip, count, repeat)
+            results.append((tokens, size, dt))
+            print(f"    {name:9s}  {tokens:6d} tokens  {size:6d} bytes read  {dt*1e3:7.2f} ms  {tokens/dt:9.0f} tokens/s  {size/dt/1e3:8.1f} kB/s")
+        n0, s0, dt0 = results[0]
+        for (name, _, _), (n, size, dt) in zip(MODES[1:], results[1:]):
+            print(f"    {name} saved: {n0 - n} tokens ({100*(n0 - n)/n0:.0f}%), {s0 - size} bytes read ({100*(s0 - size)/s0:.0f}%), {100*(dt0 - dt)/dt0:.0f}% of the time")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or [os.path.join(HERE, "fixtures", "upcoming_normal.json")])
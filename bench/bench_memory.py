@@ -0,0 +1,48 @@
+""" Host benchmark (CPython) of the memory taken by cached launches: Launch records (launch.py) compared to the former
+    representation as a dict per launch (with a nested "status" dict), for 10 and 100 launches. Also compares the size of
+    the cache file written by LL2Sync.cache_save() in both formats. Absolute sizes differ on MicroPython, where objects are smaller.
+    Usage: python bench/bench_memory.py [upcoming_fixture.json]
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+from suite import launch_dict # Also sets up sys.path and TZ
+import medea
+from launch import Launch, LaunchParser
+
+
+def retained(build): # Bytes still allocated after build() returns, while its result is kept alive
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+def parse(path, n): # <n> launches from parsing <path> repeatedly, so every launch has its own strings
+    parser = LaunchParser()
+    launches = []
+    while len(launches) < n:
+        launches += parser.parse(medea.tokenizeFile(path, lazy=True))
+    return launches[:n]
+
+
+def main(path):
+    for n in (10, 100):
+        records, launches = retained(lambda: parse(path, n))
+        dicts, legacy = retained(lambda: [launch_dict(launch) for launch in parse(path, n)])
+        print(f"{n:4d} launches: Launch {records:7d} bytes, dict {dicts:7d} bytes, saved {dicts - records:7d} bytes ({100*(dicts - records)/dicts:.0f}%)")
+        compact = len(json.dumps({"fields": Launch.__slots__, "launches": [launch.to_list() for launch in launches], "lastfetch": 0}))
+        for l in legacy: l["detailed"] = False
+        verbose = len(json.dumps({"launches": legacy, "lastfetch": 0}))
+        print(f"{'':4s}  cache file: {compact:6d} bytes, formerly {verbose:6d} bytes")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(HERE, "fixtures", "upcoming_list.json"))
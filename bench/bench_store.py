@@ -0,0 +1,88 @@
+""" Host benchmark (CPython) of LaunchStore (launch.py) against the former list of launches in LL2Sync, for 10, 100 and 1000
+    launches. Measures the merge of an upcoming response (LL2Sync.store_launches(): every launch known, a tenth of them
+    with a new NET, one new launch and one dropped), the expiry done by every tick (usually nothing expires), and the
+    removal of the first launch once it is past t_min. Both must end with the same launches in the same order.
+    Usage: python bench/bench_store.py [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, ".."))
+sys.path.append(os.path.join(HERE, "..", "lib"))
+from launch import Launch, LaunchStore
+
+T0 = 1_700_000_000
+
+
+def launch(ID, net_epoch):
+    l = Launch(ID)
+    l.net_epoch = net_epoch
+    return l
+
+def response(n): # Known launches 1..n-1 (every tenth with a later NET), new launch n; launch 0 is dropped
+    return [launch(i, T0 + 600*i + (300 if i % 10 == 0 else 0)) for i in range(1, n + 1)]
+
+
+# The former implementation in LL2Sync
+def list_merge(launches, new):
+    for l in new:
+        ls = [known for known in launches if known.id == l.id]
+        if ls: ls[0].update(l)
+        else: launches.append(l)
+    IDs = [l.id for l in new]
+    launches = list(filter(lambda l: l.id in IDs, launches))
+    launches.sort(key=lambda l: l.net_epoch)
+    return launches
+
+def list_expire(launches, t_min):
+    return list(filter(lambda l: l.net_epoch > t_min, launches))
+
+def store_merge(store, new):
+    for l in new: store.upsert(l)
+    store.retain(set(l.id for l in new))
+    return store
+
+def store_expire(store, t_min):
+    store.expire(t_min)
+    return store
+
+
+def timed(build, operation, arg, repeat, inner): # Seconds per operation(build(), arg), without the time of build()
+    total = 0.
+    for _ in range(repeat):
+        launches = build()
+        t = time.perf_counter()
+        for _ in range(inner): # Only for operations that change nothing the second time
+            result = operation(launches, arg)
+        total += time.perf_counter() - t
+    return total/repeat/inner, result
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--repeat", type=int, default=20)
+    args = argparser.parse_args()
+
+    passed = True
+    print(f"{'launches':>8s}  {'operation':15s}  {'list':>10s}  {'LaunchStore':>11s}  speedup")
+    for n in (10, 100, 1000):
+        initial = lambda: [launch(i, T0 + 600*i) for i in range(n)]
+        cases = [
+            ("merge response", list_merge, store_merge, response(n), 1),
+            ("tick expire", list_expire, store_expire, T0 - 1, 100), # Nothing expires
+            ("expire first", list_expire, store_expire, T0, 1), # Launch 0 expires
+        ]
+        for name, old, new, arg, inner in cases:
+            dt_old, launches = timed(initial, old, arg, args.repeat, inner)
+            dt_new, store = timed(lambda: LaunchStore(initial()), new, arg, args.repeat, inner)
+            same = [(l.id, l.net_epoch) for l in launches] == [(l.id, l.net_epoch) for l in store]
+            passed = passed and same
+            print(f"{n:8d}  {name:15s}  {dt_old*1e6:8.1f}us  {dt_new*1e6:9.1f}us  {dt_old/dt_new:6.1f}x" + ("" if same else "  DIFFER"))
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
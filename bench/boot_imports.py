@@ -0,0 +1,95 @@
+""" Host benchmark (CPython) of the imports at boot, up to the first countdown from the cache (see main.CountdownClock):
+    importing ll2 and creating an offline AsyncLL2Sync, which loads the cache. This is compared for
+        before  medea and krequests imported up front, as formerly by main, ll2, launch and cache
+        after   medea and krequests as lazy.LazyModule, loaded on first use (medea by the first response)
+    Every run is a fresh interpreter, in which tracemalloc traces the heap. The standard modules are imported before
+    measuring, since on the Pico these are built into the firmware (asyncio, json, socket, ssl, ...). Reported per
+    policy: the time and heap until the countdown, which of the deferred modules were loaded by then, and the time of
+    the first parse of a response (which now includes loading medea); then the import table of lazy.report() for a run after.
+    The network modules (network and ntptime via web) and the drivers only exist on the Pico, so there the
+    same table is printed by main once online.
+    Usage: python bench/boot_imports.py [--repeat 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(HERE, "fixtures", "upcoming_list.json")
+BUILTIN = ("asyncio", "errno", "gc", "heapq", "json", "socket", "ssl", "struct") # Built into the firmware of the Pico
+DEFERRED = ("medea", "krequests") # Modules that the lazy imports should keep out of the boot
+
+
+def setup_path(): # Like bench/suite.py, but without importing anything from the repository
+    sys.path.append(os.path.join(HERE, ".."))
+    sys.path.append(os.path.join(HERE, "..", "lib"))
+    os.environ["TZ"] = "UTC"
+    time.tzset()
+
+
+def child(policy): # Boots in this interpreter, and prints the measurements as JSON
+    import tracemalloc
+    setup_path()
+    for name in BUILTIN: __import__(name)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    import lazy
+    with lazy.ImportProfiler():
+        if policy == "before":
+            import medea, krequests
+        import ll2
+    LL2 = ll2.AsyncLL2Sync(online=False) # Loads the cache in the working directory
+    LL2.dt_tuple # First countdown
+    boot = time.perf_counter() - t0
+    heap = tracemalloc.get_traced_memory()[0]
+    loaded = [name for name in DEFERRED if name in sys.modules]
+    t = time.perf_counter()
+    launches = LL2.parser.parse(ll2.medea.tokenizeFile(FIXTURE, lazy=True)) # As the first response does
+    first_parse = time.perf_counter() - t
+    assert len(launches) == len(LL2.launches)
+    print(json.dumps({"boot": boot, "heap": heap, "loaded": loaded, "first_parse": first_parse, "report": lazy.report(max_depth=1)}))
+
+
+def run(policy, directory) -> dict:
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", policy], cwd=directory, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median(values): return sorted(values)[len(values)//2]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--repeat", type=int, default=5)
+    argparser.add_argument("--child", choices=("before", "after"), help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+    if args.child: return child(args.child) or True
+
+    setup_path()
+    import medea
+    from cache import LaunchCache
+    from launch import LaunchParser
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        launches = LaunchParser().parse(medea.tokenizeFile(FIXTURE, lazy=True))
+        LaunchCache(os.path.join(tmp, "llcache.bin")).save(launches, [], 1700000000, force=True)
+        for i in range(args.repeat):
+            for policy in ("before", "after"): # Interleaved, so both see the same load of the machine
+                results.setdefault(policy, []).append(run(policy, tmp))
+    for policy, runs in results.items():
+        print(f"    {policy:6s}  boot to countdown {1e3*median([r['boot'] for r in runs]):6.1f} ms, heap {median([r['heap'] for r in runs])/1e3:6.1f} kB, "
+              f"loaded: {', '.join(runs[0]['loaded']) or 'none of ' + ', '.join(DEFERRED)} | first parse {1e3*median([r['first_parse'] for r in runs]):6.1f} ms")
+    print("Imports of a run after (ms, heap bytes):")
+    print(results["after"][0]["report"])
+    before, after = results["before"], results["after"]
+    passed = not any(r["loaded"] for r in after) and median([r["heap"] for r in after]) < median([r["heap"] for r in before])
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,177 @@
+""" Host simulation (CPython, no network) of a full day of LL2Sync ticks (every 10 s), to check that budget.RequestBudget
+    keeps the hourly limit of LL2 free for the Threshold refreshes near T-0. The ticks follow LL2Sync.tick_requests():
+    Threshold refreshes, a routine refresh every request_dt seconds alternating with the queue of detailed requests, and a
+    refresh when a launch is dropped. The day has a busy hour of three launches, another device using the same API
+    limit right before it, and a reboot at noon (which queues details for every cached launch, like cache_load()).
+    Every policy is checked against a server that enforces the limit over a sliding window and answers 429 otherwise:
+        old     the behaviour before RequestBudget: any request may be made, a 429 blocks all requests for next_use_secs
+        budget  tick_requests() with RequestBudget
+    The budget policy must not lose any Threshold refresh, and RequestBudget.available_at() (which LL2Sync.wake_time() uses)
+    must never name a time at which the budget does not allow the request. Each policy runs at every limit of --limit,
+    of which the default 5 is below the reserve of the DETAILS requests, so these are never allowed.
+    Usage: python bench/budget_day.py [--limit 15 5] [--foreign 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, ".."))
+from budget import DETAILS, THRESHOLD, UPCOMING, RequestBudget
+
+DAY, TICK, WINDOW = 86400, 10, 3600
+THRESHOLDS = (180, 60, -60, -180) # As in LL2Sync.__init__
+KEEP_SECONDS = 3600
+NETS = [3*3600, 8*3600, 8*3600 + 1800, 9*3600, 14*3600 + 600, 20*3600, 23*3600 + 1800] # Launches of the day
+FOREIGN = 7*3600 + 3000 # Another device starts using the same API limit here, one request per minute
+REBOOT = 12*3600
+N_CACHED = 10 # Launches in the cache, which all get a detailed request queued after a reboot
+NAMES = ("threshold", "upcoming", "details")
+
+
+class Server: # Enforces <limit> requests per <WINDOW> seconds, like LL2 does per IP address
+    def __init__(self, limit):
+        self.limit = limit
+        self.times = []
+        self.max_used = 0
+
+    def used(self, now):
+        self.times = [t for t in self.times if t > now - WINDOW]
+        return len(self.times)
+
+    def hit(self, now) -> int: # Status code of a request at <now>
+        if self.used(now) >= self.limit: return 429
+        self.times.append(now)
+        self.max_used = max(self.max_used, len(self.times))
+        return 200
+
+    def throttle(self, now) -> dict: # Response of the api-throttle endpoint (which is not counted)
+        used = self.used(now)
+        return {"your_request_limit": self.limit, "current_use": used,
+                "next_use_secs": max(0, self.times[0] + WINDOW - now) if used >= self.limit else 0}
+
+
+def displayed(now): # NET of the launch that LL2Sync.launches[0] would be (see LL2Sync.t_min), or None
+    nets = [net for net in NETS if net > now - KEEP_SECONDS]
+    if len(nets) >= 2 and nets[1] - now < now - nets[0]: nets.pop(0)
+    return nets[0] if nets else None
+
+def crossed(old, new): # Whether going from <old> to <new> seconds until launch passes a threshold (like Threshold.pass_check())
+    return old is not None and new is not None and any((th - new)*(th - old) <= 0 and old != th for th in THRESHOLDS)
+
+
+class Day:
+    def __init__(self, policy, limit, foreign, statefile):
+        self.policy = policy
+        self.limit = limit
+        self.foreign = foreign
+        self.statefile = statefile
+        self.server = Server(limit)
+        self.budget = self.new_budget()
+        self.request_dt = min(int(3600/max(1, (limit - len(THRESHOLDS))/2)) + 1, 600) # LL2Sync.request_dt
+        self.queue = [] # Classes of the queued requests
+        self.lastrequesttime = 0
+        self.blocked_until = 0 # Only used by the old policy
+        self.pending = [] # Times when Thresholds were passed, which did not get a refresh yet
+        self.requests = [0, 0, 0]
+        self.status429 = 0
+        self.blocked = 0 # Requests that were not made because of an earlier 429
+        self.syncs = 0
+        self.delays = [] # Seconds between passing a Threshold and the refresh
+        self.lost = 0 # Thresholds that never got a refresh
+        self.early = 0 # Ticks at which available_at() of a class was not later than now, while the budget did not allow it
+
+    def new_budget(self):
+        return RequestBudget(limit=self.limit, reserve=len(THRESHOLDS), statefile=self.statefile)
+
+    def allows(self, kind, now):
+        return self.policy == "old" or self.budget.allows(kind, now=now)
+
+    def request(self, kind, now) -> bool: # LL2Sync.request(): whether a response came in
+        if now < (self.blocked_until if self.policy == "old" else self.budget.blocked_until):
+            self.blocked += 1
+            return False
+        self.lastrequesttime = now
+        self.requests[kind] += 1
+        if self.policy == "budget": self.budget.record(now=now)
+        if self.server.hit(now) == 429:
+            self.status429 += 1
+            if self.policy == "old":
+                self.blocked_until = now + self.server.throttle(now)["next_use_secs"]
+            else:
+                self.sync(now)
+            return False
+        return True
+
+    def sync(self, now): # LL2Sync.sync_budget()
+        self.syncs += 1
+        throttle = self.server.throttle(now)
+        self.budget.sync(throttle["current_use"], throttle["next_use_secs"], throttle["your_request_limit"], now=now)
+
+    def tick(self, now, dt_old, dt):
+        if self.policy == "budget" and self.budget.needs_sync(now=now):
+            self.sync(now)
+        if self.policy == "budget": # As LL2Sync.wake_time(), without counting denied checks like allows() does
+            for kind in (THRESHOLD, UPCOMING, DETAILS):
+                allowed = now >= self.budget.blocked_until and self.budget.remaining(now) > self.budget.reserves[kind]
+                if self.budget.available_at(kind, now) <= now and not allowed: self.early += 1
+        if crossed(dt_old, dt):
+            self.pending.append(now)
+        if self.pending and self.allows(THRESHOLD, now):
+            if self.request(THRESHOLD, now):
+                self.delays.extend(now - t for t in self.pending)
+            elif self.policy == "old": # The old tick forgot about a Threshold whose request failed
+                self.lost += len(self.pending)
+            if self.policy == "old" or self.budget.blocked_until <= now: self.pending = [] # As LL2Sync.threshold_pending
+        if now - self.lastrequesttime > self.request_dt:
+            if not self.queue:
+                if self.allows(UPCOMING, now) and self.request(UPCOMING, now):
+                    self.queue += [DETAILS, UPCOMING] # LL2Sync.queue_details()
+            elif self.allows(self.queue[0], now):
+                self.request(self.queue.pop(0), now)
+
+    def run(self):
+        net, dt = None, None
+        for now in range(0, DAY, TICK):
+            if now == REBOOT:
+                self.budget = self.new_budget() # Reloads the state that was saved before the reboot
+                self.queue = [DETAILS, UPCOMING] + [DETAILS]*(N_CACHED - 1) # The RequestQueue merges the UPCOMING requests
+            if FOREIGN <= now < FOREIGN + 60*self.foreign and now % 60 == 0:
+                self.server.hit(now)
+            net_old, net = net, displayed(now)
+            dt_old, dt = dt, None if net is None else net - now
+            self.tick(now, dt_old, dt)
+            if net_old is not None and net != net_old and self.allows(UPCOMING, now): # A launch was dropped
+                self.request(UPCOMING, now)
+        self.lost += len(self.pending)
+        return self
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--limit", type=int, nargs="+", default=[15, 5], help="requests per hour allowed by the API")
+    argparser.add_argument("--foreign", type=int, default=5, help="requests of another device right before the busy hour")
+    args = argparser.parse_args()
+
+    passed = True
+    for limit in args.limit:
+        print(f"One day of ticks: {len(NETS)} launches, limit {limit}/h, {args.foreign} foreign requests, reboot at {REBOOT//3600}:00")
+        with tempfile.TemporaryDirectory() as tmp:
+            for policy in ("old", "budget"):
+                day = Day(policy, limit, args.foreign, os.path.join(tmp, policy + ".json")).run()
+                n = len(day.delays) + day.lost
+                delay = max(day.delays, default=0)
+                print(f"    {policy:6s}  requests " + ", ".join(f"{name} {k}" for name, k in zip(NAMES, day.requests)) +
+                      f"  | 429s {day.status429}, blocked {day.blocked}, syncs {day.syncs}, max {day.server.max_used}/h" +
+                      f"  | thresholds {n}: refreshed {len(day.delays)} (latest after {delay} s), lost {day.lost}")
+                if policy == "budget":
+                    print("            denied checks " + ", ".join(f"{name} {k}" for name, k in zip(NAMES, day.budget.denied)) +
+                          f" (since the reboot), early wake times {day.early}")
+                    passed = passed and day.lost == 0 and day.early == 0
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
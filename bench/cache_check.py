@@ -0,0 +1,160 @@
+""" Host check and benchmark (CPython) of cache.LaunchCache, with launches parsed from an LL2 fixture.
+    * Round trip: the compact cache, and both JSON formats of older versions (list and dict per launch), must load the
+      launches, queue and lastfetch that were saved.
+    * Crash consistency: a power cut at any byte while writing the temporary file must leave the previous cache loadable,
+      a cache file cut at any byte (as on a file system without atomic rename) must be rejected rather than half-loaded,
+      and a lost rename must be recovered from the temporary file.
+    * Coalescing: a burst of saves within min_interval writes once.
+    * Timing: save/load time, peak allocation while loading (beyond the loaded launches) and file size for 10 and 100
+      launches, compared with json.dump()/json.load() as formerly. On CPython, json is C code, and so it is faster.
+    Usage: python bench/cache_check.py [upcoming_fixture.json] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+from suite import launch_dict # Also sets up sys.path and TZ
+import medea
+from cache import LaunchCache
+from launch import Launch, LaunchParser
+
+QUEUE = [[2, "abc", 1, 1700000000], [1, None, 0, 1700000001]]
+LASTFETCH = 1700000123
+
+
+def parse(path, n): # <n> launches, from parsing <path> repeatedly
+    launches = []
+    while len(launches) < n:
+        launches += LaunchParser().parse(medea.tokenizeFile(path, lazy=True))
+    for i, launch in enumerate(launches): launch.detailed = i % 2 == 0
+    return launches[:n]
+
+def same(loaded, launches): # Whether <loaded> (launches, queue, lastfetch) is what was saved
+    return [l.to_list() for l in loaded[0]] == [l.to_list() for l in launches] and list(loaded[1]) == QUEUE and loaded[2] == LASTFETCH
+
+def loads(cache): # Result of cache.load(), or the exception it raised
+    try:
+        return cache.load()
+    except (OSError, ValueError) as e:
+        return e
+
+
+def check_round_trip(tmp, launches):
+    cache = LaunchCache(os.path.join(tmp, "rt.bin"), os.path.join(tmp, "missing.json"))
+    cache.save(launches, QUEUE, LASTFETCH, force=True)
+    ok = same(cache.load(), launches)
+    legacy = os.path.join(tmp, "legacy.json")
+    with open(legacy, "w") as f:
+        json.dump({"fields": Launch.__slots__, "launches": [l.to_list() for l in launches], "lastfetch": LASTFETCH, "queue": QUEUE}, f)
+    ok_list = same(LaunchCache(os.path.join(tmp, "none.bin"), legacy).load(), launches)
+    with open(legacy, "w") as f: # Fields after the launches, as a dict without order could have it
+        json.dump({"queue": QUEUE, "launches": [l.to_list() for l in launches], "fields": Launch.__slots__, "lastfetch": LASTFETCH}, f)
+    ok_order = same(LaunchCache(os.path.join(tmp, "none.bin"), legacy).load(), launches)
+    dicts = [dict(launch_dict(l), detailed=l.detailed) for l in launches]
+    with open(legacy, "w") as f:
+        json.dump({"launches": dicts, "lastfetch": LASTFETCH, "queue": QUEUE}, f)
+    ok_dict = same(LaunchCache(os.path.join(tmp, "none.bin"), legacy).load(), launches)
+    print(f"    round trip: compact {'ok' if ok else 'DIFFER'}, legacy list {'ok' if ok_list else 'DIFFER'}, "
+          f"legacy list with fields last {'ok' if ok_order else 'DIFFER'}, legacy dict {'ok' if ok_dict else 'DIFFER'}")
+    return ok and ok_list and ok_order and ok_dict
+
+def check_crashes(tmp, launches):
+    path = os.path.join(tmp, "crash.bin")
+    cache = LaunchCache(path, os.path.join(tmp, "missing.json"))
+    old = launches[:len(launches)//2]
+    cache.save(old, QUEUE, LASTFETCH, force=True)
+    with open(path, "rb") as f:
+        previous = f.read()
+    cache.save(launches, QUEUE, LASTFETCH, force=True)
+    with open(path, "rb") as f:
+        complete = f.read()
+    kept = rejected = 0
+    for cut in range(len(complete)):
+        with open(path, "wb") as f: # Power cut while writing the temporary file: the previous cache is untouched
+            f.write(previous)
+        with open(path + ".tmp", "wb") as f:
+            f.write(complete[:cut])
+        kept += same(loads(cache), old)
+        os.remove(path) # File system without atomic rename, which left a cut cache file and no temporary file
+        os.remove(path + ".tmp")
+        with open(path, "wb") as f:
+            f.write(complete[:cut])
+        rejected += isinstance(loads(cache), (OSError, ValueError))
+    os.remove(path)
+    with open(path + ".tmp", "wb") as f: # Power cut after removing the cache file, before renaming the complete temporary file
+        f.write(complete)
+    recovered = same(loads(cache), launches)
+    os.remove(path + ".tmp")
+    n = len(complete)
+    print(f"    crash consistency over {n} cut points: previous cache kept {kept}/{n}, cut cache rejected {rejected}/{n}, "
+          f"renamed file recovered: {'ok' if recovered else 'FAILED'}")
+    return kept == n and rejected == n and recovered
+
+def check_coalescing(tmp, launches):
+    cache = LaunchCache(os.path.join(tmp, "burst.bin"), min_interval=60)
+    for i in range(100): # 100 saves within 50 seconds, then one after the interval
+        cache.save(launches, QUEUE, LASTFETCH, now=1000 + i//2)
+    written = cache.writes
+    cache.save(launches, QUEUE, LASTFETCH, now=1060)
+    print(f"    coalescing: 100 saves in 50 s wrote {written} time(s), {cache.coalesced} coalesced, dirty afterwards: {cache.dirty}")
+    return written == 1 and cache.writes == 2 and not cache.dirty
+
+def timed(f, repeat):
+    t = time.perf_counter()
+    for _ in range(repeat): f()
+    return (time.perf_counter() - t)/repeat
+
+def peak(f): # Bytes allocated at the peak of f(), minus those still allocated (its result) afterwards
+    tracemalloc.start()
+    result = f()
+    size, top = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return top - size
+
+def benchmark(tmp, path, repeat):
+    for n in (10, 100):
+        launches = parse(path, n)
+        cache = LaunchCache(os.path.join(tmp, "bench.bin"), os.path.join(tmp, "bench.json"))
+        def dump():
+            with open(cache.legacy, "w") as f:
+                json.dump({"fields": Launch.__slots__, "launches": [l.to_list() for l in launches], "lastfetch": LASTFETCH, "queue": QUEUE}, f)
+        def load():
+            with open(cache.legacy) as f:
+                llc = json.load(f)
+            return [Launch.from_list(l, llc["fields"]) for l in llc["launches"]]
+        save_new = timed(lambda: cache.save(launches, QUEUE, LASTFETCH, force=True), repeat)
+        load_new = timed(lambda: cache.load_compact(cache.path), repeat)
+        save_old = timed(dump, repeat)
+        load_old = timed(load, repeat)
+        load_legacy = timed(lambda: cache.load_legacy(cache.legacy), repeat)
+        peak_new, peak_old = peak(lambda: cache.load_compact(cache.path)), peak(load)
+        print(f"    {n:3d} launches: compact {os.path.getsize(cache.path):6d} bytes, save {save_new*1e3:5.2f} ms, load {load_new*1e3:5.2f} ms, peak {peak_new:6d} bytes"
+              f" | json {os.path.getsize(cache.legacy):6d} bytes, save {save_old*1e3:5.2f} ms, load {load_old*1e3:5.2f} ms, peak {peak_old:6d} bytes"
+              f" (legacy loader {load_legacy*1e3:5.2f} ms)")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("fixture", nargs="?", default=os.path.join(HERE, "fixtures", "upcoming_normal.json"))
+    argparser.add_argument("--repeat", type=int, default=20)
+    args = argparser.parse_args()
+
+    launches = parse(args.fixture, 10)
+    print(f"LaunchCache with {len(launches)} launches of {os.path.basename(args.fixture)}")
+    with tempfile.TemporaryDirectory() as tmp:
+        passed = check_round_trip(tmp, launches)
+        passed = check_crashes(tmp, launches) and passed
+        passed = check_coalescing(tmp, launches) and passed
+        benchmark(tmp, args.fixture, args.repeat)
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,110 @@
+""" Host simulation (CPython) of AsyncLL2Sync against the LL2 stand-in of bench/ll2server.py over a few days, to compare
+    routine refreshes at a constant interval (LL2Sync.queue_dt, as formerly) with the intervals of cadence.CadencePlanner.
+    The days have launches with precise NETs that slip, scrub or hold in their last hour, and launches weeks away with
+    NETs as imprecise as a month. The days are simulated at several phases (all changes <phase> seconds later), since with
+    a single phase, a constant interval can happen to refresh right after every change.
+    Reported per policy: requests per day, and the staleness of changes near T-0: the time from a change of the NET or
+    status of a launch in its last hour until the clock had it. The worst case of the planner may not be worse.
+    Usage: python bench/cadence_day.py [--days 1] [--phases 0 150 300 450]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+from ll2_harness import H, M, T0, TICK, clock # Also sets up sys.path and TZ
+from ll2server import LL2Server, launch_id
+import ll2
+
+NEAR = 3600 # Changes this close to T-0 are those of which the staleness matters
+
+
+class FixedLL2Sync(ll2.AsyncLL2Sync): # Routine refreshes at the constant interval of former versions
+    request_dt = property(lambda self: self.queue_dt)
+
+
+def timeline(server, days, phase):
+    for d in range(days):
+        i, t = 10*d, T0 + phase + d*86400
+        server.add(i, t + 5*H) # Hold at T-20 min, then a new T-0
+        server.at(t + 5*H - 20*M, i, status=5)
+        server.at(t + 5*H - 12*M, i, status=1, net=t + 5*H + 20*M)
+        server.add(i + 1, t + 14*H) # Slips at T-45 min, and again at T-4 min
+        server.at(t + 14*H - 45*M, i + 1, net=t + 14*H + 10*M)
+        server.at(t + 14*H + 6*M, i + 1, net=t + 14*H + 13*M)
+        server.add(i + 2, t + 20*H, precision=2) # Precise to the hour until the day before, slips at T-30 min
+        server.at(t + 8*H, i + 2, precision=1)
+        server.at(t + 20*H - 30*M, i + 2, net=t + 20*H + 5*M)
+        server.add(i + 3, t + 22*H) # Scrubbed at T-10 min
+        server.at(t + 22*H - 10*M, i + 3, net=t + 5*86400, precision=5, status=2)
+        for k in range(6): # Far away, with imprecise NETs and occasional edits
+            server.add(i + 4 + k, t + (7 + 3*k)*86400, precision=5 + k % 4, status=2)
+            server.at(t + (4 + 3*k)*H, i + 4 + k, status=8)
+
+async def run(cls, days, phase):
+    clock[0] = T0
+    server = await LL2Server(lambda: clock[0]).start()
+    timeline(server, days, phase)
+    script = list(server.events)
+    pending, staleness = [], []
+    with contextlib.redirect_stdout(io.StringIO()): # LL2Sync prints every request
+        LL2 = cls(base_url=server.base_url)
+        ll2.scheduler.cancel(LL2.task_tick) # Ticked below, on the simulated clock
+        for t in range(T0, T0 + days*86400, TICK):
+            clock[0] = t
+            while script and script[0][0] <= t: # Changes to launches near T-0, as they happen
+                te, ID, changes = script.pop(0)
+                if ID in server.launches and server.launches[ID]["net"] - te <= NEAR and ("net" in changes or "status" in changes):
+                    pending.append((te, ID))
+            server.advance()
+            await LL2.tick()
+            for te, ID in list(pending):
+                truth = server.launches.get(ID)
+                if ID in LL2.launches and truth and (LL2.launches.get(ID).net_epoch, LL2.launches.get(ID).status_id) == (truth["net"], truth["status"]) \
+                        or ID not in LL2.launches and server.upcoming(LL2.t_min, limit=LL2.upcoming_limit)[1].count(ID) == 0:
+                    staleness.append(t - te)
+                    pending.remove((te, ID))
+    await server.stop()
+    staleness += [clock[0] - te for te, ID in pending] # Never seen
+    return server.summary(), staleness
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--days", type=int, default=1, help="Days per phase")
+    argparser.add_argument("--phases", type=int, nargs="+", default=[0, 150, 300, 450], help="Seconds")
+    args = argparser.parse_args()
+
+    time.time = lambda: clock[0] # LL2Sync, RequestBudget and LaunchCache all use time.time()
+    cwd = os.getcwd()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp) # LL2Sync keeps its cache and budget in the working directory
+        for name, cls in (("fixed", FixedLL2Sync), ("cadence", ll2.AsyncLL2Sync)):
+            summary, staleness = {}, []
+            for phase in args.phases:
+                for path in os.listdir(tmp): os.remove(path)
+                counts, stale = asyncio.run(run(cls, args.days, phase))
+                for kind, (n, size) in counts.items(): summary[kind] = summary.get(kind, 0) + n
+                staleness += stale
+            results[name] = summary, staleness
+            days = args.days*len(args.phases)
+            requests = sum(n for kind, n in summary.items() if kind != "throttle")
+            kinds = ", ".join(f"{kind} {n}" for kind, n in sorted(summary.items()))
+            print(f"    {name:7s}  {requests/days:5.1f} requests/day ({kinds})  | staleness near T-0 over {len(staleness)} changes: "
+                  f"mean {sum(staleness)/len(staleness):5.0f} s, worst {max(staleness):4d} s")
+        os.chdir(cwd)
+    (fixed, stale_fixed), (cadence, stale_cadence) = results["fixed"], results["cadence"]
+    passed = max(stale_cadence) <= max(stale_fixed) and "429" not in cadence
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,91 @@
+""" Host simulation (CPython) of a day of AsyncLL2Sync ticks (every 10 s on a simulated clock) against the LL2 stand-in of
+    bench/ll2server.py, to count the requests and bytes saved by delta refreshes of the upcoming list (last_updated__gte).
+    The timeline has routine edits of launches, NET slips, a scrub that moves a launch out of the list, a new launch and a
+    deleted one. The same day is run with full refreshes only (full_interval=0) and with delta refreshes (the default
+    full_interval). At the end of both runs, the launches must equal the upcoming list of the stand-in.
+    Also counts the LCD frames that the change sets of the responses (LL2Sync.take_changes()) would make CountdownClock
+    draw fully, partly, or not at all (avoided: only fields that are not shown changed), where formerly every response
+    redrew the whole LCD. Responses that changed nothing do not make a frame at all.
+    Usage: python bench/delta_day.py [--full-interval 3600]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+from ll2_harness import T0, TICK, clock # Also sets up sys.path and TZ
+import ll2
+from ll2server import LL2Server, launch_id
+
+DAY = 86400
+SHOWN = {"country", "rocket_name", "payload_name", "pad", "pad_location", "net_epoch", "status_id", "status_name", "status_abbrev"} # main.REGIONS
+
+
+def timeline(server): # Launches every 2.5 hours, and the events of the day
+    for i in range(24):
+        server.add(i, T0 + 3600 + i*9000, last_updated=T0 - 86400 + i*600)
+    for k, t in enumerate(range(T0 + 1800, T0 + 21*3600, 3000)): # Routine edits of launches further out
+        server.at(t, 10 + k % 14, status=1)
+    server.at(T0 + 2*3600, 1, net=T0 + 3600 + 9000 + 1800) # NET slips
+    server.at(T0 + 6*3600, 3, net=T0 + 3600 + 3*9000 + 600)
+    server.at(T0 + 10*3600, 5, net=T0 + 4*86400, status=2) # Scrub: leaves the list
+    server.at(T0 + 13*3600, 30, net=T0 + 16*3600) # New launch within the list
+    server.at(T0 + 15*3600, 8, deleted=True) # Removed from LL2, which a delta refresh can not see
+    server.at(T0 + 20*3600, 12, status=3)
+
+
+async def run(full_interval):
+    clock[0] = T0
+    server = await LL2Server(lambda: clock[0]).start()
+    timeline(server)
+    frames = {"full": 0, "partial": 0, "avoided": 0}
+    with contextlib.redirect_stdout(io.StringIO()): # LL2Sync prints every request
+        LL2 = ll2.AsyncLL2Sync(full_interval=full_interval, base_url=server.base_url)
+        ll2.scheduler.cancel(LL2.task_tick) # Ticked below, on the simulated clock
+        for t in range(T0, T0 + DAY, TICK):
+            clock[0] = t
+            await LL2.tick()
+            if LL2.changes: # As CountdownClock.show()
+                changes = LL2.take_changes()
+                head = LL2.launches[0].id if LL2.launches else None
+                frames["full" if changes.head else "partial" if changes.launch(head) & SHOWN else "avoided"] += 1
+    await server.stop()
+    count, truth = server.upcoming(LL2.t_min, limit=LL2.upcoming_limit)
+    ok = [(l.id, l.net) for l in LL2.launches] == [(ID, server.record(ID)["net"]) for ID in truth]
+    return server.summary(), LL2.refreshes, frames, ok
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--full-interval", type=int, default=3600, help="seconds between full refreshes in the delta run")
+    args = argparser.parse_args()
+
+    time.time = lambda: clock[0] # LL2Sync, RequestBudget and LaunchCache all use time.time()
+    cwd = os.getcwd()
+    passed = True
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp) # LL2Sync keeps its cache and budget in the working directory
+        for name, full_interval in (("full", 0), ("delta", args.full_interval)):
+            for path in os.listdir(tmp): os.remove(path)
+            summary, refreshes, frames, ok = asyncio.run(run(full_interval))
+            results[name] = summary
+            passed = passed and ok
+            kinds = ", ".join(f"{kind} {n} ({size/1e3:.0f} kB)" for kind, (n, size) in sorted(summary.items()))
+            print(f"    {name:5s}  {kinds}  | refreshes {refreshes}  | LCD frames {frames}  | launches {'ok' if ok else 'DIFFER'}")
+        os.chdir(cwd)
+    total = {name: [sum(n for kind, (n, size) in s.items() if kind != "throttle"), sum(size for n, size in s.values())] for name, s in results.items()}
+    saved = [total["full"][0] - total["delta"][0], total["full"][1] - total["delta"][1]]
+    print(f"    saved by delta refreshes: {saved[0]} requests, {saved[1]/1e3:.0f} kB ({100*saved[1]/total['full'][1]:.0f}% of the bytes)")
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
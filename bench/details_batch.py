@@ -0,0 +1,70 @@
+""" Host simulation (CPython) of a cold start of AsyncLL2Sync against the LL2 stand-in of bench/ll2server.py, for several
+    sizes of the batches of detail requests (id__in). Ticks every 10 s on a simulated clock until every launch of the
+    upcoming list is detailed, and counts the requests and the time this took. Launch 4 is deleted from LL2 after the
+    first refresh, so its detail request gets no result: it must be queued again (and dropped by the next full refresh)
+    without holding up the others.
+    Usage: python bench/details_batch.py [--sizes 1,2,5,10]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+from ll2_harness import T0, TICK, clock # Also sets up sys.path and TZ
+from ll2server import LL2Server, launch_id
+import ll2
+from budget import DETAILS
+
+LIMIT = 6*3600 # Simulated seconds after which a run gives up
+
+
+async def run(batch):
+    clock[0] = T0
+    server = await LL2Server(lambda: clock[0]).start()
+    for i in range(24):
+        server.add(i, T0 + 3600 + i*9000, last_updated=T0 - 86400)
+    server.at(T0 + 5, 4, deleted=True)
+    with contextlib.redirect_stdout(io.StringIO()): # LL2Sync prints every request
+        LL2 = ll2.AsyncLL2Sync(details_batch=batch, base_url=server.base_url)
+        ll2.scheduler.cancel(LL2.task_tick) # Ticked below, on the simulated clock
+        for t in range(T0, T0 + LIMIT, TICK):
+            clock[0] = t
+            await LL2.tick()
+            if LL2.launches and all(l.detailed for l in LL2.launches) and launch_id(4) not in LL2.launches: break
+    await server.stop()
+    done = all(l.detailed for l in LL2.launches) and len(LL2.launches) == LL2.upcoming_limit
+    pending = [ID for kind, ID, *_ in LL2.queue.to_list() if kind == DETAILS]
+    return server.summary(), clock[0] - T0, done and not pending
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--sizes", default="1,2,5,10", help="comma-separated batch sizes")
+    args = argparser.parse_args()
+
+    time.time = lambda: clock[0] # LL2Sync, RequestBudget and LaunchCache all use time.time()
+    cwd = os.getcwd()
+    passed = True
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp) # LL2Sync keeps its cache and budget in the working directory
+        for batch in map(int, args.sizes.split(",")):
+            for path in os.listdir(tmp): os.remove(path)
+            summary, elapsed, ok = asyncio.run(run(batch))
+            passed = passed and ok
+            details, size = summary.get("details", (0, 0))
+            requests = sum(n for kind, (n, _) in summary.items() if kind not in ("throttle", "429"))
+            print(f"    batch {batch:2d}: {details:2d} detail requests ({size/1e3:4.0f} kB), {requests:2d} requests in all, "
+                  f"all detailed after {elapsed/60:5.1f} min" + ("" if ok else "  NOT DONE"))
+        os.chdir(cwd)
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
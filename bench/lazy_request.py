@@ -0,0 +1,128 @@
+""" Host check (CPython, no network) of the HTTP handling of the blocking medea.LazyRequest, as used by LL2Sync.
+    A local server (in a thread, since LazyRequest blocks) answers a sequence of requests with an LL2 response in these
+    framings, sending the header in pieces of a few bytes so that header lines are split across reads:
+        content-length          Content-Length, with a header line longer than the read buffer
+        chunked                 Transfer-Encoding: chunked, with chunk extensions and a trailer
+        chunked, gzip           also Content-Encoding: gzip
+        gzip                    Content-Length and Content-Encoding: gzip
+        connection: close       no Content-Length: the body ends when the server closes the connection
+        new connection          after the close, the pool has to open a new connection
+        closed while idle       the server closes the connection after responding, without saying so
+        reconnect               the pooled connection turned out to be closed, so the request reconnects
+    All requests share one ConnectionPool. Every response must give the same token stream as the file, and the pool must
+    reuse the connection whenever the previous response allowed it (hits and misses, and connections seen by the server).
+    Usage: python bench/lazy_request.py [--buffer 64]
+"""
+import argparse
+import gzip
+import os
+import socket
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, "..")) # Appended, so lib/zlib.py does not shadow the standard library
+sys.path.append(os.path.join(HERE, "..", "lib"))
+
+import medea
+
+FIXTURE = os.path.join(HERE, "fixtures", "upcoming_list.json")
+
+
+def chunked(data, size, extension=b"", trailer=b""): # <data> with "Transfer-Encoding: chunked"
+    parts = [b"%x%s\r\n" % (len(data[i:i + size]), extension) + data[i:i + size] + b"\r\n" for i in range(0, len(data), size)]
+    return b"".join(parts) + b"0%s\r\n%s\r\n" % (extension, trailer)
+
+def response(body, headers=b""):
+    return b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n" + headers + b"\r\n" + body
+
+def cases(body): # (name, response, whether the server closes the connection afterwards, whether the pool may keep it)
+    zipped = gzip.compress(body, mtime=0)
+    plain = response(body, b"X-Padding: %s\r\nContent-Length: %d\r\n" % (b"-"*300, len(body)))
+    return [
+        ("content-length", plain, False, True),
+        ("chunked", response(chunked(body, 1000, b";name=value", b"X-Checksum: 0\r\n"), b"Transfer-Encoding: chunked\r\n"), False, True),
+        ("chunked, gzip", response(chunked(zipped, 700), b"Content-Encoding: gzip\r\nTransfer-Encoding: chunked\r\n"), False, True),
+        ("gzip", response(zipped, b"Content-Encoding: gzip\r\nContent-Length: %d\r\n" % len(zipped)), False, True),
+        ("connection: close", response(body, b"Connection: close\r\n"), True, False),
+        ("new connection", plain, False, True),
+        ("closed while idle", plain, True, True),
+        ("reconnect", plain, False, True),
+    ]
+
+
+class Server:
+    """ Answers the requests on its connections with the next of <responses>, closing the connection after those that
+        are marked so. Counts the connections it accepted.
+    """
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.connections = 0
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(2)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while self.responses:
+            conn, _ = self.sock.accept()
+            self.connections += 1
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        with conn:
+            try:
+                self.respond(conn)
+            except ConnectionError: # Client closed the connection
+                pass
+
+    def respond(self, conn):
+        request = b""
+        while self.responses:
+            while b"\r\n\r\n" not in request:
+                data = conn.recv(1024)
+                if not data: return
+                request += data
+            request = request[request.index(b"\r\n\r\n") + 4:]
+            data, close = self.responses.pop(0)
+            header = data.index(b"\r\n\r\n") + 4
+            for i in range(0, header, 5): # Header lines split across reads
+                conn.sendall(data[i:min(i + 5, header)])
+                time.sleep(0.0005)
+            conn.sendall(data[header:])
+            if close: return
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--buffer", type=int, default=64, help="Read buffer of LazyRequest (bytes, at least the 8 of the gzip trailer, which close() drains for reuse)")
+    args = argparser.parse_args()
+
+    with open(FIXTURE, "rb") as f:
+        body = f.read()
+    expected = list(medea.tokenizeFile(FIXTURE))
+    checks = cases(body)
+    server = Server((data, close) for _, data, close, _ in checks)
+    pool = medea.ConnectionPool()
+    url = "http://127.0.0.1:%d/2.3.0/launches/upcoming/?format=json" % server.port
+    passed = True
+    for name, data, close, keepalive in checks:
+        if name == "reconnect": time.sleep(0.05) # Until the server closed the idle connection
+        request = medea.LazyRequest(url, bufferSize=args.buffer, pool=pool)
+        tokens = list(request.tokenize())
+        ok = request.status_code == 200 and tokens == expected and request.keepalive == keepalive and (pool.connections != {}) == keepalive
+        print(f"    {name:18s} {len(tokens)} tokens {'ok' if tokens == expected else 'DIFFER'}, status {request.status_code}, "
+              f"{'kept alive' if request.keepalive else 'closed'}{'' if ok else '  FAILED'}")
+        passed = passed and ok
+    print(f"    pool hits/misses {pool.hits}/{pool.misses}, server connections {server.connections}")
+    passed = passed and (pool.hits, pool.misses, server.connections) == (5, 3, 3) # Reused by all but the first, new connection and reconnect
+    pool.close()
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,199 @@
+""" Harness (CPython) that points AsyncLL2Sync clients at the LL2 stand-in of bench/ll2server.py (with LL2Sync.base_url) on a
+    simulated clock, and reports per client: requests and bytes by kind, throttled (429) requests, responses that broke off,
+    the time spent reading and parsing responses (real time), and the staleness of the launch shown: how long the first
+    launch (ID, NET and status) differed from that of the stand-in. Every client ticks at its own LL2Sync.wake_time().
+    Scenarios, each on top of a day of launches every 2.5 hours with routine edits:
+        calm       nothing else
+        slips      NET slips, holds and a scrub near T-0
+        throttled  the slips, and bursts of 429 statuses (as when another device uses the limit)
+        flaky      the slips, and cut off bodies, latency and a slow link (the latter two in real time)
+        unsynced   the bursts of 429 statuses, while the api-throttle endpoint fails (5xx, HTML with status 200, cut off)
+    With --clients N, N clocks share the limit of the stand-in, as behind one IP address.
+    Usage: python bench/ll2_harness.py [scenario ...] [--hours 24] [--clients 1]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+import suite # Sets up sys.path and TZ
+import ll2
+from ll2server import LL2Server
+
+T0 = 1728950400 # 2024-10-15T00:00:00Z
+TICK = 10 # Seconds between the ticks of benchmarks that tick at a fixed rate
+H, M = 3600, 60
+clock = [T0] # Simulated time, which replaces time.time() (see simulated_time())
+
+
+@contextlib.contextmanager
+def simulated_time(): # LL2Sync, RequestBudget and LaunchCache all use time.time()
+    real = time.time
+    time.time = lambda: clock[0]
+    try:
+        yield
+    finally:
+        time.time = real
+
+
+## Scenarios
+def calm(server, days=1):
+    for d in range(days):
+        for i in range(10):
+            server.add(10*d + i, T0 + d*86400 + H + i*9000, last_updated=T0 - 86400)
+        for k, t in enumerate(range(T0 + d*86400 + 1800, T0 + (d + 1)*86400, 3000)): # Routine edits of launches further out
+            server.at(t, 10*d + 5 + k % 5, status=1)
+
+def slips(server, days=1):
+    calm(server, days)
+    for d in range(days):
+        t = T0 + d*86400 + H # NET of launch 10*d
+        server.at(t + 9000 - 20*M, 10*d + 1, status=5) # Hold at T-20 min, then a new T-0
+        server.at(t + 9000 - 12*M, 10*d + 1, status=1, net=t + 9000 + 20*M)
+        server.at(t + 3*9000 - 45*M, 10*d + 3, net=t + 3*9000 + 10*M) # Slips at T-45 min, and again at T-4 min
+        server.at(t + 3*9000 + 6*M, 10*d + 3, net=t + 3*9000 + 13*M)
+        server.at(t + 5*9000 - 10*M, 10*d + 5, net=t + 5*86400, status=2) # Scrubbed at T-10 min
+
+def throttled(server, days=1):
+    slips(server, days)
+    for d in range(days):
+        for start in (2*H, 9*H, 17*H):
+            server.during(T0 + d*86400 + start, T0 + d*86400 + start + 40*M, status=429)
+
+def flaky(server, days=1):
+    slips(server, days)
+    for d in range(days):
+        t = T0 + d*86400
+        server.during(t + 3*H, t + 5*H, truncate=3000)
+        server.during(t + 8*H, t + 9*H, latency=0.5)
+        server.during(t + 14*H, t + 15*H, bandwidth=50_000)
+
+def unsynced(server, days=1):
+    throttled(server, days)
+    for d in range(days):
+        t = T0 + d*86400
+        server.during(t + 2*H, t + 2*H + 40*M, throttle=502)
+        server.during(t + 9*H, t + 9*H + 40*M, throttle=200)
+        server.during(t + 17*H, t + 17*H + 40*M, truncate=20)
+
+SCENARIOS = {"calm": calm, "slips": slips, "throttled": throttled, "flaky": flaky, "unsynced": unsynced}
+
+
+## Clients
+class HarnessLL2Sync(ll2.AsyncLL2Sync): # Times the reading and parsing of responses
+    def __init__(self, *args, **kwargs):
+        self.read_times = []
+        super().__init__(*args, **kwargs)
+
+    async def update_launch_data(self, *args, **kwargs):
+        t = time.perf_counter()
+        try:
+            return await super().update_launch_data(*args, **kwargs)
+        finally:
+            self.read_times.append(time.perf_counter() - t)
+
+
+class Client:
+    def __init__(self, directory, server):
+        self.directory = directory # For the cache and the budget of this client
+        os.chdir(directory)
+        self.LL2 = HarnessLL2Sync(base_url=server.base_url)
+        ll2.scheduler.cancel(self.LL2.task_tick) # Ticked by simulate(), on the simulated clock
+        self.wake = clock[0]
+        self.errors = 0 # Exceptions raised by ticks
+        self.stale_since = None
+        self.stale = [] # Durations of the periods in which the first launch differed from that of the stand-in
+
+    async def tick(self):
+        os.chdir(self.directory)
+        try:
+            await self.LL2.tick()
+        except Exception:
+            self.errors += 1
+        ll2.scheduler.cancel(self.LL2.task_tick)
+        self.wake = max(clock[0] + 1, min(self.LL2.wake_time(), clock[0] + ll2.MAX_SLEEP))
+
+    def shown(self): # (ID, NET, status) of the first launch
+        l = self.LL2.launches[0] if len(self.LL2.launches) else None
+        return l and (l.id, l.net_epoch, l.status_id)
+
+    def check(self, server): # Measures the staleness of the first launch at the current time
+        IDs = server.upcoming(self.LL2.t_min, limit=1)[1]
+        truth = IDs and (IDs[0], server.launches[IDs[0]]["net"], server.launches[IDs[0]]["status"])
+        if self.shown() == truth:
+            if self.stale_since is not None: self.stale.append(clock[0] - self.stale_since)
+            self.stale_since = None
+        elif self.stale_since is None:
+            self.stale_since = clock[0]
+
+    def same(self, server) -> bool: # Whether the launches are those of the stand-in
+        count, truth = server.upcoming(self.LL2.t_min, limit=self.LL2.upcoming_limit)
+        return [(l.id, l.net) for l in self.LL2.launches] == [(ID, server.record(ID)["net"]) for ID in truth]
+
+
+async def simulate(scenario, seconds, n_clients, tmp) -> tuple: # (server, clients) after <seconds> of <scenario>
+    clock[0] = T0
+    server = await LL2Server(lambda: clock[0]).start()
+    scenario(server, max(1, -(-seconds//86400)))
+    clients = []
+    with contextlib.redirect_stdout(io.StringIO()): # LL2Sync prints every request
+        for i in range(n_clients):
+            directory = os.path.join(tmp, str(i))
+            os.mkdir(directory)
+            clients.append(Client(directory, server))
+        for t in range(T0, T0 + seconds):
+            clock[0] = t
+            for client in clients:
+                if client.wake <= t: await client.tick()
+                client.check(server)
+    await server.stop()
+    for client in clients:
+        if client.stale_since is not None: client.stale.append(clock[0] - client.stale_since)
+    return server, clients
+
+
+def report(name, server, clients) -> bool:
+    summary = server.summary()
+    kinds = ", ".join(f"{kind} {n} ({size/1e3:.0f} kB)" for kind, (n, size) in sorted(summary.items()))
+    print(f"{name}: stand-in served {kinds}")
+    passed = True
+    for i, client in enumerate(clients):
+        LL2, reads, stale = client.LL2, client.LL2.read_times, client.stale
+        same = client.same(server)
+        passed = passed and same and client.errors == 0
+        print(f"    client {i}: {LL2.ticks:4d} ticks, {len(LL2.budget.times):2d} requests in the last hour, {LL2.read_errors} broken responses, "
+              f"read+parse {1e3*sum(reads)/max(1, len(reads)):5.1f} ms mean, {1e3*max(reads, default=0):6.1f} ms max | "
+              f"stale {sum(stale):5d} s in {len(stale):2d} periods, worst {max(stale, default=0):4d} s | "
+              f"launches {'ok' if same else 'DIFFER'}" + (f", {client.errors} tick errors" if client.errors else ""))
+    return passed
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    argparser.add_argument("--hours", type=int, default=24)
+    argparser.add_argument("--clients", type=int, default=1)
+    args = argparser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS: argparser.error(f"unknown scenario {name}")
+
+    cwd = os.getcwd()
+    passed = True
+    with simulated_time():
+        for name in args.scenarios or SCENARIOS:
+            with tempfile.TemporaryDirectory() as tmp:
+                server, clients = asyncio.run(simulate(SCENARIOS[name], args.hours*3600, args.clients, tmp))
+                os.chdir(cwd)
+                passed = report(name, server, clients) and passed
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,184 @@
+""" Local stand-in for the LL2 API (CPython, asyncio), for host simulations of LL2Sync against a launch timeline.
+    It serves /2.3.0/launches/upcoming/ (with limit, mode=list/normal, ordering=net, net__gt, last_updated__gte, id and id__in)
+    and /2.3.0/api-throttle/, from launches built on the records of bench/fixtures/, so responses have realistic sizes.
+    The launches change at the times of scripted events, on a clock shared with the simulation (clock() in seconds).
+    Like LL2, at most <limit> requests per <window> seconds are answered (the api-throttle endpoint is not counted), others get a 429 status.
+    Adverse conditions can be scripted for periods of the timeline (see during()): bursts of 429 statuses, bodies cut off, a
+    failing api-throttle endpoint, and latency and bandwidth (these two in real seconds, since the simulated clock does not advance during a request).
+    Every request is logged as (time, kind, status, bytes sent), with kind "full", "delta", "details", "throttle" or "other".
+    Bodies are gzip-encoded for requests that accept it, like LL2 does, so the bytes sent are the compressed ones.
+    Plain HTTP only: LL2Sync reads https:// and http:// URLs alike, so a certificate would only add set-up.
+"""
+import asyncio
+import calendar
+import copy
+import gzip
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+
+
+def iso(unix): return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(unix))
+
+def iso_to_unix(iso): return calendar.timegm(time.strptime(iso, "%Y-%m-%dT%H:%M:%SZ"))
+
+def launch_id(i): return f"00000000-0000-4000-8000-{i:012d}"
+
+
+class LL2Server:
+    def __init__(self, clock, limit: int = 15, window: int = 3600):
+        self.clock = clock
+        self.limit = limit
+        self.window = window
+        with open(os.path.join(FIXTURES, "upcoming_list.json")) as f:
+            self.list_templates = json.load(f)["results"]
+        with open(os.path.join(FIXTURES, "upcoming_normal.json")) as f:
+            self.normal_template = json.load(f)["results"][0]
+        self.launches = {} # ID: {"net": unix, "last_updated": unix, "status": status id, "precision": net_precision id, "template": index}
+        self.events = [] # (time, ID, changes), applied in order once clock() reaches their time
+        self.conditions = [] # (start, end, conditions) of during()
+        self.times = [] # Times of the counted requests in the current window
+        self.log = [] # (time, kind, status, bytes) of every request
+        self.server = None
+        self.port = None
+
+    ## Timeline
+    def add(self, i, net, last_updated=0, status=1, precision=1): # Adds launch number <i> (see launch_id()) with NET <net> (unix)
+        self.launches[launch_id(i)] = {"net": net, "last_updated": last_updated, "status": status, "precision": precision, "template": i % len(self.list_templates)}
+
+    def at(self, t, i, **changes): # At time <t>, changes the fields of launch <i> (net, status, precision, or deleted=True), which updates its last_updated
+        self.events.append((t, launch_id(i), changes))
+        self.events.sort(key=lambda event: event[0])
+
+    def during(self, start, end, **conditions):
+        """ From time <start> until <end>: status=429 (a burst of throttled responses, as when another device uses the limit),
+            truncate=<bytes> (bodies are cut off after this many bytes, and the connection is closed), latency=<seconds>
+            before every response, bandwidth=<bytes per second>, and throttle=<status> (the api-throttle endpoint answers
+            with an HTML error page and this status, also 200 as for a captive portal).
+        """
+        self.conditions.append((start, end, conditions))
+
+    def condition(self, name, default=None): # Value of condition <name> at the current time
+        now = self.clock()
+        for start, end, conditions in self.conditions:
+            if start <= now < end and name in conditions: return conditions[name]
+        return default
+
+    def advance(self): # Applies the events that are due
+        now = self.clock()
+        while self.events and self.events[0][0] <= now:
+            t, ID, changes = self.events.pop(0)
+            if changes.get("deleted"):
+                self.launches.pop(ID, None)
+                continue
+            launch = self.launches.setdefault(ID, {"net": 0, "status": 1, "precision": 1, "template": int(ID[-12:]) % len(self.list_templates)})
+            launch.update(changes)
+            launch["last_updated"] = t
+
+    def upcoming(self, net_gt=None, since=None, limit=10, IDs=None) -> tuple: # (count, IDs of the matching launches in NET order, at most <limit>)
+        self.advance()
+        IDs = [ID for ID, l in sorted(self.launches.items(), key=lambda item: item[1]["net"])
+               if (net_gt is None or l["net"] > net_gt) and (since is None or l["last_updated"] >= since) and (IDs is None or ID in IDs)]
+        return len(IDs), IDs[:limit]
+
+    def record(self, ID, mode="list") -> dict: # The LL2 record of launch <ID>, as in a response
+        l = self.launches[ID]
+        record = copy.deepcopy(self.list_templates[l["template"]] if mode == "list" else self.normal_template)
+        record.update(id=ID, url=f"https://ll.thespacedevs.com/2.3.0/launches/{ID}/", response_mode=mode, last_updated=iso(l["last_updated"]),
+                      net=iso(l["net"]), window_start=iso(l["net"]), window_end=iso(l["net"]))
+        record["status"] = dict(record["status"], id=l["status"])
+        record["net_precision"] = dict(record["net_precision"], id=l["precision"])
+        return record
+
+    ## HTTP
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.writers = set()
+        return self
+
+    async def stop(self): # Also closes the connections that are kept alive
+        self.server.close()
+        for writer in list(self.writers): writer.close()
+        await asyncio.sleep(0) # Lets the handlers see the closed connections
+        await self.server.wait_closed()
+
+    @property
+    def base_url(self): return f"http://127.0.0.1:{self.port}/2.3.0/"
+
+    async def handle(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line: break
+                close = compress = False
+                while (header := await reader.readline()) not in (b"\r\n", b""):
+                    close = close or header.lower().startswith(b"connection: close")
+                    compress = compress or header.lower().startswith(b"accept-encoding:") and b"gzip" in header.lower()
+                status, body = self.respond(line.split()[1].decode())
+                encoding = b""
+                if compress:
+                    body, encoding = gzip.compress(body, mtime=0), b"Content-Encoding: gzip\r\n"
+                    self.log[-1] = self.log[-1][:3] + (len(body),)
+                data = b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n%sContent-Length: %d\r\n\r\n" % (status, b"OK" if status == 200 else b"Error", encoding, len(body)) + body
+                truncate = self.condition("truncate")
+                if truncate is not None:
+                    data = data[:len(data) - len(body) + truncate]
+                    self.log[-1] = self.log[-1][:3] + (min(truncate, len(body)),)
+                await asyncio.sleep(self.condition("latency", 0))
+                bandwidth = self.condition("bandwidth")
+                chunk = 1024 if bandwidth else len(data)
+                for i in range(0, len(data), chunk):
+                    writer.write(data[i:i + chunk])
+                    await writer.drain()
+                    if bandwidth: await asyncio.sleep(len(data[i:i + chunk])/bandwidth)
+                if close or truncate is not None: break
+        except ConnectionError:
+            pass
+        self.writers.discard(writer)
+        writer.close()
+
+    def respond(self, target) -> tuple: # (status, body) for the request of <target> (path and query)
+        now = self.clock()
+        url = urlsplit(target)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.times = [t for t in self.times if t > now - self.window]
+        if url.path.endswith("/api-throttle/") and self.condition("throttle") is not None:
+            kind, status = "throttle", self.condition("throttle")
+            body = b"<html><body><h1>%d Error</h1></body></html>" % status
+        elif url.path.endswith("/api-throttle/"):
+            kind, status = "throttle", 200
+            body = {"your_request_limit": self.limit, "limit_frequency_secs": self.window, "current_use": len(self.times),
+                    "next_use_secs": int(self.times[0] + self.window - now) if len(self.times) >= self.limit else 0, "ident": "127.0.0.1"}
+        elif len(self.times) >= self.limit or self.condition("status") == 429:
+            kind, status, body = "other", 429, {"detail": "Request was throttled."}
+        elif url.path.endswith("/launches/upcoming/"):
+            self.times.append(now)
+            status = 200
+            IDs = query["id__in"].split(",") if "id__in" in query else [query["id"]] if "id" in query else None
+            since = iso_to_unix(query["last_updated__gte"]) if "last_updated__gte" in query else None
+            net_gt = iso_to_unix(query["net__gt"]) if "net__gt" in query else None
+            count, IDs = self.upcoming(net_gt, since, int(query.get("limit", 10)), IDs)
+            mode = query.get("mode", "list")
+            kind = "details" if mode == "normal" else "delta" if since is not None else "full"
+            body = {"count": count, "next": None, "previous": None, "results": [self.record(ID, mode) for ID in IDs]}
+        else:
+            self.times.append(now)
+            kind, status, body = "other", 404, {"detail": "Not found."}
+        if not isinstance(body, bytes): body = json.dumps(body).encode("utf-8")
+        self.log.append((now, kind, status, len(body)))
+        return status, body
+
+    def summary(self) -> dict: # {kind: [requests, bytes]} of the logged requests with status 200, and "429" for the throttled ones
+        summary = {}
+        for t, kind, status, size in self.log:
+            entry = summary.setdefault(kind if status == 200 else str(status), [0, 0])
+            entry[0] += 1
+            entry[1] += size
+        return summary
+
@@ -0,0 +1,209 @@
+""" Host benchmark and conformance suite (CPython, no network) for medea and the LL2 launch parsing, on the responses in bench/fixtures/.
+    * Conformance: the (decoded) token stream of both medea backends must equal the one derived from the json module, and for LL2
+      responses (upcoming_*.json) LaunchParser must extract the same launches as a reference implementation based on json.
+    * Performance: tokens/s, bytes/s and peak allocation (tracemalloc) of both backends (the chunk one also with lazy values)
+      and of LaunchParser.
+      These are compared with bench/baseline.json, where a change beyond <tolerance> is flagged as a regression.
+      Timings depend on the machine, so refresh the baseline with --update-baseline when switching machines.
+    Usage: python bench/suite.py [--update-baseline] [--tolerance 0.25] [--repeat 20]
+"""
+import argparse
+import calendar
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+BASELINE = os.path.join(HERE, "baseline.json")
+sys.path.append(os.path.join(HERE, "..")) # Appended, so lib/zlib.py does not shadow the standard library
+sys.path.append(os.path.join(HERE, "..", "lib"))
+os.environ["TZ"] = "UTC" # utils.iso8601_to_unix() relies on time.mktime() using UTC, like on MicroPython
+time.tzset()
+
+import medea
+from launch import COUNTRY_KEYPATHS, Launch, LaunchParser
+
+KNOWN_NONCONFORMANT = { # Fixture: reason. These are reported, but do not fail the suite.
+}
+MISSING = object()
+
+
+## CONFORMANCE
+def reference_tokens(value): # The (token, value) stream medea should produce for a <value> decoded by the json module
+    if isinstance(value, dict):
+        yield (medea.OPEN, medea.OBJ)
+        for key, val in value.items():
+            yield (medea.KEY, key)
+            yield from reference_tokens(val)
+        yield (medea.CLOSE, medea.OBJ)
+    elif isinstance(value, list):
+        yield (medea.OPEN, medea.ARR)
+        for val in value:
+            yield from reference_tokens(val)
+        yield (medea.CLOSE, medea.ARR)
+    elif isinstance(value, bool):
+        yield (medea.BOOL, value)
+    elif value is None:
+        yield (medea.NUL, None)
+    elif isinstance(value, (int, float)):
+        yield (medea.NUM, value)
+    else:
+        yield (medea.STR, value)
+
+def reference_launches(doc): # The launches LaunchParser should extract from an LL2 response <doc> decoded by the json module
+    launches = []
+    for result in doc["results"] if "results" in doc else [doc]:
+        def get(*keypath):
+            value = result
+            for key in keypath:
+                try:
+                    value = value[key]
+                except (KeyError, IndexError, TypeError):
+                    return MISSING
+            return value
+        l = {}
+        fields = {"id": ("id",), "last_updated": ("last_updated",), "net": ("net",), "net_precision_id": ("net_precision", "id"), "image_thumbnail_url": ("image", "thumbnail_url"),
+                  "lsp": ("launch_service_provider", "name"), "pad": ("pad", "name"), "pad_location": ("pad", "location", "name")}
+        for name, keypath in fields.items():
+            if (value := get(*keypath)) is not MISSING: l[name] = value
+        if "net" in l: l["net_epoch"] = calendar.timegm(time.strptime(l["net"], "%Y-%m-%dT%H:%M:%SZ"))
+        status = {key: value for key in ("id", "name", "abbrev", "description") if (value := get("status", key)) is not MISSING}
+        if status: l["status"] = status
+        split = get("name").split(" | ")
+        if len(split) == 2: l["rocket_name"], l["payload_name"] = split
+        if (value := get("rocket", "configuration", "full_name")) is not MISSING: l["rocket_name"] = value
+        if (value := get("mission", "name")) is not MISSING: l["payload_name"] = value
+        for keypath in COUNTRY_KEYPATHS:
+            if (value := get(*keypath)) is not MISSING:
+                l["country"] = value
+                break
+        launches.append(l)
+    return launches
+
+def launch_dict(launch): # The known fields of a Launch, in the format of reference_launches() (which is the former dict format)
+    d = {}
+    for name in Launch.FIELDS:
+        if (value := getattr(launch, name)) is None: continue
+        if name.startswith("status_"):
+            d.setdefault("status", {})[name[len("status_"):]] = value
+        else:
+            d[name] = value
+    return d
+
+def typed(tokens): # Also compare value types, because 1 == 1.0 == True. Lazy keys and values are decoded first.
+    tokens = ((tok, val.decode("utf-8") if tok is medea.KEY and type(val) is bytes else val) for tok, val in tokens)
+    tokens = ((tok, val.value() if type(val) is medea.LazyValue else val) for tok, val in tokens)
+    return [(tok, type(val), val) for tok, val in tokens]
+
+def check(path): # Returns a list of conformance failures for the fixture at <path>
+    with open(path, "rb") as f:
+        doc = json.loads(f.read().decode("utf-8"))
+    failures = []
+    expected = typed(reference_tokens(doc))
+    for bulk, lazy in ((False, False), (True, False), (True, True)):
+        name = f"tokenizeFile(bulk={bulk}, lazy={lazy})"
+        try:
+            tokens = typed(medea.tokenizeFile(path, bulk, lazy))
+        except Exception as e:
+            failures.append(f"{name} raised {e!r}")
+            continue
+        if tokens != expected:
+            i = next((i for i, (a, b) in enumerate(zip(tokens, expected)) if a != b), min(len(tokens), len(expected)))
+            got = tokens[i] if i < len(tokens) else "end of stream"
+            want = expected[i] if i < len(expected) else "end of stream"
+            failures.append(f"{name} token {i}: {got} != {want}")
+    if os.path.basename(path).startswith("upcoming_"):
+        for lazy in (False, True):
+            launches = LaunchParser().parse(medea.tokenizeFile(path, lazy=lazy))
+            if [launch_dict(launch) for launch in launches] != reference_launches(doc):
+                failures.append(f"LaunchParser launches (lazy={lazy}) differ from the reference")
+    return failures
+
+
+## PERFORMANCE
+def timed(run, repeat): # Seconds per run
+    t = time.perf_counter()
+    for _ in range(repeat):
+        run()
+    return (time.perf_counter() - t)/repeat
+
+def peak(run): # Peak number of bytes allocated during a run
+    tracemalloc.start()
+    run()
+    result = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+def measure(path, repeat):
+    size = os.path.getsize(path)
+    metrics = {}
+    for name, bulk, lazy in (("bytes", False, False), ("chunks", True, False), ("lazy", True, True)):
+        count = sum(1 for _ in medea.tokenizeFile(path, bulk, lazy))
+        run = lambda: sum(1 for _ in medea.tokenizeFile(path, bulk, lazy))
+        dt = timed(run, repeat)
+        metrics[f"tokenize_{name}"] = {"tokens_per_s": count/dt, "bytes_per_s": size/dt, "peak_bytes": peak(run)}
+    parser = LaunchParser()
+    run = lambda: parser.parse(medea.tokenizeFile(path, lazy=True)) # As in LL2Sync
+    metrics["parse"] = {"bytes_per_s": size/timed(run, repeat), "peak_bytes": peak(run)}
+    return metrics
+
+def regressions(metrics, baseline, tolerance): # Metrics that became worse than <baseline> by more than <tolerance>
+    found = []
+    for group, values in metrics.items():
+        for key, value in values.items():
+            base = baseline.get(group, {}).get(key)
+            if base is None: continue
+            if key.endswith("_per_s") and value < base*(1 - tolerance) or key == "peak_bytes" and value > base*(1 + tolerance):
+                found.append(f"{group}.{key}: {value:.0f} (baseline {base:.0f})")
+    return found
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--update-baseline", action="store_true", help="store the current performance as the baseline")
+    argparser.add_argument("--tolerance", type=float, default=0.25, help="relative change that is flagged as a regression")
+    argparser.add_argument("--repeat", type=int, default=20, help="number of runs to average timings over")
+    args = argparser.parse_args()
+
+    failed = False
+    print("Conformance")
+    for name in sorted(os.listdir(FIXTURES)):
+        failures = check(os.path.join(FIXTURES, name))
+        known = KNOWN_NONCONFORMANT.get(name)
+        if not failures:
+            print(f"    {name:24s} ok" + (" (listed as known non-conformant, remove it from KNOWN_NONCONFORMANT)" if known else ""))
+            continue
+        print(f"    {name:24s} {'KNOWN FAILURE: ' + known if known else 'FAILED'}")
+        for failure in failures:
+            print(f"        {failure}")
+        failed = failed or known is None
+
+    print("Performance")
+    try:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    except OSError:
+        baseline = {}
+    results = {}
+    for name in sorted(os.listdir(FIXTURES)):
+        if not name.startswith("upcoming_"): continue
+        results[name] = metrics = measure(os.path.join(FIXTURES, name), args.repeat)
+        print(f"    {name}")
+        for group, values in metrics.items():
+            print(f"        {group:16s}" + "".join(f"  {key} {value:10.0f}" for key, value in values.items()))
+        for regression in regressions(metrics, baseline.get(name, {}), args.tolerance):
+            print(f"        REGRESSION {regression}")
+            failed = True
+
+    if args.update_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {BASELINE}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
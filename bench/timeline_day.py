@@ -0,0 +1,76 @@
+""" Host simulation (CPython) of a day of AsyncLL2Sync against the LL2 stand-in of bench/ll2server.py (the day of
+    bench/delta_day.py), to compare ticking every 10 s, as formerly, with ticking at the instants of timeline.Timeline
+    (LL2Sync.wake_time(), at most MAX_SLEEP seconds apart). Reported per policy: ticks per day, requests, and the lag
+    between a threshold crossing (e.g. T-60) and the refresh it triggers. The NETs of the day are whole multiples of 10 s,
+    so the ticks start PHASE seconds later, as they would for NETs at any second.
+    Usage: python bench/timeline_day.py
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+from ll2_harness import T0, TICK, clock # Also sets up sys.path and TZ
+from delta_day import DAY, timeline
+from ll2server import LL2Server
+import ll2
+from timeline import CROSSING
+
+PHASE = 3
+
+
+async def run(polling):
+    clock[0] = T0 + PHASE
+    server = await LL2Server(lambda: clock[0]).start()
+    timeline(server)
+    lags = []
+    with contextlib.redirect_stdout(io.StringIO()): # LL2Sync prints every request
+        LL2 = ll2.AsyncLL2Sync(base_url=server.base_url)
+        ll2.scheduler.cancel(LL2.task_tick) # Ticked below, on the simulated clock
+        t = T0 + PHASE
+        while t < T0 + DAY:
+            clock[0] = t
+            LL2.plan_timeline()
+            due = [instant for instant, kind, threshold in LL2.timeline.heap if kind == CROSSING and instant <= t]
+            crossings = LL2.timeline.crossings
+            await LL2.tick()
+            if LL2.timeline.crossings > crossings and not LL2.threshold_pending: lags.append(t - min(due))
+            t = t + TICK if polling else max(t + 1, int(min(LL2.wake_time(), t + ll2.MAX_SLEEP)))
+    await server.stop()
+    ll2.scheduler.cancel(LL2.task_tick)
+    count, truth = server.upcoming(LL2.t_min, limit=LL2.upcoming_limit)
+    ok = [(l.id, l.net) for l in LL2.launches] == [(ID, server.record(ID)["net"]) for ID in truth]
+    return LL2.ticks, server.summary(), lags, ok
+
+
+def main():
+    time.time = lambda: clock[0] # LL2Sync, RequestBudget and LaunchCache all use time.time()
+    cwd = os.getcwd()
+    passed = True
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp) # LL2Sync keeps its cache and budget in the working directory
+        for name, polling in (("polling", True), ("timeline", False)):
+            for path in os.listdir(tmp): os.remove(path)
+            t = time.perf_counter()
+            ticks, summary, lags, ok = asyncio.run(run(polling))
+            elapsed = time.perf_counter() - t
+            results[name] = lags
+            passed = passed and ok
+            requests = sum(n for kind, (n, size) in summary.items() if kind != "throttle")
+            print(f"    {name:8s}  {ticks:5d} ticks/day, {requests:3d} requests, {len(lags):2d} threshold refreshes, lag mean "
+                  f"{sum(lags)/max(1, len(lags)):4.1f} s, worst {max(lags, default=0):4.1f} s  ({elapsed:4.1f} s to simulate)"
+                  + ("" if ok else "  launches DIFFER"))
+        os.chdir(cwd)
+    passed = passed and max(results["timeline"], default=0) <= 1 and len(results["timeline"]) >= len(results["polling"])
+    print("ok" if passed else "FAILED")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,104 @@
+import json
+import time
+
+from utils import log_exc
+
+
+# Request classes, from most to least important
+THRESHOLD = 0 # Refresh of the NETs because a Threshold was passed (near T-0)
+UPCOMING = 1 # Routine refresh of the upcoming launches
+DETAILS = 2 # Detailed request (id__in) of the launches queued for details, batched into one request
+
+
+class RequestBudget:
+    def __init__(self, limit: int = 15, window: int = 3600, reserve: int = 4, spare: int = 2, statefile: str = "llbudget.json"):
+        """ Keeps track of the requests made in the last <window> seconds, of which LL2 allows at most <limit>.
+            The last <reserve> requests of the window are kept for THRESHOLD requests, and another <spare> for UPCOMING
+            requests, so that draining the queue of DETAILS requests can not leave the Thresholds without a request.
+            The times of the requests are stored in <statefile>, so a reboot does not reset the count.
+        """
+        self.limit = limit
+        self.window = window
+        self.reserves = (0, reserve, reserve + spare) # Requests that must remain available to make a request of each class
+        self.statefile = statefile
+        self.times = [] # Times of the requests in the current window, oldest first
+        self.blocked_until = 0 # Time before which no request may be made at all (after a 429 status)
+        self.synced = 0 # Time of the last sync with the api-throttle endpoint
+        self.denied = [0, 0, 0] # Number of requests that were not allowed, by class
+        self.load()
+
+    def expire(self, now):
+        while self.times and self.times[0] <= now - self.window: self.times.pop(0)
+
+    def used(self, now=None) -> int: # Requests made in the last <window> seconds
+        self.expire(time.time() if now is None else now)
+        return len(self.times)
+
+    def remaining(self, now=None) -> int:
+        return max(0, self.limit - self.used(now))
+
+    def allows(self, kind: int, now=None) -> bool: # Whether a request of class <kind> may be made now
+        if now is None: now = time.time()
+        if now < self.blocked_until or self.remaining(now) <= self.reserves[kind]:
+            self.denied[kind] += 1
+            return False
+        return True
+
+    def available_at(self, kind: int, now=None): # Earliest time at which allows(kind) can be True, if no other requests are made
+        if now is None: now = time.time()
+        if self.limit <= self.reserves[kind]: return float("inf") # Never, with this limit (e.g. a low your_request_limit from sync())
+        excess = self.used(now) - (self.limit - self.reserves[kind]) # Requests that must leave the window first, minus one
+        t = self.times[excess] + self.window if excess >= 0 else now
+        return max(t, self.blocked_until)
+
+    def record(self, now=None): # Counts a request made at <now>
+        self.times.append(time.time() if now is None else now)
+        self.save()
+
+    def block(self, seconds, now=None): # The API told us (with a 429 status) to wait <seconds>
+        if now is None: now = time.time()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.save()
+
+    def needs_sync(self, min_interval: int = 300, now=None) -> bool: # Whether the count should be checked with the api-throttle endpoint
+        """ Only needed once the reserve of the Thresholds is reached: then a few requests that were not counted (e.g. made
+            by another device with the same IP address, or before a reboot without a saved state) would use it up.
+        """
+        if now is None: now = time.time()
+        return self.remaining(now) <= self.reserves[UPCOMING] and now - self.synced >= min_interval
+
+    def sync(self, current_use: int, next_use_secs: int = 0, limit: int = None, now=None):
+        """ Adopts the count of the api-throttle endpoint ("current_use", "next_use_secs" and "your_request_limit").
+            Requests that the server counted but we did not are assumed to have been made just now (so they expire last).
+        """
+        if now is None: now = time.time()
+        if limit: self.limit = limit
+        self.expire(now)
+        if current_use < len(self.times):
+            self.times = self.times[len(self.times) - current_use:] if current_use > 0 else []
+        else:
+            self.times.extend([now]*(current_use - len(self.times)))
+        if next_use_secs: self.blocked_until = max(self.blocked_until, now + next_use_secs)
+        self.synced = now
+        self.save()
+
+    def save(self):
+        try:
+            with open(self.statefile, "w") as f:
+                json.dump({"times": self.times, "blocked_until": self.blocked_until, "synced": self.synced}, f)
+        except OSError as e:
+            log_exc(e)
+
+    def load(self):
+        try:
+            with open(self.statefile, "r") as f:
+                state = json.load(f)
+            self.times = state["times"]
+            self.blocked_until = state["blocked_until"]
+            self.synced = state["synced"]
+        except (OSError, KeyError, ValueError): # No state yet (first boot) or invalid
+            pass
+
+    def stats(self, now=None) -> dict:
+        return {"used": self.used(now), "limit": self.limit, "blocked_until": self.blocked_until,
+                "denied_threshold": self.denied[THRESHOLD], "denied_upcoming": self.denied[UPCOMING], "denied_details": self.denied[DETAILS]}
@@ -0,0 +1,175 @@
+import struct
+import time
+
+from launch import Launch
+from lazy import LazyModule
+from utils import replace_file
+
+medea = LazyModule("medea") # Only needed for the JSON cache of older versions
+
+
+MAGIC = b"LLC1"
+HEADER, LAUNCH, QUEUE, END = b"H", b"L", b"Q", b"E" # Kinds of record
+
+
+def pack(kind: bytes, values) -> bytes:
+    """ A record of the compact format: its length (2 bytes), its <kind> (1 byte), and then each of the <values> as a tag
+        byte followed by its data: N(one), T(rue), F(alse), i(nt32), q (int64), d(ouble), or s(tring, with a 2-byte length).
+    """
+    parts = [kind]
+    for val in values:
+        if val is None: parts.append(b"N")
+        elif val is True: parts.append(b"T")
+        elif val is False: parts.append(b"F")
+        elif type(val) is int: parts.append(b"i" + struct.pack(">i", val) if -0x80000000 <= val < 0x80000000 else b"q" + struct.pack(">q", val))
+        elif type(val) is float: parts.append(b"d" + struct.pack(">d", val))
+        else:
+            data = str(val).encode("utf-8")
+            parts.append(b"s" + struct.pack(">H", len(data)) + data)
+    payload = b"".join(parts)
+    return struct.pack(">H", len(payload)) + payload
+
+def unpack(payload: bytes) -> tuple: # Inverse of pack(): (kind, values)
+    values = []
+    i, n = 1, len(payload)
+    while i < n:
+        tag = payload[i]
+        i += 1
+        if tag == 78: values.append(None) # N
+        elif tag == 84: values.append(True) # T
+        elif tag == 70: values.append(False) # F
+        elif tag == 105: # i
+            values.append(struct.unpack_from(">i", payload, i)[0])
+            i += 4
+        elif tag == 113: # q
+            values.append(struct.unpack_from(">q", payload, i)[0])
+            i += 8
+        elif tag == 100: # d
+            values.append(struct.unpack_from(">d", payload, i)[0])
+            i += 8
+        elif tag == 115: # s
+            length = struct.unpack_from(">H", payload, i)[0]
+            values.append(payload[i + 2:i + 2 + length].decode("utf-8"))
+            i += 2 + length
+        else:
+            raise ValueError("Invalid tag in cache record")
+    return payload[:1], values
+
+def records(f): # Generator of the (kind, values) of the records in file <f>, read one at a time
+    while True:
+        size = f.read(2)
+        if not size: return
+        if len(size) < 2: raise ValueError("Truncated cache")
+        length = struct.unpack(">H", size)[0]
+        payload = f.read(length)
+        if len(payload) < length: raise ValueError("Truncated cache")
+        yield unpack(payload)
+
+
+class LaunchCache:
+    def __init__(self, path: str = "llcache.bin", legacy: str = "llcache.json", min_interval: int = 60):
+        """ Stores the launches, the request queue and the time of the last request in <path>, in a compact format of
+            length-prefixed records, which is read one record at a time. A save is written to a temporary file, which then
+            replaces <path>, so a power cut during a save leaves the previous cache intact. Saves within <min_interval>
+            seconds of the previous write only mark the cache as dirty, and are written by a later save.
+            When <path> does not exist, the JSON cache of older versions (<legacy>) is loaded instead.
+        """
+        self.path = path
+        self.legacy = legacy
+        self.min_interval = min_interval
+        self.dirty = False # Whether there are changes that were not written yet
+        self.written = 0 # Time of the last write
+        self.writes = 0
+        self.coalesced = 0 # Saves that were not written (yet) because of <min_interval>
+
+    def save(self, launches, queue: list, lastfetch, force: bool = False, now=None) -> bool: # Whether the cache was written
+        if now is None: now = time.time()
+        self.dirty = True
+        if not force and now - self.written < self.min_interval:
+            self.coalesced += 1
+            return False
+        self.write(launches, queue, lastfetch)
+        self.dirty = False
+        self.written = now
+        self.writes += 1
+        return True
+
+    def write(self, launches, queue: list, lastfetch): # If power is lost while replacing the file, load() uses <path>.tmp
+        def records(f):
+            f.write(MAGIC)
+            f.write(pack(HEADER, [lastfetch] + list(Launch.__slots__)))
+            n = 0
+            for launch in launches:
+                f.write(pack(LAUNCH, launch.to_list()))
+                n += 1
+            for entry in queue:
+                f.write(pack(QUEUE, entry))
+            f.write(pack(END, [n, len(queue)])) # Only a complete file has this record
+        replace_file(self.path, records)
+
+    def load(self) -> tuple:
+        """ Returns (launches, queue, lastfetch) from the cache. Raises OSError if there is no cache, or ValueError if it is invalid. """
+        try:
+            return self.load_compact(self.path)
+        except (OSError, ValueError):
+            pass
+        try: # Power was lost between removing <path> and renaming the complete temporary file
+            return self.load_compact(self.path + ".tmp")
+        except (OSError, ValueError):
+            pass
+        return self.load_legacy(self.legacy)
+
+    def load_compact(self, path: str) -> tuple:
+        launches, queue, fields, lastfetch = [], [], None, 0
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC: raise ValueError("Not a launch cache")
+            for kind, values in records(f):
+                if kind == HEADER:
+                    lastfetch, fields = values[0], values[1:]
+                elif kind == LAUNCH and fields is not None:
+                    launches.append(Launch.from_list(values, fields))
+                elif kind == QUEUE:
+                    queue.append(values)
+                elif kind == END:
+                    if values != [len(launches), len(queue)]: break
+                    return launches, queue, lastfetch
+        raise ValueError("Incomplete cache")
+
+    @staticmethod
+    def load_legacy(path: str) -> tuple:
+        """ Reads the JSON cache of older versions with medea, one launch at a time, instead of json.load() of the whole file:
+            {"fields": [names], "launches": [[values], ...], "lastfetch": t, "queue": [...]}, or with a dict per launch.
+        """
+        fields, launches, queue, rows, lastfetch = [], [], [], {}, [0]
+        pending = [] # Lists of values seen before "fields"
+        def row(stars): # Values (list) or Launch (dict format) of the launch being read
+            return rows.setdefault(stars[0], [])
+        def value(val, stars): row(stars).append(val)
+        def field(name):
+            def handler(val, stars):
+                if type(rows.get(stars[0])) is not Launch: rows[stars[0]] = Launch()
+                setattr(rows[stars[0]], name, val)
+            return handler
+        def close(kind, stars):
+            launch = rows.pop(stars[0], None)
+            if type(launch) is Launch: launches.append(launch)
+            elif fields: launches.append(Launch.from_list(launch or [], fields))
+            else: pending.append(launch or [])
+        def entry(kind, stars): queue.append(rows.pop(stars[0], []))
+
+        keypaths = medea.KeyPaths()
+        keypaths.register(("fields", "*"), lambda val, stars: fields.append(val))
+        keypaths.register(("lastfetch",), lambda val, stars: lastfetch.__setitem__(0, val))
+        keypaths.register(("launches", "*", "*"), value)
+        keypaths.register(("launches", "*"), close)
+        for name in Launch.__slots__:
+            keypaths.register(("launches", "*", name), field(name))
+            if name.startswith("status_"): keypaths.register(("launches", "*", "status", name[7:]), field(name))
+        keypaths.register(("queue", "*", "*"), value)
+        keypaths.register(("queue", "*"), entry)
+        try:
+            keypaths.walk(medea.tokenizeFile(path, lazy=True))
+        except AssertionError as e: # Invalid JSON
+            raise ValueError(str(e))
+        launches += [Launch.from_list(values, fields or Launch.__slots__) for values in pending]
+        return launches, queue, lastfetch[0]
@@ -0,0 +1,41 @@
+import time
+
+from budget import UPCOMING
+
+
+HOLD = 5 # LL2 status id of "On Hold"
+PRECISE = 2 # LL2 net_precision id of "Hour": higher ids (Morning, Afternoon, Day, Week, Month, Quarter, ...) are too vague to count down to
+
+
+class CadencePlanner:
+    def __init__(self, min_interval: int = 120, max_interval: int = 3600, ramp: int = 8, hold_interval: int = 180, handover: int = 0):
+        """ Plans the interval between routine refreshes of the upcoming list from the launch shown on the clock: 1/<ramp>
+            of the time until (or since) its NET, between <min_interval> and <max_interval> seconds. A launch on hold is
+            refreshed at least every <hold_interval> seconds, one with a NET less precise than an hour every <max_interval>.
+            Polling rarely while the launch is far away leaves the hourly limit of the API unspent, for its last hour.
+            From <handover> seconds before T-0, the Threshold refreshes (see LL2Sync.timeline) keep the launch up to date.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.ramp = ramp
+        self.hold_interval = hold_interval
+        self.handover = handover
+
+    def desired(self, launch, now) -> int: # Interval for <launch> if the budget were no concern
+        if launch is None or not launch.net_epoch: return self.min_interval # Nothing to show yet
+        if launch.net_precision_id is not None and launch.net_precision_id > PRECISE: interval = self.max_interval
+        else: interval = int(abs(launch.net_epoch - now))//self.ramp
+        if launch.status_id == HOLD: interval = min(interval, self.hold_interval) # A new NET can come at any time
+        return max(self.min_interval, min(interval, self.max_interval))
+
+    def interval(self, launch, budget, now=None) -> int:
+        """ desired(), but no shorter than needed to spread the routine requests that <budget> allows now (so not those
+            kept for the Thresholds) over the time until the handover to the Thresholds, so they are not all spent long
+            before T-0. Spreading them up to T-0 instead would space them further apart than needed in the last hour.
+        """
+        if now is None: now = time.time()
+        interval = self.desired(launch, now)
+        spendable = budget.remaining(now) - budget.reserves[UPCOMING]
+        if launch is not None and launch.net_epoch and launch.net_epoch - self.handover > now and spendable > 0:
+            interval = max(interval, int(min(launch.net_epoch - self.handover - now, budget.window))//spendable)
+        return interval
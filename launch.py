@@ -0,0 +1,263 @@
+from lazy import LazyModule
+from utils import iso8601_to_unix
+
+medea = LazyModule("medea") # Only needed to parse responses
+
+
+COUNTRY_KEYPATHS = [ # Country codes are found in many places. First has highest priority.
+    ("rocket", "configuration", "manufacturer", "country", 0, "alpha_2_code"),
+    ("launch_service_provider", "country", 0, "alpha_2_code"),
+    ("mission", "agencies", 0, "country", 0, "alpha_2_code"),
+    ("pad", "country", "alpha_2_code"),
+    ("pad", "agencies", 0, "country", 0, "alpha_2_code")
+]
+
+
+class Launch:
+    """ Fixed-schema record of a launch, with a slot for every field used by the clock (None while unknown).
+        This avoids the hash table of a dict per launch, and of a nested dict for its status.
+    """
+    __slots__ = ("id", "last_updated", "net", "net_epoch", "net_precision_id", "image_thumbnail_url", "rocket_name", "payload_name", "pad",
+                 "pad_location", "lsp", "country", "status_id", "status_name", "status_abbrev", "status_description", "detailed")
+    FIELDS = __slots__[:-1] # Fields that come from LL2 (so not "detailed")
+
+    def __init__(self, id=None):
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        self.id = id
+        self.detailed = False # Whether the launch was fetched in detailed mode
+
+    def update(self, other) -> list: # Overwrites the fields of this launch with the known fields of Launch <other>, in place. Returns the names of those that changed.
+        changed = []
+        for name in self.FIELDS:
+            val = getattr(other, name)
+            if val is not None and val != getattr(self, name):
+                setattr(self, name, val)
+                changed.append(name)
+        return changed
+
+    def to_list(self) -> list: # Values of all slots, in the order of Launch.__slots__
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values, names=__slots__): # Inverse of to_list(), where <names> are the slots the <values> belong to
+        launch = cls()
+        for name, val in zip(names, values):
+            if name in cls.__slots__:
+                setattr(launch, name, val)
+        return launch
+
+    @classmethod
+    def from_dict(cls, d): # Converts a launch dict, as stored in the cache by older versions
+        launch = cls()
+        for name, val in d.items():
+            if name == "status":
+                for key, v in val.items():
+                    if "status_" + key in cls.__slots__:
+                        setattr(launch, "status_" + key, v)
+            elif name in cls.__slots__:
+                setattr(launch, name, val)
+        return launch
+
+
+class LaunchStore:
+    """ The known launches, indexed by ID, and ordered by NET: a list kept sorted by binary search on insertion (MicroPython
+        has no bisect module), so a lookup by ID is O(1), and upsert() and expire() need O(log n) comparisons.
+        Behaves like a list of launches in NET order for len(), iteration and indexing, and like a set of IDs for <in>.
+    """
+    def __init__(self, launches=()):
+        self.by_id = {}
+        self.nets = [] # Sort keys of self.launches
+        self.launches = [] # Launches in order of NET
+        for launch in launches: self.upsert(launch)
+
+    @staticmethod
+    def key(launch): return launch.net_epoch or 0 # A launch without NET comes first, and expires first
+
+    def bisect(self, net, right=False) -> int: # Index where a launch with key <net> is inserted, before (or if <right>, after) equal keys
+        lo, hi = 0, len(self.nets)
+        while lo < hi:
+            mid = (lo + hi)//2
+            if self.nets[mid] < net or right and self.nets[mid] == net: lo = mid + 1
+            else: hi = mid
+        return lo
+
+    def insert(self, launch):
+        i = self.bisect(self.key(launch), right=True)
+        self.nets.insert(i, self.key(launch))
+        self.launches.insert(i, launch)
+
+    def unlink(self, launch): # Removes <launch> from the NET order (using its key as it was inserted)
+        i = self.bisect(self.key(launch))
+        while self.launches[i] is not launch: i += 1 # Launches with the same NET
+        del self.nets[i]
+        del self.launches[i]
+
+    def get(self, ID) -> Launch | None: return self.by_id.get(ID)
+
+    def upsert(self, launch: Launch) -> tuple:
+        """ Adds <launch>, or updates the known launch with its ID. Returns (stored launch, whether it is new, names of the fields that changed). """
+        known = self.by_id.get(launch.id)
+        if known is None:
+            self.by_id[launch.id] = launch
+            self.insert(launch)
+            return launch, True, []
+        if launch.net_epoch is not None and launch.net_epoch != known.net_epoch: # Moves to another place in the NET order
+            self.unlink(known)
+            changed = known.update(launch)
+            self.insert(known)
+        else:
+            changed = known.update(launch)
+        return known, False, changed
+
+    def remove(self, ID) -> Launch | None:
+        launch = self.by_id.pop(ID, None)
+        if launch is not None: self.unlink(launch)
+        return launch
+
+    def expire(self, t_min) -> int: # Removes the launches with NET <= <t_min>, and returns how many
+        n = self.bisect(t_min, right=True)
+        for launch in self.launches[:n]: del self.by_id[launch.id]
+        del self.nets[:n]
+        del self.launches[:n]
+        return n
+
+    def retain(self, IDs) -> int: # Removes the launches whose ID is not in <IDs>, and returns how many
+        gone = [ID for ID in self.by_id if ID not in IDs]
+        for ID in gone: self.remove(ID)
+        return len(gone)
+
+    def trim(self, n) -> int: # Removes the launches after the first <n>, and returns how many
+        gone = self.launches[n:]
+        for launch in gone: del self.by_id[launch.id]
+        del self.nets[n:]
+        del self.launches[n:]
+        return len(gone)
+
+    def head(self) -> Launch | None: return self.launches[0] if self.launches else None # Launch with the earliest NET
+
+    def __len__(self): return len(self.launches)
+
+    def __iter__(self): return iter(self.launches)
+
+    def __getitem__(self, i): return self.launches[i]
+
+    def __contains__(self, ID): return ID in self.by_id
+
+
+class ChangeSet:
+    """ What changed in the launches since it was taken by the display (see LL2Sync.take_changes()): the names of the fields
+        that changed, by launch ID, and whether another launch came first (then everything about the first launch is new).
+    """
+    __slots__ = ("fields", "head")
+
+    def __init__(self, head: bool = True):
+        self.fields = {} # ID: set of field names
+        self.head = head
+
+    def record(self, ID, names):
+        if names: self.fields.setdefault(ID, set()).update(names)
+
+    def launch(self, ID) -> set: return self.fields.get(ID, set()) # Names of the fields of launch <ID> that changed
+
+    def __bool__(self): return self.head or bool(self.fields)
+
+
+class LaunchParser:
+    def __init__(self):
+        """ Extracts the fields shown by the clock from an LL2 launch response, which is either a pure launch or an object
+            like {<request_metadata>, "results": [<launch(es)>]}. The key paths are compiled once, and then walked for every response.
+            A launch is complete once all top-level sections with a subscribed path (like "pad") have been read, so the rest
+            of it is skipped. In mode=normal, these come long before the large trailing sections (like "timeline").
+        """
+        self.sections = [] # Top-level keys of the subscribed paths
+        self.keypaths = self.compile_keypaths()
+        self.launches = None # Launches of the response that is being walked by self.keypaths
+        self.priorities = None # Priority (index in COUNTRY_KEYPATHS) of the country found so far, for each of self.launches
+        self.seen = None # Bitmask of the sections that were read, for each of self.launches
+        self.count = None # Number of launches after which the response is complete
+        self.complete = 0 # Number of complete launches in the response being walked
+
+    def parse(self, tokens, skip=True, count=None) -> list[Launch]:
+        """ Returns a list with a Launch for every launch in the medea <tokens>. When <count> launches are complete, the rest
+            of the response is not read (e.g. count=1 when requesting a single launch).
+        """
+        return medea.runSteps(self.steps(tokens, skip, count))
+
+    def steps(self, tokens, skip=True, count=None): # Generator version of parse(), see medea.KeyPaths.steps()
+        self.launches = launches = [Launch()]
+        self.priorities = [len(COUNTRY_KEYPATHS)]
+        self.seen = [0]
+        self.count, self.complete = count, 0
+        try:
+            yield from self.keypaths.steps(tokens, skip)
+        finally:
+            self.launches = self.priorities = self.seen = None
+        return launches
+
+    def compile_keypaths(self) -> "medea.KeyPaths":
+        def index(stars): # Index in <self.launches> of the result being walked
+            i = stars[0] if stars else 0
+            while len(self.launches) <= i:
+                self.launches.append(Launch())
+                self.priorities.append(len(COUNTRY_KEYPATHS))
+                self.seen.append(0)
+            return i
+        def launch(stars): return self.launches[index(stars)]
+        def field(name): # Handler copying the value into launch.<name>
+            def handler(val, stars): setattr(launch(stars), name, val)
+            return handler
+        def net(val, stars):
+            l = launch(stars)
+            l.net = val
+            l.net_epoch = iso8601_to_unix(val)
+        def name(val, stars):
+            split = val.split(" | ") # Failsafe when not using detailed mode
+            if len(split) != 2: return
+            l = launch(stars)
+            if l.rocket_name is None: l.rocket_name = split[0]
+            if l.payload_name is None: l.payload_name = split[1]
+        def country(priority):
+            def handler(val, stars):
+                i = index(stars)
+                if self.priorities[i] >= priority:
+                    self.launches[i].country = val
+                    self.priorities[i] = priority
+            return handler
+        def section(bit, complete): # Handler marking a section as read, which returns SKIP or STOP once the launch is complete
+            def handler(val, stars):
+                i = index(stars)
+                if self.seen[i] == complete: return # Already complete
+                self.seen[i] |= bit
+                if self.seen[i] != complete: return
+                self.complete += 1
+                return medea.STOP if self.count is not None and self.complete >= self.count else medea.SKIP
+            return handler
+
+        subscriptions = [
+            (("id",), field("id")),
+            (("last_updated",), field("last_updated")), # Changes whenever LL2 updates the launch (see LL2Sync.last_updated)
+            (("net",), net),
+            (("net_precision", "id"), field("net_precision_id")), # >2: Uncertainty >1h, so probably not interesting to show on clock
+            (("image", "thumbnail_url"), field("image_thumbnail_url")),
+            (("name",), name),
+            (("rocket", "configuration", "full_name"), field("rocket_name")),
+            (("mission", "name"), field("payload_name")),
+            (("pad", "name"), field("pad")),
+            (("pad", "location", "name"), field("pad_location")),
+            (("launch_service_provider", "name"), field("lsp")),
+        ]
+        subscriptions += [(("status", key), field("status_" + key)) for key in ("id", "name", "abbrev", "description")]
+        subscriptions += [(keypath, country(i)) for i, keypath in enumerate(COUNTRY_KEYPATHS)]
+
+        for keypath, _ in subscriptions:
+            if keypath[0] not in self.sections: self.sections.append(keypath[0])
+        complete = (1 << len(self.sections)) - 1
+        subscriptions += [((key,), section(1 << i, complete)) for i, key in enumerate(self.sections)]
+
+        keypaths = medea.KeyPaths()
+        for keypath, handler in subscriptions:
+            keypaths.register(keypath, handler)
+            keypaths.register(("results", "*") + keypath, handler)
+        return keypaths
+
@@ -0,0 +1,92 @@
+import gc
+import sys
+
+from utils import ticks_diff, ticks_ms
+
+try:
+    import builtins
+except ImportError: # Older MicroPython
+    import ubuiltins as builtins
+
+
+imports = [] # (name, ms, heap bytes, depth) of the modules imported while profiling, and of every LazyModule that was loaded
+
+
+def heap_used() -> int: # Allocated bytes of the heap (on CPython: traced by tracemalloc, if it is tracing)
+    if hasattr(gc, "mem_alloc"): return gc.mem_alloc()
+    try:
+        import tracemalloc
+        return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    except ImportError:
+        return 0
+
+
+def record(name, importer, depth: int = 0): # Calls importer(), and records its duration and heap delta in <imports> under <name>
+    if depth == 0: gc.collect() # Not in nested imports, which would count it in the time of their importer
+    heap, start = heap_used(), ticks_ms()
+    i = len(imports)
+    imports.append(None) # Placeholder, so that nested imports come after their importer
+    try:
+        return importer()
+    finally:
+        ms = ticks_diff(ticks_ms(), start)
+        if depth == 0: gc.collect()
+        imports[i] = (name, ms, heap_used() - heap, depth)
+
+
+def load(name: str): # Imports module <name>, recording the duration and heap delta of its first import
+    if name in sys.modules: return sys.modules[name]
+    return record(name, lambda: __import__(name))
+
+
+class LazyModule:
+    """ Stands in for module <name> until one of its attributes is used, and only then imports it (see load()), so modules
+        that are not needed to show the countdown (network, parser) do not cost time and heap at boot. A failed import
+        raises ImportError at that use, and is tried again at the next one.
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr): # Only called for attributes that are not in the proxy itself
+        if self._module is None: self._module = load(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self): return f"<lazy module {self._name}{'' if self._module is None else ' (loaded)'}>"
+
+
+class ImportProfiler:
+    """ Within `with ImportProfiler():`, the first import of every module is recorded in <imports> (with the imports it
+        does itself indented below it), by replacing builtins.__import__. On firmware that does not allow that, nothing
+        is recorded.
+    """
+    def __init__(self):
+        self.depth = 0
+        self.original = None
+
+    def __enter__(self):
+        self.original = builtins.__import__
+        def profiled(name, *args):
+            if name in sys.modules or (len(args) >= 4 and args[3]): return self.original(name, *args) # Loaded, or relative (level > 0)
+            self.depth += 1
+            try:
+                return record(name, lambda: self.original(name, *args), self.depth - 1)
+            finally:
+                self.depth -= 1
+        try:
+            builtins.__import__ = profiled
+        except (AttributeError, TypeError): # Builtins can not be overridden
+            self.original = None
+        return self
+
+    def __exit__(self, *exc):
+        if self.original is not None: builtins.__import__ = self.original
+
+
+def report(max_depth: int = None) -> str: # Table of <imports>, with the nested imports up to <max_depth> deep
+    lines = [f"{'module':24s} {'ms':>6s} {'heap':>8s}"]
+    for name, ms, heap, depth in imports:
+        if max_depth is None or depth <= max_depth: lines.append(f"{'  '*depth + name:24s} {ms:6d} {heap:8d}")
+    top = [entry for entry in imports if entry[3] == 0]
+    lines.append(f"{'total':24s} {sum(entry[1] for entry in top):6d} {sum(entry[2] for entry in top):8d}")
+    return "\n".join(lines)
@@ -3,9 +3,18 @@ import framebuf
 import gc
 from machine import Pin, SPI, PWM
 
+from utils import replace_file, ticks_diff, ticks_ms
+
+
+MERGE_SLACK = 2*160 # Pixels (2 full-width rows) that may be pushed needlessly to merge two damaged rectangles, saving the commands of a window
+MAX_RECTS = 8 # With more damaged rectangles than this, their bounding box is pushed instead
+
 
 class LCD_1inch8(framebuf.FrameBuffer):
     def __init__(self, brightness=1, freq=10_000_000, BLpin=13, DCpin=8, RSTpin=12, MOSIpin=11, SCKpin=10, CSpin=9):
+        """ The drawing methods of framebuf mark the rectangles they change as damaged, and show() only pushes those to the
+            display (see damage()). Draw with these methods, or call damage() after changing self.buffer directly.
+        """
         self.width = 160
         self.height = 128
         
@@ -21,6 +30,11 @@ class LCD_1inch8(framebuf.FrameBuffer):
         self.dc = Pin(DCpin,Pin.OUT)
         self.dc(1)
         self.buffer = bytearray(self.height * self.width * 2)
+        self.view = memoryview(self.buffer) # For slicing the rows of a rectangle without copying them
+        self.damaged = [(0, 0, self.width, self.height)] # (x0, y0, x1, y1) of the rectangles that changed since the last show(): all, at first
+        self.drawn = None # Bounding box [x0, y0, x1, y1] of the pixels drawn by set_pixel() since the last damage_drawn()
+        self.pushed = {"frames": 0, "bytes": 0, "ms": 0} # Totals of show()
+        self.last_push = (0, 0) # Bytes and ms of the last show()
         super().__init__(self.buffer, self.width, self.height, framebuf.RGB565)
         self.init_display()
         
@@ -47,12 +61,12 @@ class LCD_1inch8(framebuf.FrameBuffer):
         self.spi.write(bytearray([cmd]))
         self.cs(1)
 
-    def write_data(self, buf: bytearray | int | list[int]):
+    def write_data(self, buf: bytearray | memoryview | int | list[int]):
         self.cs(1)
         self.dc(1)
         self.cs(0)
-        if not isinstance(buf, bytearray):
-            buf = bytearray([buf] if isinstance(buf, int) else list(buf))
+        if isinstance(buf, int): buf = bytearray([buf])
+        elif isinstance(buf, list): buf = bytearray(buf)
         self.spi.write(buf)
         self.cs(1)
 
@@ -117,16 +131,125 @@ class LCD_1inch8(framebuf.FrameBuffer):
         #Turn on the LCD display
         self.write_cmd(0x29)
 
-    def show(self):
-        self.write_cmd(0x2A)
-        self.write_data([0x00, 0x01, 0x00, 0xA0])
-        
-        self.write_cmd(0x2B)
-        self.write_data([0x00, 0x02, 0x00, 0x81])
-        
+    def show(self, full: bool = False): # Pushes the damaged rectangles of the buffer to the display (or all of it)
+        if full: self.damaged = [(0, 0, self.width, self.height)]
+        start, n = ticks_ms(), 0
+        for rect in self.damaged: n += self.push(*rect)
+        self.damaged = []
+        self.last_push = (n, ticks_diff(ticks_ms(), start))
+        self.pushed["frames"] += 1
+        self.pushed["bytes"] += n
+        self.pushed["ms"] += self.last_push[1]
+
+    def push(self, x0, y0, x1, y1) -> int: # Writes columns x0..x1-1 of rows y0..y1-1 to the display, and returns the number of bytes
+        self.write_cmd(0x2A) # CASET (the panel starts at column 1)
+        self.write_data([0x00, x0 + 1, 0x00, x1])
+
+        self.write_cmd(0x2B) # RASET (the panel starts at row 2)
+        self.write_data([0x00, y0 + 2, 0x00, y1 + 1])
+
         self.write_cmd(0x2C)
-        self.write_data(self.buffer)
+        row = 2*self.width
+        if x0 == 0 and x1 == self.width: # Contiguous in the buffer
+            self.write_data(self.view[y0*row:y1*row])
+        else: # A slice of every row, in a single transfer
+            self.cs(1)
+            self.dc(1)
+            self.cs(0)
+            for y in range(y0, y1): self.spi.write(self.view[y*row + 2*x0:y*row + 2*x1])
+            self.cs(1)
+        return 2*(x1 - x0)*(y1 - y0)
+
+    def damage(self, x, y, w, h): # Marks a rectangle as changed, merging it with the damaged rectangles it (nearly) overlaps
+        x0, y0, x1, y1 = max(0, x), max(0, y), min(self.width, x + w), min(self.height, y + h)
+        if x0 >= x1 or y0 >= y1: return
+        rects = self.damaged
+        i = 0
+        while i < len(rects):
+            a0, b0, a1, b1 = rects[i]
+            u0, v0, u1, v1 = min(a0, x0), min(b0, y0), max(a1, x1), max(b1, y1)
+            if (u1 - u0)*(v1 - v0) <= (a1 - a0)*(b1 - b0) + (x1 - x0)*(y1 - y0) + MERGE_SLACK: # Cheaper as one rectangle
+                x0, y0, x1, y1 = u0, v0, u1, v1
+                rects.pop(i)
+                i = 0 # The union may now merge with one that was checked already
+            else:
+                i += 1
+        rects.append((x0, y0, x1, y1))
+        if len(rects) > MAX_RECTS:
+            self.damaged = [(min(r[0] for r in rects), min(r[1] for r in rects), max(r[2] for r in rects), max(r[3] for r in rects))]
+
+    def damage_drawn(self): # Damages the bounding box of the pixels drawn by set_pixel()
+        if self.drawn is None: return
+        x0, y0, x1, y1 = self.drawn
+        self.damage(x0, y0, x1 - x0, y1 - y0)
+        self.drawn = None
+
+    ## Drawing methods of framebuf, which damage what they draw on
+    def fill(self, c):
+        super().fill(c)
+        self.damage(0, 0, self.width, self.height)
+
+    def pixel(self, x, y, *c): # Only damages when setting a color
+        if c: self.damage(x, y, 1, 1)
+        return super().pixel(x, y, *c)
+
+    def hline(self, x, y, w, c):
+        super().hline(x, y, w, c)
+        self.damage(x, y, w, 1)
+
+    def vline(self, x, y, h, c):
+        super().vline(x, y, h, c)
+        self.damage(x, y, 1, h)
+
+    def line(self, x1, y1, x2, y2, c):
+        super().line(x1, y1, x2, y2, c)
+        self.damage(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+
+    def rect(self, x, y, w, h, c, *f):
+        super().rect(x, y, w, h, c, *f)
+        self.damage(x, y, w, h)
+
+    def fill_rect(self, x, y, w, h, c):
+        super().fill_rect(x, y, w, h, c)
+        self.damage(x, y, w, h)
+
+    def ellipse(self, x, y, xr, yr, c, *args):
+        super().ellipse(x, y, xr, yr, c, *args)
+        self.damage(x - xr, y - yr, 2*xr + 1, 2*yr + 1)
+
+    def text(self, s, x, y, c=1): # The font of framebuf is 8x8 pixels
+        super().text(s, x, y, c)
+        self.damage(x, y, 8*len(s), 8)
+
+    def blit(self, *args): # Size of the source not known here
+        super().blit(*args)
+        self.damage(0, 0, self.width, self.height)
+
+    def scroll(self, dx, dy):
+        super().scroll(dx, dy)
+        self.damage(0, 0, self.width, self.height)
+
+    def poly(self, *args):
+        super().poly(*args)
+        self.damage(0, 0, self.width, self.height)
     
+    def save_frame(self, stamp: bytes = b"", path: str = "lcdframe.bin"): # Stores the buffer and <stamp> (what it shows), so the next boot can show it right away (see load_frame())
+        def write(f):
+            f.write(self.buffer)
+            f.write(stamp)
+        replace_file(path, write)
+
+    def load_frame(self, path: str = "lcdframe.bin") -> bytes|None: # Fills the buffer with the frame of save_frame(). Returns its stamp, or None if there was no complete frame.
+        for name in (path, path + ".tmp"): # Power was lost while replacing <path> (see utils.replace_file())
+            try:
+                with open(name, "rb") as f:
+                    if f.readinto(self.buffer) == len(self.buffer):
+                        self.damage(0, 0, self.width, self.height)
+                        return f.read()
+            except OSError:
+                pass
+        return None
+
     def color(self, R, G, B):
         """ Converts 8-bit red, green and blue values (0-255) to 16 bit hex value in 565 format. """
         return (((G&0b00011100)<<3) +((B&0b11111000)>>3)<<8) + (R&0b11111000)+((G&0b11100000)>>5)
@@ -143,7 +266,15 @@ class LCD_1inch8(framebuf.FrameBuffer):
             r = (color >> 16) & 0xFF
             g = (color >> 8) & 0xFF
             b = color & 0xFF
-            self.pixel(x, y, self.color(r, g, b))
+            super().pixel(x, y, self.color(r, g, b)) # Damaged once per image, by damage_drawn()
+            box = self.drawn
+            if box is None:
+                self.drawn = [x, y, x + 1, y + 1]
+            else:
+                if x < box[0]: box[0] = x
+                elif x >= box[2]: box[2] = x + 1
+                if y < box[1]: box[1] = y
+                elif y >= box[3]: box[3] = y + 1
     
     def show_image_BMP(self, x, y, file_handle): # Takes a file object, not a path!
         from bmp_file_reader import BMPFileReader # Only import when necessary
@@ -151,18 +282,21 @@ class LCD_1inch8(framebuf.FrameBuffer):
         for row_i in range(0, reader.get_height()):
             for col_i, color in enumerate(reader.get_row(row_i)):
                 self.set_pixel(x + col_i, y + row_i, (color.red << 16 | color.green << 8 | color.blue))
+        self.damage_drawn()
         del BMPFileReader
         gc.collect()
     
     def show_image_PNG(self, x, y, file_handle): # Takes a file object or path.
         from PNGdecoder import png # Only import when necessary
         png(file_handle, callback=self.set_pixel, fastalpha=False).render(x, y)
+        self.damage_drawn()
         del png
         gc.collect()
     
     def show_image_JPG(self, x, y, file_handle): # Takes a file object or path.
         from JPEGdecoder import jpeg # Only import when necessary
         jpeg(file_handle, callback=self.set_pixel).render(x, y)
+        self.damage_drawn()
         del jpeg
         gc.collect()
         
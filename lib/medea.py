@@ -9,8 +9,16 @@ try:
         import uio as io
         import usocket as socket
         import ssl
+        try:
+            import asyncio
+        except ImportError: # Older firmware
+            import uasyncio as asyncio
         import gc
         from utime import ticks_ms, ticks_diff, sleep
+        try:
+            import deflate
+        except ImportError: # Firmware without deflate: responses are requested uncompressed
+            deflate = None
 
         SocketTimeoutError = OSError
     else:
@@ -18,7 +26,10 @@ try:
         import io
         import socket
         import ssl
+        import asyncio
         import gc
+        import zlib
+        deflate = zlib # Only used to check whether decompression is available
 
         SocketTimeoutError = socket.timeout
 
@@ -55,6 +66,9 @@ STR = b"string"
 NUM = b"number"
 BOOL = b"boolean"
 NUL = b"null"
+SKIP = b"skip" # Send to a token generator to skip the rest of the innermost open container (see ChunkTokenizer)
+STOP = b"stop" # Returned by a KeyPaths handler to stop reading the rest of the tokens
+WAIT = b"wait" # Token (WAIT, None) of ChunkTokenizer.tokenizeChunks() while no more data is available yet (see AsyncLazyRequest)
 
 singleQuoteByte = const(39)     # ord("'")
 doubleQuoteByte = const(34)     # ord('"')
@@ -76,6 +90,63 @@ digitBytes = b'0123456789'
 
 defaultBufferSize = 512
 
+escapedChars = {34: '"', 92: '\\', 47: '/', 98: '\b', 102: '\f', 110: '\n', 114: '\r', 116: '\t'} # After a backslash, except \uXXXX
+
+def decodeString(raw): # Decodes the UTF-8 <raw> bytes between the quotes of a JSON string, including escape sequences
+    if backslashByte not in raw:
+        return raw.decode('utf-8')
+    parts = []
+    pos = 0
+    while True:
+        i = raw.find(b'\\', pos)
+        if i < 0:
+            parts.append(raw[pos:].decode('utf-8'))
+            return "".join(parts)
+        parts.append(raw[pos:i].decode('utf-8'))
+        byte = raw[i + 1]
+        if byte == 117: # 'u'
+            code = int(raw[i + 2:i + 6].decode('ascii'), 16)
+            pos = i + 6
+            if 0xD800 <= code < 0xDC00 and raw[pos:pos + 2] == b'\\u': # Surrogate pair encoding a character beyond U+FFFF
+                low = int(raw[pos + 2:pos + 6].decode('ascii'), 16)
+                if 0xDC00 <= low < 0xE000:
+                    code = 0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)
+                    pos += 6
+            parts.append(chr(code))
+        else:
+            parts.append(escapedChars.get(byte, chr(byte)))
+            pos = i + 2
+
+def decodeNumber(raw): # Converts the <raw> bytes of a JSON number to an int or float
+    num = raw.decode('ascii')
+    try:
+        return int(num)
+    except ValueError:
+        return float(num)
+
+
+class LazyValue:
+    """ Value of a string or number token from ChunkTokenizer(lazy=True). It only refers to the bytes of the chunk it was
+        found in (which are immutable), and is not decoded until value() is called, so unused values cost no decoding.
+    """
+    __slots__ = ("kind", "data", "start", "end")
+
+    def __init__(self, kind, data, start, end):
+        self.kind = kind # STR or NUM
+        self.data = data
+        self.start = start
+        self.end = end
+
+    def raw(self):
+        return self.data[self.start:self.end]
+
+    def value(self):
+        raw = self.data[self.start:self.end]
+        return decodeString(raw) if self.kind is STR else decodeNumber(raw)
+
+    def __repr__(self):
+        return "LazyValue({}, {})".format(self.kind, self.raw())
+
 
 class Tokenizer():
     """Tokenizes a source of bytes, (e.g. a file, socket or byte array), as a JSON value (an object, array or primitive)
@@ -236,7 +307,7 @@ class Tokenizer():
             while True:
                 byte = next(gen)
                 if byte == delimiter:
-                    yield (token, bytes(accumulator).decode('ascii'))
+                    yield (token, decodeString(bytes(accumulator)))
                     return next(gen)
                 else:
                     accumulator.append(byte)
@@ -266,12 +337,7 @@ class Tokenizer():
             pass
         finally:
             if len(accumulator):
-                num = bytes(accumulator).decode('ascii')
-                try:
-                    num = int(num)
-                except ValueError:
-                    num = float(num)
-                yield (NUM, num)
+                yield (NUM, decodeNumber(bytes(accumulator)))
             else:
                 raise AssertionError("Invalid number")
             return
@@ -298,94 +364,565 @@ class Tokenizer():
         except StopIteration:
             return byte
 
+## medea.chunks ##
+numberBytes = digitBytes + numberMetaBytes
+literalBytes = b'truefalsn' # Characters of true, false and null
+
+class ChunkTokenizer():
+    """Tokenizes a source of byte chunks (e.g. the buffers read from a file or socket) as a JSON value, producing the same
+        (token, value) stream as Tokenizer. Instead of one generator resume per byte, each chunk is scanned with find() and
+        slicing. A string, number or literal that straddles two chunks is carried over into the next chunk.
+
+        Chunks can be pushed with feed(chunk), or pulled from an iterable with tokenizeChunks(chunks). When that iterable
+        yields None instead of a chunk (no data available yet), tokenizeChunks() yields (WAIT, None).
+        Sending SKIP to the generator (instead of calling next) discards the rest of the innermost open container by counting
+        brackets and quotes, without building any tokens: its (CLOSE, container) token is the next one to be emitted.
+        After (OPEN, container) this skips that entire container. The per-byte Tokenizer ignores SKIP.
+
+        With lazy=True, strings and numbers are emitted as a LazyValue, and keys as their raw (undecoded) bytes, to be
+        compared with the byte keys of KeyPaths: nothing is decoded unless a consumer asks for it.
+    """
+    def __init__(self, lazy=False):
+        self.lazy = lazy
+        self.stack = [] # OBJ or ARR for every open container
+        self.expectKey = False # Whether the next string is a key
+        self.kind = None # Token of a value straddling chunks, whose bytes so far are in self.carry
+        self.carry = bytearray()
+        self.delimiter = None # Quote of the straddling string
+        self.done = False # Whether the root value is complete
+        self.skipDepth = 0 # Depth of nested containers while skipping (0 if not skipping)
+        self.skipQuote = None # Quote of the string being skipped
+
+    def tokenizeChunks(self, chunks):
+        for chunk in chunks:
+            if chunk is None:
+                yield (WAIT, None)
+                continue
+            yield from self.feed(chunk)
+            if self.done:
+                return
+        if self.stack or self.kind is not None and self.kind is not NUM and self.kind is not BOOL: # E.g. a response that broke off
+            raise AssertionError("Unexpected end of JSON")
+        if self.kind is NUM or self.kind is BOOL: # Stream ended in a root number or literal
+            raw = bytes(self.carry)
+            yield self.token(self.kind, raw, 0, len(raw))
+
+    def feed(self, chunk):
+        data = bytes(chunk) # Unlike memoryview, bytes supports find(), and stays valid when the buffer is refilled
+        count = len(data)
+        pos = 0
+        kind = self.kind
+        if kind is not None: # Complete the value carried over from the previous chunk
+            if kind is NUM or kind is BOOL:
+                end = self.endOfRun(data, 0, numberBytes if kind is NUM else literalBytes)
+                if end == count:
+                    self.carry.extend(data)
+                    return
+                pos = end
+            else:
+                end = self.endOfString(data, 0, self.delimiter)
+                if end < 0:
+                    self.carry.extend(data)
+                    return
+                pos = end + 1
+            self.carry.extend(data[:end])
+            raw = bytes(self.carry)
+            self.kind = None
+            self.carry = bytearray()
+            if (yield self.token(kind, raw, 0, len(raw))) is SKIP:
+                self.skipDepth = 1
+            if self.done:
+                return
+
+        while pos < count:
+            if self.skipDepth:
+                pos = self.skip(data, pos)
+                if pos < 0:
+                    return
+                container = self.stack.pop()
+                self.expectKey = False
+                self.done = not self.stack
+                if (yield (CLOSE, container)) is SKIP:
+                    self.skipDepth = 1
+                if self.done:
+                    return
+                continue
+            byte = data[pos]
+            if byte in spaceBytes or byte == colonByte:
+                pos += 1
+                continue
+            elif byte == commaByte:
+                self.expectKey = self.stack[-1] is OBJ
+                pos += 1
+                continue
+            elif byte == openObjectByte or byte == openArrayByte:
+                container = OBJ if byte == openObjectByte else ARR
+                self.stack.append(container)
+                self.expectKey = container is OBJ
+                pos += 1
+                if (yield (OPEN, container)) is SKIP:
+                    self.skipDepth = 1
+                continue
+            elif byte == closeObjectByte or byte == closeArrayByte:
+                container = self.stack.pop()
+                self.expectKey = False
+                pos += 1
+                self.done = not self.stack
+                if (yield (CLOSE, container)) is SKIP:
+                    self.skipDepth = 1
+                if self.done:
+                    return
+                continue
+            elif byte == doubleQuoteByte or byte == singleQuoteByte:
+                kind = KEY if self.expectKey else STR
+                delimiter = data[pos:pos + 1]
+                end = self.endOfString(data, pos + 1, delimiter)
+                if end < 0:
+                    self.carry.extend(data[pos + 1:])
+                    self.kind, self.delimiter = kind, delimiter
+                    return
+                start = pos + 1
+                pos = end + 1
+            elif byte in digitBytes or byte == minusByte:
+                kind = NUM
+                end = self.endOfRun(data, pos, numberBytes)
+                if end == count:
+                    self.carry.extend(data[pos:])
+                    self.kind = kind
+                    return
+                start = pos
+                pos = end
+            elif byte in literalBytes:
+                kind = BOOL
+                end = self.endOfRun(data, pos, literalBytes)
+                if end == count:
+                    self.carry.extend(data[pos:])
+                    self.kind = kind
+                    return
+                start = pos
+                pos = end
+            else:
+                raise AssertionError("Unexpected character {}".format(chr(byte)))
+            if (yield self.token(kind, data, start, end)) is SKIP:
+                self.skipDepth = 1
+            if self.done:
+                return
+
+    def skip(self, data, pos): # Skips until the innermost open container ends. Returns the position after it, or -1 if beyond <data>.
+        count = len(data)
+        depth = self.skipDepth
+        while pos < count:
+            if self.skipQuote is not None:
+                end = self.endOfString(data, pos, self.skipQuote)
+                if end < 0: # Only keep trailing backslashes, to detect an escaped quote at the start of the next chunk
+                    i = count - 1
+                    while i >= pos and data[i] == backslashByte:
+                        i -= 1
+                    if i >= pos:
+                        self.carry = bytearray(data[i + 1:])
+                    else: # Chunk only contains backslashes, which continue those of the previous chunk
+                        self.carry.extend(data[pos:])
+                    break
+                self.carry = bytearray()
+                self.skipQuote = None
+                pos = end + 1
+                continue
+            byte = data[pos]
+            if byte == doubleQuoteByte or byte == singleQuoteByte:
+                self.skipQuote = data[pos:pos + 1]
+            elif byte == openObjectByte or byte == openArrayByte:
+                depth += 1
+            elif byte == closeObjectByte or byte == closeArrayByte:
+                depth -= 1
+                if depth == 0:
+                    self.skipDepth = 0
+                    return pos + 1
+            pos += 1
+        self.skipDepth = depth
+        return -1
+
+    def token(self, kind, data, start, end): # Converts data[start:end] of a string, key, number or literal to a (token, value) pair
+        if kind is KEY:
+            self.expectKey = False
+            raw = data[start:end]
+            return (KEY, raw if self.lazy else decodeString(raw))
+        self.done = not self.stack
+        if kind is STR or kind is NUM:
+            if self.lazy:
+                return (kind, LazyValue(kind, data, start, end))
+            raw = data[start:end]
+            return (kind, decodeString(raw) if kind is STR else decodeNumber(raw))
+        raw = data[start:end]
+        if raw == b"true":
+            return (BOOL, True)
+        elif raw == b"false":
+            return (BOOL, False)
+        elif raw == b"null":
+            return (NUL, None)
+        raise AssertionError("No literal {}".format(raw))
+
+    def endOfString(self, data, pos, delimiter): # Index of the first unescaped <delimiter> in <data> from <pos>, or -1
+        while True:
+            end = data.find(delimiter, pos)
+            if end < 0:
+                return -1
+            i = end - 1
+            while i >= 0 and data[i] == backslashByte:
+                i -= 1
+            escapes = end - 1 - i
+            if i < 0: # Backslashes may continue at the end of the carried-over part of the string
+                j = len(self.carry) - 1
+                while j >= 0 and self.carry[j] == backslashByte:
+                    j -= 1
+                escapes += len(self.carry) - 1 - j
+            if escapes % 2 == 0:
+                return end
+            pos = end + 1
+
+    def endOfRun(self, data, pos, allowed): # Index of the first byte from <pos> which is not in <allowed> (len(data) if none)
+        count = len(data)
+        while pos < count and data[pos] in allowed:
+            pos += 1
+        return pos
+
 ## medea.file ##
 def generateFileBytes(path, buf=None):
+    return generateChunkBytes(generateFileChunks(path, buf))
+
+def generateChunkBytes(chunks):
     """
     Invoke with next(gen) or gen.send(True) to consume byte from stream (read AND increment)
     Invoke with gen.send(False) to peek at byte (read WITHOUT incrementing)
     """
+    for chunk in chunks:
+        pos = 0
+        count = len(chunk)
+        while pos < count:
+            if (yield chunk[pos]) is not True:
+                pos += 1
+
+def generateFileChunks(path, buf=None): # A generator of memoryviews on <buf>, one for each read from the file.
     if buf is None:
         buf = bytearray(defaultBufferSize)
+    mv = memoryview(buf)
     with open(path, "rb") as f:
         while True:
             count = f.readinto(buf)
-            pos = 0
-            if count > 0:
-                while pos < count:
-                    if (yield buf[pos]) is not True:
-                        pos += 1
-            else:
+            if not count:
+                break
+            yield mv[:count]
+
+def tokenizeFile(path, bulk=True, lazy=False): # <lazy> only applies to the chunk tokenizer (see ChunkTokenizer)
+    if bulk:
+        yield from ChunkTokenizer(lazy).tokenizeChunks(generateFileChunks(path))
+    else:
+        tokenizer = Tokenizer()
+        yield from tokenizer.tokenizeValue(generateFileBytes(path))
+
+## medea.deflate ##
+class ChunkStream(io.IOBase):
+    """ Stream reading from a generator of chunks, so it can be decompressed by deflate.DeflateIO. """
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chunk = b""
+        self.ahead = [] # Chunks pulled by fill(), as copies (a chunk on a read buffer is overwritten by the next read)
+        self.size = 0 # Number of bytes in self.ahead
+        self.ended = False # Whether <chunks> is exhausted
+
+    def fill(self, size):
+        """ Pulls chunks until at least <size> bytes are ahead of readinto(), or the chunks end. Returns False if the chunks
+            have no data yet (a None chunk, see AsyncLazyRequest), so fill() must be called again once there is.
+        """
+        while self.size < size and not self.ended:
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.ended = True
                 break
+            if chunk is None:
+                return False
+            self.ahead.append(memoryview(bytes(chunk)))
+            self.size += len(chunk)
+        return True
+
+    def readinto(self, buf):
+        while not len(self.chunk):
+            if self.ahead:
+                self.chunk = self.ahead.pop(0)
+                self.size -= len(self.chunk)
+                continue
+            if self.ended:
+                return 0
+            try:
+                self.chunk = next(self.chunks)
+            except StopIteration:
+                self.ended = True
+                return 0
+            if self.chunk is None: # fill() did not pull enough ahead, and DeflateIO can not wait
+                raise OSError("Compressed data ran out while inflating")
+        count = min(len(buf), len(self.chunk))
+        buf[:count] = self.chunk[:count]
+        self.chunk = self.chunk[count:]
+        return count
 
-def tokenizeFile(path):
-    tokenizer = Tokenizer()
-    yield from tokenizer.tokenizeValue(generateFileBytes(path))
+def inflateChunks(chunks, buf, windowBits=15, wait=False):
+    """ A generator of the decompressed data of a generator of gzip- or zlib-compressed <chunks>, in chunks of at most len(buf).
+        Besides <buf>, this needs a fixed 2**<windowBits> bytes of RAM for the history window, regardless of the data size.
+        With <wait>, <chunks> may yield None while no data was received yet (see AsyncLazyRequest), and so does this. Since
+        deflate.DeflateIO reads its input synchronously, enough input for a whole buffer of output (at most 15 bits per
+        byte, plus a block header) is then pulled ahead before every read.
+    """
+    mv = memoryview(buf)
+    if sys.implementation.name == "micropython":
+        stream = ChunkStream(chunks)
+        with deflate.DeflateIO(stream, deflate.AUTO, windowBits) as inflater:
+            while True:
+                while wait and not stream.fill(2*len(buf) + 1024):
+                    yield None
+                count = inflater.readinto(buf)
+                if not count:
+                    break
+                yield mv[:count]
+    else:
+        decompressor = zlib.decompressobj(32 + windowBits) # +32: detect gzip or zlib header
+        for chunk in chunks:
+            if chunk is None:
+                yield None
+                continue
+            data = bytes(chunk)
+            while True: # Output is limited to len(buf) per step, the rest of the input is kept in unconsumed_tail
+                out = decompressor.decompress(data, len(buf))
+                data = decompressor.unconsumed_tail
+                if out:
+                    yield out
+                if not data and len(out) < len(buf):
+                    break
 
 ## medea.https ##
+class ConnectionPool:
+    """ Keeps one idle connection per (scheme, host, port), so that consecutive requests to the same host can skip
+        getaddrinfo, the TCP connect and the TLS handshake. Pass it to LazyRequest(pool=...), which returns the
+        connection after reading a complete keep-alive response. self.hits and self.misses count reuses and new connections.
+    """
+    def __init__(self):
+        self.connections = {}
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, key, timeout): # Returns (socket, reused) for key=(scheme, host, port)
+        s = self.connections.pop(key, None)
+        if s is not None:
+            self.hits += 1
+            return s, True
+        self.misses += 1
+        return self.connect(key, timeout), False
+
+    def reconnect(self, key, timeout): # Replaces a reused connection that turned out to be closed by the server
+        self.hits -= 1
+        self.misses += 1
+        return self.connect(key, timeout)
+
+    def release(self, key, s): # Keeps <s> for the next request to <key>
+        old = self.connections.get(key)
+        if old is not None and old is not s:
+            old.close()
+        self.connections[key] = s
+
+    def close(self):
+        for s in self.connections.values():
+            s.close()
+        self.connections = {}
+
+    @staticmethod
+    def connect(key, timeout): # Opens a new connection for key=(scheme, host, port)
+        scheme, host, port = key
+        try:
+            addr = socket.getaddrinfo(host, port)[0][-1]
+        except IndexError:
+            raise Exception("No Wifi")
+        s = socket.socket()
+        s.connect(addr)
+        if hasattr(s, 'settimeout'):
+            s.settimeout(timeout)
+        if scheme == "https":
+            try:
+                s = ssl.wrap_socket(s, server_hostname=host)
+            except BaseException:
+                s.close()
+                raise
+        return s
+
+pool = ConnectionPool()
+
+
+class AsyncConnectionPool(ConnectionPool):
+    """ ConnectionPool of (reader, writer) streams, for AsyncLazyRequest. """
+    async def acquire(self, key, timeout):
+        streams = self.connections.pop(key, None)
+        if streams is not None and getattr(streams[0], "at_eof", bool)(): # Closed by the server already (only known on CPython)
+            streams[1].close()
+            streams = None
+        if streams is not None:
+            self.hits += 1
+            return streams, True
+        self.misses += 1
+        return await self.connect(key, timeout), False
+
+    async def reconnect(self, key, timeout):
+        self.hits -= 1
+        self.misses += 1
+        return await self.connect(key, timeout)
+
+    def release(self, key, streams):
+        old = self.connections.get(key)
+        if old is not None and old is not streams:
+            old[1].close()
+        self.connections[key] = streams
+
+    def close(self):
+        for reader, writer in self.connections.values():
+            writer.close()
+        self.connections = {}
+
+    @staticmethod
+    async def connect(key, timeout):
+        scheme, host, port = key
+        return await asyncio.wait_for(asyncio.open_connection(host, port, ssl=scheme == "https"), timeout)
+
+asyncPool = AsyncConnectionPool()
+
+responseHeaderNames = ("content-length", "transfer-encoding", "content-encoding", "connection", "etag", "retry-after") # Headers kept by LazyRequest
+
+
 class LazyRequest:
-    def __init__(self, url, headers=None, timeout=1.0, buf=None, bufferSize=defaultBufferSize):
+    waits = False # Whether the response chunks can be None while no data was received yet (see AsyncLazyRequest)
+
+    def __init__(self, url, headers=None, timeout=1.0, buf=None, bufferSize=defaultBufferSize, pool=pool, compressed=True):
         self.url = url
         self.headers = headers
         self.timeout = timeout
         self.buf = bytearray(bufferSize) if buf is None else buf
         self.bufferSize = len(self.buf)
-        
-        self.byteGenerator = self.generateResponseBytes()
+        self.pool = pool # ConnectionPool to take the connection from and return it to, or None to close it after the response
+        self.compressed = compressed and deflate is not None # Whether to accept a gzip- or deflate-encoded response
+
+        scheme, _, host, self.path = url.split('/', 3)
+        self.scheme = scheme.rstrip(':')
+        self.host, port = host.split(':') if ':' in host else (host, None)
+        self.port = int(port) if port else (443 if self.scheme == "https" else 80)
+        self.sock = None
+        self.keepalive = False # Whether the connection can be reused after this response
+        self.bytes_saved = 0 # Number of body bytes that were not read from the socket because the response was closed early
+
+        self.remaining = None # Number of body bytes that were not yet read from the socket (None while unknown)
+        self.chunk = None # Memoryview on the part of self.buf that was filled by the last read
+        self.pos = 0 # Position in self.chunk where the body starts
+        self.bodyChunks = None # Generator of the body without transfer encoding, once generateContentChunks() was called
+        self.start()
+
+    def start(self): # Sends the request and reads the header of the response
+        self.chunkGenerator = self.generateResponseChunks()
         self.status_code, self.content_length = self.processHttpHeaders()
-        self.byteGenerator.send(self.content_length)
 
-    def tokenize(self): # Tokenizes a JSON response.
-        tokenizer = Tokenizer()
-        yield from tokenizer.tokenizeValue(self.byteGenerator)
-    
-    def generateResponseBytes(self): # A generator of the bytes in the response.
-        _, _, host, path = self.url.split('/', 3)
+    def tokenize(self, bulk=True, lazy=False):
+        """ Tokenizes a JSON response, per chunk if <bulk> (faster) or else per byte (<lazy>: see ChunkTokenizer).
+            Closing this generator early (e.g. by KeyPaths.walk() on STOP) closes the connection without reading the rest.
+        """
+        complete = False
         try:
-            addr = socket.getaddrinfo(host, 443)[0][-1]
-        except IndexError:
-            raise Exception("No Wifi")
-        s = socket.socket()
-        s.connect(addr)
-        if hasattr(s, 'settimeout'):
-            s.settimeout(self.timeout)
+            if bulk:
+                yield from ChunkTokenizer(lazy).tokenizeChunks(self.generateContentChunks())
+            else:
+                tokenizer = Tokenizer()
+                yield from tokenizer.tokenizeValue(generateChunkBytes(self.generateContentChunks()))
+            complete = True
+        finally:
+            self.close(complete)
+
+    def close(self, drain=True):
+        """ Returns the connection to the pool if the response was read completely (after reading a few leftover bytes if
+            <drain>), otherwise closes it. Sets self.bytes_saved to the number of body bytes left unread (None if unknown).
+        """
+        if drain and self.keepalive and self.remaining is None and self.bodyChunks is not None:
+            try: # Chunked body: usually only the terminating chunk is left after the JSON
+                drained = 0
+                for chunk in self.bodyChunks:
+                    drained += len(chunk)
+                    if drained > self.bufferSize:
+                        break
+            except OSError:
+                pass
+        self.chunkGenerator.close()
+        s = self.sock
+        if s is None:
+            return
+        self.sock = None
+        if drain and self.keepalive and self.remaining is not None and self.remaining <= self.bufferSize:
+            try: # Drain the last few bytes (e.g. a trailing newline after the JSON)
+                mv = memoryview(self.buf)
+                while self.remaining > 0:
+                    count = self.readinto(s, mv[:self.remaining])
+                    if not count:
+                        raise OSError("Connection closed")
+                    self.remaining -= count
+                self.pool.release((self.scheme, self.host, self.port), s)
+                return
+            except OSError:
+                pass
+        self.bytes_saved = None if self.remaining is None else max(0, self.remaining)
+        s.close()
+
+    def readinto(self, s, mv):
+        if sys.implementation.name == "micropython":
+            return s.readinto(mv)
+        else:
+            return s.recv_into(mv)
+
+    def sendRequest(self, s):
+        write = s.write if hasattr(s, 'write') else s.sendall # CPython sockets have no write()
+        write(b'GET /')
+        write(self.path.encode('ascii'))
+        write(b' HTTP/1.1\r\nHost: ')
+        write(self.host.encode('ascii'))
+        if self.port != (443 if self.scheme == "https" else 80):
+            write((':%d' % self.port).encode('ascii'))
+        write(b'\r\nUser-Agent: Cockle\r\n')
+        write(b'Connection: close\r\n' if self.pool is None else b'Connection: keep-alive\r\n')
+        if self.compressed:
+            write(b'Accept-Encoding: gzip, deflate\r\n')
+        if self.headers is not None:
+            for header in self.headers:
+                write(header)
+        write(b'\r\n')
+
+    def generateResponseChunks(self): # A generator of memoryviews on self.buf, one for each read from the socket.
+        key = (self.scheme, self.host, self.port)
+        if self.pool is None:
+            self.sock, reused = ConnectionPool.connect(key, self.timeout), False
+        else:
+            self.sock, reused = self.pool.acquire(key, self.timeout)
+        mv = memoryview(self.buf)
         try:
-            s = ssl.wrap_socket(s, server_hostname=host)
-            s.write(b'GET /')
-            s.write(path.encode('ascii'))
-            s.write(b' HTTP/1.1\r\nHost: ')
-            s.write(host.encode('ascii'))
-            s.write(b'\r\nUser-Agent: Cockle\r\n')
-            if self.headers is not None:
-                for header in self.headers:
-                    s.write(header)
-            s.write(b'\r\n')
-            remaining = None
-            while True:
-                if sys.implementation.name == "micropython":
-                    if remaining is None or self.bufferSize < remaining:
-                        count = s.readinto(self.buf)
-                    else: # read into memoryview shorter than backing buffer
-                        count = s.readinto(memoryview(self.buf)[:remaining])
-                else:
-                    if remaining is None or self.bufferSize < remaining:
-                        count = s.read(self.bufferSize, self.buf)
-                    else:
-                        count = s.read(remaining, memoryview(self.buf)[:remaining])
-                pos = 0
-                if count > 0:
-                    while pos < count:
-                        msg = yield self.buf[pos]
-                        if type(msg) is int: # allow signalling content length
-                            remaining = msg + 1 # CH mystifying off-by-one error
-                            msg = True # byte will be replayed
-                        if msg is not True:
-                            pos += 1
-                            if remaining is not None:
-                                remaining -= 1
-                else:
+            try:
+                self.sendRequest(self.sock)
+                count = self.readinto(self.sock, mv)
+            except OSError:
+                if not reused:
+                    raise
+                count = 0
+            if not count and reused: # Server closed the pooled connection in the meantime, so reconnect
+                self.sock.close()
+                self.sock = self.pool.reconnect(key, self.timeout)
+                self.sendRequest(self.sock)
+                count = self.readinto(self.sock, mv)
+            while count:
+                if self.remaining is not None:
+                    self.remaining -= count
+                yield mv[:count]
+                if self.remaining is not None and self.remaining <= 0:
                     break
-        except StopIteration:
-            pass # this is OK, expected
+                size = self.bufferSize if self.remaining is None else min(self.bufferSize, self.remaining)
+                count = self.readinto(self.sock, mv[:size])
         except GeneratorExit:
             pass  # this is OK, expected
         except SocketTimeoutError:
@@ -393,68 +930,283 @@ class LazyRequest:
         except BaseException as e:
             print("Unexpected exception")
             print(e)
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
             raise
-        finally:
-            s.close()
 
-    def processHttpHeaders(self): # Retrieves status code and content length.
-        stream = self.byteGenerator
-        contentLength = None
-        statusCode = None
+    def generateBodyChunks(self): # A generator of the body in chunks, continuing where processHttpHeaders() stopped.
+        if self.chunk is not None and self.pos < len(self.chunk):
+            yield self.chunk[self.pos:]
+        yield from self.chunkGenerator
 
-        key = b"content-length: "
-        keyLen = len(key)
-        keyPos = 0
+    def generateUnchunkedChunks(self, chunks):
+        """ A generator of the data in a body with "Transfer-Encoding: chunked", as slices of <chunks>. Only the chunk size
+            lines are read per byte. Sets self.remaining to 0 once the terminating chunk and trailer have been read.
+        """
+        size = -1 # Number of data bytes left in the current chunk, -1 while reading a size line, -2 for the CRLF after the data
+        last = False # Whether the terminating (empty) chunk was read, so only trailer lines are left
+        line = bytearray()
+        for chunk in chunks:
+            if chunk is None: # No data yet (see AsyncLazyRequest)
+                yield None
+                continue
+            pos = 0
+            count = len(chunk)
+            while pos < count:
+                if size > 0:
+                    end = min(count, pos + size)
+                    yield chunk[pos:end]
+                    size -= end - pos
+                    pos = end
+                    if size == 0:
+                        size = -2
+                    continue
+                byte = chunk[pos]
+                pos += 1
+                if byte != 10: # '\n'
+                    if byte != 13: # '\r'
+                        line.append(byte)
+                    continue
+                if size == -2:
+                    size = -1
+                elif last:
+                    if not line: # Empty line ends the trailer
+                        self.remaining = 0
+                        return
+                else:
+                    size = int(bytes(line).split(b';')[0].decode('ascii'), 16) # Ignore chunk extensions
+                    last = size == 0
+                line = bytearray()
 
-        # Parse the status line first
-        statusLine = []
-        while True:
-            byte = next(stream)
-            if byte == ord('\r'):  # End of the status line
-                next(stream)  # Consume the following '\n'
-                break
-            statusLine.append(chr(byte))
-
-        # Extract status code from the status line
-        statusParts = ''.join(statusLine).split()
-        if len(statusParts) >= 2 and statusParts[0].startswith("HTTP"):
-            statusCode = int(statusParts[1])  # The status code is the second element
-
-        # Extract content-length header
-        while contentLength is None:
-            byte = next(stream)
-            while chr(byte).lower() == chr(key[keyPos]): # bytes continue to match
-                byte = next(stream)
-                keyPos += 1
-                if keyPos == keyLen:
-                    char = chr(byte)
-                    numberString = ""
-                    while not char.isspace():
-                        numberString += char
-                        char = chr(next(stream))
-                    contentLength = int(numberString)
-                    break
-            else:
-                keyPos = 0
+    def generateContentChunks(self): # A generator of the body in chunks, without transfer encoding and decompressed if it has a Content-Encoding.
+        if self.responseHeaders.get("transfer-encoding", "identity").lower() == "chunked":
+            self.bodyChunks = self.generateUnchunkedChunks(self.generateBodyChunks())
+        else:
+            self.bodyChunks = self.generateBodyChunks()
+        encoding = self.responseHeaders.get("content-encoding", "identity").lower()
+        if encoding == "identity":
+            return self.bodyChunks
+        elif encoding in ("gzip", "deflate"):
+            return inflateChunks(self.bodyChunks, bytearray(self.bufferSize), wait=self.waits)
+        raise ValueError("Unsupported Content-Encoding {}".format(encoding))
 
-        # Consume bytes until double newline (end of header)
-        newlineCount = 0
-        while True:
-            try:
-                byte1 = next(stream)
-                if byte1 == ord('\r'):
-                    byte2 = next(stream)
-                    if byte2 == ord('\n'):
-                        newlineCount += 1
+    def processHttpHeaders(self):
+        """ Reads whole header lines from the response chunks, and stores the headers in responseHeaders (see
+            responseHeaderNames) by their lowercase name. Returns the status code and the content length (None if unknown),
+            and leaves self.chunk and self.pos at the start of the body.
+        """
+        self.responseHeaders = {}
+        statusCode = None
+        version = None
+        line = b"" # Start of a line which continues in the next chunk
+        for chunk in self.chunkGenerator:
+            data = bytes(chunk) # Supports find()
+            pos = 0
+            while True:
+                end = data.find(b"\n", pos)
+                if end < 0:
+                    line += data[pos:]
+                    break
+                if line:
+                    line += data[pos:end]
+                    text = line
+                    line = b""
                 else:
-                    newlineCount = 0
-                if newlineCount == 2:
+                    text = data[pos:end]
+                pos = end + 1
+                if text.endswith(b"\r"):
+                    text = text[:-1]
+                if not text: # Empty line ends the header
+                    self.chunk, self.pos = chunk, pos
                     break
-            except StopIteration:
-                pass
+                if statusCode is None:
+                    parts = text.split()
+                    if len(parts) < 2 or not parts[0].startswith(b"HTTP"):
+                        raise ValueError("No HTTP status line")
+                    version, statusCode = parts[0], int(parts[1])
+                    continue
+                key, _, value = text.partition(b":")
+                key = key.strip().lower().decode('ascii')
+                if key in responseHeaderNames:
+                    self.responseHeaders[key] = value.strip().decode('ascii')
+            if self.chunk is not None:
+                break
+        else:
+            raise OSError("Connection closed before the end of the header")
 
+        contentLength = self.responseHeaders.get("content-length")
+        chunked = self.responseHeaders.get("transfer-encoding", "").lower() == "chunked"
+        if contentLength is not None and not chunked:
+            contentLength = int(contentLength)
+            self.remaining = contentLength - (len(self.chunk) - self.pos) # Body bytes after this chunk
+        else:
+            contentLength = None
+        self.keepalive = self.pool is not None and (contentLength is not None or chunked) and version == b"HTTP/1.1" \
+            and self.responseHeaders.get("connection", "").lower() != "close"
         return statusCode, contentLength
 
+class AsyncLazyRequest(LazyRequest):
+    """ LazyRequest for asyncio (uasyncio on MicroPython), which reads the response without blocking other tasks.
+        Usage: request = await AsyncLazyRequest(url).open(), then check request.status_code, and
+        result = await request.drive(steps) for a generator of <steps> on request.tokenize() (e.g. KeyPaths.steps()), or
+        body = await request.read() for a response that is not JSON (e.g. an image).
+        Whenever the tokens need more data, <steps> yields and drive() awaits the next read from the socket, and it also
+        yields to other tasks after every buffer. Like LazyRequest, connections are kept alive in a pool (asyncPool), and
+        gzip- or deflate-encoded responses are decompressed as they come in (see inflateChunks()).
+    """
+    waits = True
+
+    def __init__(self, url, headers=None, timeout=1.0, bufferSize=defaultBufferSize, pool=asyncPool, compressed=True):
+        super().__init__(url, headers, timeout, bytearray(0), pool=pool, compressed=compressed)
+        self.bufferSize = bufferSize # Maximum number of bytes per read (data is read into new bytes objects instead of self.buf)
+        self.reader = self.writer = None
+        self.received = [] # Data read from the socket by receive(), which was not yet taken by self.chunkGenerator
+        self.eof = False # Whether the response has been read completely (or the connection was closed)
+        self.draining = False # Whether drive() should receive the end of the response before returning the connection (see close())
+
+    def start(self): # The request is only sent by open()
+        self.chunkGenerator = self.generateResponseChunks()
+        self.status_code = self.content_length = None
+
+    async def open(self): # Sends the request and reads the header of the response. Returns self.
+        key = (self.scheme, self.host, self.port)
+        if self.pool is None:
+            (self.reader, self.writer), reused = await AsyncConnectionPool.connect(key, self.timeout), False
+        else:
+            (self.reader, self.writer), reused = await self.pool.acquire(key, self.timeout)
+        try:
+            try:
+                data = await self.requestHeader()
+            except OSError:
+                if not reused:
+                    raise
+                data = None
+            if data is None and reused: # Server closed the pooled connection in the meantime, so reconnect
+                self.writer.close()
+                self.reader, self.writer = await self.pool.reconnect(key, self.timeout)
+                self.eof = False
+                data = await self.requestHeader()
+            if data is None:
+                raise OSError("Connection closed before the end of the header")
+        except BaseException:
+            self.writer.close()
+            self.reader = self.writer = None
+            raise
+        self.received.append(data)
+        self.status_code, self.content_length = self.processHttpHeaders()
+        return self
+
+    async def requestHeader(self): # Sends the request, and returns the data received up to the end of the header (None if nothing was)
+        self.sendRequest(self.writer)
+        await self.writer.drain()
+        data = b""
+        while data.find(b"\r\n\r\n") < 0: # The whole header is needed before processHttpHeaders()
+            await self.receive()
+            if self.eof:
+                if data:
+                    raise OSError("Connection closed before the end of the header")
+                return None
+            data += self.received.pop()
+        return data
+
+    async def receive(self): # Reads the next part of the response from the socket into self.received
+        size = self.bufferSize if self.remaining is None else min(self.bufferSize, self.remaining)
+        try:
+            data = await asyncio.wait_for(self.reader.read(size), self.timeout) if size > 0 else b""
+        except asyncio.TimeoutError: # Gave up awaiting more from the socket
+            data = b""
+        if not data:
+            self.eof = True
+            return
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        self.received.append(data)
+
+    async def drive(self, steps): # Runs the generator <steps> to the end while reading the response, and returns its return value
+        try:
+            while True:
+                next(steps)
+                if self.eof:
+                    raise OSError("Connection closed before the end of the response")
+                await self.receive()
+                await asyncio.sleep(0) # Let other tasks run between buffers, even if data is available
+        except StopIteration as e:
+            if self.draining:
+                await self.drain()
+            return e.value
+
+    async def drain(self): # Receives the end of a keep-alive response after its JSON (see close()), at most a buffer, and closes it
+        left = self.bufferSize
+        try:
+            while left > 0 and self.remaining != 0:
+                if self.remaining is None and self.bodyChunks is not None: # Chunked: until the terminating chunk and trailer
+                    for chunk in self.bodyChunks:
+                        if chunk is None:
+                            break
+                        left -= len(chunk)
+                    if self.remaining == 0:
+                        break
+                await self.receive()
+                if self.eof:
+                    break
+                if self.remaining is not None:
+                    left -= len(self.received.pop())
+        except OSError:
+            pass
+        self.close(self.remaining == 0)
+
+    def tokenize(self, lazy=False): # Tokenizes a JSON response per chunk, with a (WAIT, None) token whenever drive() should read more.
+        return super().tokenize(True, lazy)
+
+    async def read(self): # Returns the whole body (decompressed), and closes the response
+        return await self.drive(self.collect())
+
+    def collect(self): # Steps for drive() that gather the body, like tokenize() does for JSON
+        body = bytearray()
+        complete = False
+        try:
+            for chunk in self.generateContentChunks():
+                if chunk is None:
+                    yield
+                else:
+                    body.extend(chunk)
+            if self.remaining:
+                raise OSError("Connection closed before the end of the response")
+            complete = True
+        finally:
+            self.close(complete)
+        return bytes(body)
+
+    def generateResponseChunks(self): # A generator of the received data, which yields None while no data was received yet.
+        while True:
+            if self.received:
+                yield self.received.pop(0)
+            elif self.eof or self.remaining is not None and self.remaining <= 0:
+                return
+            else:
+                yield None
+
+    def close(self, drain=True):
+        """ Returns the connection to the pool if the response was received completely, otherwise closes it. With <drain>,
+            the end of a keep-alive response that was not received yet (e.g. the gzip trailer, or the terminating chunk)
+            is first received by drive(), since that needs to await.
+        """
+        if self.writer is None:
+            return
+        if drain and self.keepalive and not self.draining and self.bodyChunks is not None: # Called by tokenize()
+            self.draining = True
+            return
+        self.draining = False
+        self.chunkGenerator.close()
+        streams = (self.reader, self.writer)
+        self.reader = self.writer = None
+        if drain and self.keepalive and self.remaining == 0:
+            self.pool.release((self.scheme, self.host, self.port), streams)
+            return
+        self.bytes_saved = None if self.remaining is None else max(0, self.remaining)
+        streams[1].close()
+
 def extendpath(path: list, tok: str, val):
     """ <path> is a list of where in the JSON we are currently.
         Usage: create an empty array before the "for tok, val in ..." loop, and call extendpath() in every iteration.
@@ -475,6 +1227,127 @@ def extendpath(path: list, tok: str, val):
     return tok not in {STR, NUM, BOOL, NUL}
 
 
+class KeyPaths:
+    """ A set of subscribed key paths, compiled into a trie which is walked alongside a token stream.
+        Usage: register(("results", "*", "pad", "name"), handler) for every interesting path once, then walk(tokens)
+        for every response. A "*" matches any array index (a specific index like 0 takes precedence over "*").
+        Keys are matched both as str and as bytes, so tokens of ChunkTokenizer(lazy=True) need no decoding except for the
+        values passed to handlers. Only subscribed paths trigger handler(val, stars), where <stars> is the list of array indices matched by "*"
+        (only valid during the call): a leaf with its value, and a container with its type (OBJ or ARR) when it closes.
+        Each token costs O(1) dict lookups, regardless of how many paths are registered.
+        Containers without any subscribed path below them are skipped by sending SKIP to the token generator.
+        A handler can end the walk early by returning SKIP, to skip the rest of the array element matched by the innermost "*"
+        (e.g. the current result), or STOP, to skip the rest of the tokens. Then walk() closes the token generator and returns STOP.
+        With skip=False, nothing is skipped and all tokens are read.
+        steps(tokens) is the same walk as a generator, which yields whenever <tokens> has no data yet (a WAIT token), so
+        it can be resumed once more data has arrived (see AsyncLazyRequest.drive()).
+    """
+    def __init__(self):
+        self.trie = {}
+
+    def register(self, keypath, handler):
+        node = self.trie
+        for key in keypath:
+            child = node.get(key)
+            if child is None:
+                child = node[key] = {}
+                if type(key) is str and key != "*": # Also match the raw byte keys of ChunkTokenizer(lazy=True)
+                    node[key.encode('utf-8')] = child
+            node = child
+        node.setdefault(None, []).append(handler) # None is never a JSON key or index, so it marks handlers
+        return self
+
+    def walk(self, tokens, skip=True):
+        return runSteps(self.steps(tokens, skip))
+
+    def steps(self, tokens, skip=True):
+        nodes = [self.trie] # Trie node of each open container (None if nothing below it is subscribed)
+        indices = [None] # Current index in each open array (None for objects)
+        starred = [False] # Whether each open container was reached through "*"
+        stars = []
+        child = self.trie # Trie node of the upcoming value
+        skipTo = None # Depth (index in <nodes>) of the container being skipped on request of a handler
+        msg = None
+        while True:
+            try:
+                tok, val = tokens.send(msg)
+            except StopIteration:
+                return
+            msg = None
+            action = None
+            if tok is WAIT:
+                yield
+                continue
+            if tok is KEY:
+                node = nodes[-1]
+                child = None if node is None else node.get(val)
+                continue
+            if tok is CLOSE:
+                node = nodes.pop()
+                indices.pop()
+                if node is not None and None in node:
+                    action = self.notify(node[None], val, stars)
+                if starred.pop(): stars.pop()
+            else:
+                star = False
+                i = indices[-1]
+                if i is not None: # Value in an array: look up its index
+                    i += 1
+                    indices[-1] = i
+                    node = nodes[-1]
+                    if node is None:
+                        child = None
+                    else:
+                        child = node.get(i)
+                        if child is None:
+                            child = node.get("*")
+                            if child is not None:
+                                star = True
+                                stars.append(i)
+                if tok is OPEN:
+                    if child is None and skip:
+                        msg = SKIP
+                    nodes.append(child)
+                    indices.append(-1 if val is ARR else None)
+                    starred.append(star)
+                else:
+                    if child is not None and None in child:
+                        if type(val) is LazyValue: # Only subscribed values are decoded
+                            val = val.value()
+                        action = self.notify(child[None], val, stars)
+                    if star: stars.pop()
+            if action is not None and skip:
+                depth = len(starred) - 1
+                while depth > 0 and not starred[depth]:
+                    depth -= 1
+                if action is STOP or depth == 0:
+                    tokens.close()
+                    return STOP
+                skipTo = depth if skipTo is None else min(skipTo, depth)
+            if skipTo is not None:
+                if len(nodes) > skipTo: # Sending SKIP makes the tokenizer close the innermost container next
+                    msg = SKIP
+                else:
+                    skipTo = None
+
+    @staticmethod
+    def notify(handlers, val, stars): # Calls the <handlers>, and returns STOP or SKIP if any of them did (STOP first)
+        action = None
+        for handler in handlers:
+            result = handler(val, stars)
+            if result is STOP or result is SKIP and action is None:
+                action = result
+        return action
+
+
+def runSteps(steps): # Runs the generator <steps> (which yields while waiting for data) to the end, and returns its return value
+    try:
+        while True:
+            next(steps)
+    except StopIteration as e:
+        return e.value
+
+
 if __name__ == "__main__":
     path = []
     url="https://lldev.thespacedevs.com/2.3.0/launches/previous/?id=aa79ad61-9276-4c14-8d01-40fd348d641e&mode=list&format=json"
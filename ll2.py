@@ -1,74 +1,133 @@
 import errno
 import gc
-import json
-import requests
 import time
-from machine import Timer
 
-import medea
-from utils import iso8601_to_unix, log_exc, unix_to_iso8601, wrap_timer
-from web import connect
+from budget import DETAILS, THRESHOLD, UPCOMING, RequestBudget
+from cache import LaunchCache
+from cadence import CadencePlanner
+from launch import ChangeSet, Launch, LaunchParser, LaunchStore
+from lazy import LazyModule
+from requestqueue import RequestQueue
+from scheduler import scheduler
+from timeline import Timeline
+from utils import log_exc, print_mem, unix_to_iso8601
+
+medea = LazyModule("medea") # Loaded by the first request
+web = LazyModule("web") # Loaded by the first connect(), with network and ntptime
+
+
+def connect():
+    try:
+        return web.connect()
+    except ImportError: # No WIFI (e.g. when simulated on a host with CPython, see bench/)
+        pass
+
+async def connect_async():
+    try:
+        return await web.connect_async()
+    except ImportError:
+        pass
+
+
+MAX_SLEEP = 300 # Seconds between ticks when there is nothing to do
 
 
 class LL2Sync:
-    def __init__(self, API_throttle: int = 15, keep_seconds: int = 3600, cachefile: str = "llcache.json", dev: bool = False):
-        connect()
+    def __init__(self, API_throttle: int = 15, keep_seconds: int = 3600, cachefile: str = "llcache.bin", dev: bool = False, full_interval: int = 3600, details_batch: int = 5, base_url: str = None, online: bool = True):
+        if online: connect() # Otherwise, call set_online() once connected (e.g. to show the cache first while booting)
+        self.online = online # No requests are made while offline
         self.API_throttle = API_throttle # Request at most <API_throttle> requests per hour
         self.keep_seconds = keep_seconds # Launch will be displayed until at most T+<keep_seconds>
         self.dev = dev # Whether to use lldev or ll, for testing purposes.
+        self.base_url = base_url or f"https://{'lldev' if dev else 'll'}.thespacedevs.com/2.3.0/" # Or a stand-in of the API (see bench/ll2server.py)
 
-        self.queue = []
-        self.thresholds = Threshold([180, 60, -60, -180]) # Seconds until launch (<0 is T+) when we will re-fetch data (to detect HOLD HOLD HOLD)
+        self.queue = RequestQueue() # Requests to make when no Threshold or routine refresh is due
+        self.timeline = Timeline([180, 60, -60, -180]) # Seconds until launch (<0 is T+) when we will re-fetch data (to detect HOLD HOLD HOLD)
+        self.threshold_pending = False # A Threshold was passed, but the budget did not allow a request yet
+        self.budget = RequestBudget(limit=API_throttle, reserve=len(self.timeline)) # Keeps room in the hourly limit for the Thresholds
+        self.cadence = CadencePlanner(handover=max(self.timeline.thresholds)) # Interval between routine refreshes, shorter as T-0 approaches
         self._t_min = 0 # Earliest time when we want to know a launch (used in get_upcoming)
+        self.upcoming_limit = 10 # Number of launches in the upcoming list
+        self.full_interval = full_interval # Seconds between full refreshes of the upcoming list. In between, only the launches that changed are requested (0: always full)
+        self.full_due = True # The next refresh must be full (after booting, or when a launch may have left the list)
+        self.last_full = 0 # Time of the last full refresh
+        self.last_updated = None # Newest LL2 last_updated in the responses of upcoming lists (ISO 8601 strings sort like the times)
+        self.details_batch = details_batch # Number of launches to fetch in detailed mode with a single request
+        self.ticks = 0
+        self.read_errors = 0 # Responses that broke off or were invalid, of which nothing was stored
+        self.changes = ChangeSet() # Changes to the launches that the display did not take yet
+        self.refreshes = {"full": 0, "delta": 0, "delta_launches": 0} # Number of refreshes of each kind, and of launches received by delta refreshes
 
-        self.cachefile = cachefile
+        self._parser = None # See self.parser
+
+        self.cache = LaunchCache(cachefile) # Falls back to the JSON cache of older versions, llcache.json
         self.cache_load()
-        
-        self.timer_tick = Timer()
-        self.timer_tick.init(period=10_000, mode=Timer.PERIODIC, callback=lambda timer: wrap_timer(self.tick)) # Period in ms
-        self.tick()
+        self.start()
+
+    @property
+    def parser(self) -> LaunchParser: # Created by the first response, since compiling its key paths loads medea
+        if self._parser is None: self._parser = LaunchParser()
+        return self._parser
+
+    def set_online(self, online: bool = True): # Allows requests (or not), from the next tick on, which is armed right away
+        self.online = online
+        self.arm()
+
+    def start(self): # Ticks as soon as the scheduler runs, and then whenever there is something to do (see wake_time())
+        self.task_tick = scheduler.after(0, self.tick, name="LL2 tick")
     
     @property
     def t_min(self): # Adjusts _t_min appropriately
         self._t_min = max(self._t_min, time.time() - self.keep_seconds) # At most keep_seconds ago
         if len(self.launches) >= 2: # Check if launch 1 is closer than launch 0
-            dt_last = time.time() - self.launches[0]["net_epoch"] # Seconds since launch 0
-            dt_next = self.launches[1]["net_epoch"] - time.time() # Seconds until launch 1
+            dt_last = time.time() - self.launches[0].net_epoch # Seconds since launch 0
+            dt_next = self.launches[1].net_epoch - time.time() # Seconds until launch 1
             if dt_next < dt_last:
-                self._t_min = self.launches[0]["net_epoch"] + 1
+                self._t_min = self.launches[0].net_epoch + 1
         return self._t_min
     
+    def delta_since(self) -> str | None: # last_updated from which the next refresh only asks for changed launches, or None for a full refresh
+        if self.full_due or time.time() - self.last_full >= self.full_interval: return
+        return self.last_updated
+
+    @property
+    def request_dt(self): # Seconds between requests: routine refreshes as planned by self.cadence, the queue at a constant pace
+        if len(self.queue) == 0: return self.cadence.interval(self.launches[0] if self.launches else None, self.budget)
+        return self.queue_dt
+
     @property
-    def request_dt(self):
+    def queue_dt(self):
         # Two launches within 1 hour only happened twice in 2024. Probably more frequent in the future, but still rare.
-        n = max(1, (self.API_throttle - len(self.thresholds))/2) # So allow room for Thresholds to be triggered once per hour, and then some
+        n = max(1, (self.budget.limit - len(self.timeline))/2) # So allow room for Thresholds to be triggered once per hour, and then some
         dt = int(3600/n) + 1
         return min(dt, 600) # Wait at most 10 minutes
     
-    def cache_save(self):
-        with open(self.cachefile, "w") as llcache:
-            json.dump({"launches": self.launches, "lastfetch": self.lastrequesttime}, llcache)
+    def take_changes(self) -> ChangeSet: # The changes since the previous call
+        changes, self.changes = self.changes, ChangeSet(head=False)
+        return changes
+
+    def cache_save(self, force: bool = False): # Stores the launches and the queue, unless the cache was written less than a minute ago
+        self.cache.save(self.launches, self.queue.to_list(), self.lastrequesttime, force)
     
     def cache_load(self):
         try:
-            with open(self.cachefile, "r") as llcache:
-                llc = json.load(llcache)
-                self.launches = llc["launches"]
-                self.lastrequesttime = llc["lastfetch"]
-            for launch in self.launches:
-                if not launch.get("detailed", False): # Launch was not yet fetched in detailed mode
-                    self.queue_details(launch["id"])
-        except (OSError, KeyError) as e: # File not found or invalid
+            launches, queue, self.lastrequesttime = self.cache.load()
+            self.launches = LaunchStore(launches)
+            self.queue = RequestQueue.from_list(queue) # Requests that were pending before the reboot
+            undetailed = [launch.id for launch in self.launches if not launch.detailed] # Launches not yet fetched in detailed mode
+            self.queue.discard(lambda ID: ID in undetailed)
+            for ID in undetailed: self.queue_details(ID) # Collapses into the pending requests of the saved queue
+        except (OSError, ValueError) as e: # File not found or invalid
             log_exc(e)
-            self.launches = []
+            self.launches = LaunchStore()
             self.lastrequesttime = 0
-            self.cache_save() # Should create or overwrite file
+            self.cache_save(force=True) # Should create or overwrite file
 
     @property
     def NETepoch(self):
         if len(self.launches) == 0: return 0
         # TODO: return -1 if API issue, but somehow have to store that we had an issue then.
-        return self.launches[0]["net_epoch"]
+        return self.launches[0].net_epoch
     
     @property
     def dt(self):
@@ -84,49 +143,101 @@ class LL2Sync:
         S -= M*60
         return (self.dt >= 0, H, M, S)
 
-    def tick(self): # Performs all the checks and requests information when needed. Should be run every few seconds or so.
+    def tick(self): # Performs all the checks and requests information when needed, and then arms the next tick
+        self.ticks += 1
         gc.collect()
-        # HOW ABOUT THIS:
-        #   -> Must make sure that we do not empty this queue too rapidly, otherwise threshold requests might fail.
-        #        -> Idea: we could keep track of <i>, the number of requests performed, and when it exceeds
-        #                 <API_throttle>-5, we do not request anymore unless it is a threshold. When we hit this
-        #                 amount, request our quota from the API after every request and update <i> accordingly.
-        
-        if self.thresholds.pass_check(self.dt): # Threshold passed: should definitely re-fetch NETs
-            self.get_upcoming()
-        if time.time() - self.lastrequesttime > self.request_dt: # Sufficient time has passed since last request
+        try:
+            for request in self.tick_requests(): request()
+        finally: # Also after an error, or there would be no more ticks
+            self.arm()
+
+    def arm(self): # Moves the one-shot tick to wake_time(), at most MAX_SLEEP seconds from now (in case the clock is set)
+        delay = min(max(0, self.wake_time() - time.time()), MAX_SLEEP)
+        scheduler.reschedule(self.task_tick, delay) # The same task every time, so scheduler.report() shows the stats of all ticks
+
+    def plan_timeline(self): # Updates self.timeline if the NET or the expiry of the next launch changed
+        if len(self.launches) == 0: return self.timeline.plan(None, None, time.time())
+        net = self.launches[0].net_epoch
+        expiry = net and net + self.keep_seconds # When t_min passes it (see self.t_min)
+        if net and len(self.launches) >= 2 and self.launches[1].net_epoch: # Or once launch 1 is closer
+            expiry = min(expiry, (net + self.launches[1].net_epoch)//2 + 1)
+        self.timeline.plan(net, expiry, time.time())
+
+    def wake_time(self): # Earliest time at which tick_requests() has something to do
+        now = time.time()
+        self.plan_timeline()
+        times = [] if self.timeline.next() is None else [self.timeline.next()]
+        if self.online:
+            if self.threshold_pending: times.append(self.budget.available_at(THRESHOLD, now))
+            kind = UPCOMING if len(self.queue) == 0 else self.queue.peek()[0]
+            times.append(max(self.lastrequesttime + self.request_dt, self.budget.available_at(kind, now)))
+        if self.cache.dirty: times.append(self.cache.written + self.cache.min_interval)
+        return min(times) if times else now + MAX_SLEEP
+
+    def tick_requests(self): # Yields the requests (functions without arguments) of a tick, each to be called before continuing
+        # Every request must be allowed by self.budget, which keeps the last requests of the hour for the Thresholds,
+        # so emptying the queue can not make the requests near T-0 fail.
+        if self.online and self.budget.needs_sync(): # Running low: make sure no requests went uncounted
+            yield self.sync_budget
+        self.plan_timeline()
+        if self.timeline.crossed(time.time()): # Threshold passed: should definitely re-fetch NETs
+            self.threshold_pending = True
+        if self.online and self.threshold_pending and self.budget.allows(THRESHOLD):
+            self.threshold_pending = False
+            errors = self.read_errors
+            yield self.get_upcoming
+            if time.time() < self.budget.blocked_until or self.read_errors > errors: self.threshold_pending = True # Got a 429 status or an incomplete response, so try again later
+        if self.online and time.time() - self.lastrequesttime >= self.request_dt: # Sufficient time has passed since last request
             if len(self.queue) == 0: # No special requests
-                self.get_upcoming()
-                self.queue_details(self.launches[0]["id"])
+                if self.budget.allows(UPCOMING):
+                    yield self.get_upcoming
+                    if self.launches and not self.launches[0].detailed: # Changed since its details were fetched
+                        self.queue_details(self.launches[0].id, priority=1)
             else:
-                self.queue[0]()
-                self.queue.pop(0)
+                kind, ID = self.queue.peek()
+                if not self.budget.allows(kind): # Checked once, since every check that fails counts as denied
+                    pass
+                elif kind == UPCOMING:
+                    yield self.get_upcoming
+                    self.queue.remove(kind) # Not pop(), since the response may have queued other requests
+                else:
+                    IDs = self.queue.batch(DETAILS, self.details_batch)
+                    for ID in IDs: self.queue.remove(DETAILS, ID) # Launches that are not received are queued again by get_details()
+                    yield lambda: self.get_details(IDs)
         # Remove launches from before <self.t_min>
-        n = len(self.launches)
-        self.launches = list(filter(lambda launch: launch["net_epoch"] > self.t_min, self.launches))
-        if len(self.launches) < n: # A launch has been removed, so update everything.
-            self.get_upcoming()
-
-    def request(self, endpoint) -> medea.LazyRequest | None:
-        api = "lldev" if self.dev else "ll"
-        url = f"https://{api}.thespacedevs.com/2.3.0/" + endpoint.lstrip("/")
-        if self.lastrequesttime > time.time(): return # Happens if 429 status happened recently
+        if self.launches.expire(self.t_min): # A launch has been removed, so update everything.
+            self.changes.head = True
+            self.queue.discard(lambda ID: ID in self.launches)
+            self.full_due = True
+            if self.online and self.budget.allows(UPCOMING): yield self.get_upcoming
+        if self.cache.dirty: self.cache_save() # Writes changes of which the save was postponed
+
+    def request_url(self, endpoint) -> str | None: # URL of <endpoint>, or None if no request may be made now
+        url = self.base_url + endpoint.lstrip("/")
+        if time.time() < self.budget.blocked_until: return # Happens if 429 status happened recently
         self.lastrequesttime = time.time()
+        self.budget.record()
+        print_mem()
+        gc.collect()
+        print_mem()
+        print(url)
+        return url
+
+    def request(self, endpoint) -> "medea.LazyRequest | None":
+        url = self.request_url(endpoint)
+        if url is None: return
         try:
-            print(gc.mem_alloc(), gc.mem_free())
-            gc.collect()
-            print(gc.mem_alloc(), gc.mem_free())
-            print(url)
             response = medea.LazyRequest(url, timeout=10.)
-            print("Response status code:", response.status_code)
+            print("Response status code:", response.status_code, "(connection pool hits/misses: %d/%d)" % (medea.pool.hits, medea.pool.misses))
+            if response.status_code != 200: response.close()
             if response.status_code == 429: # Too many requests
-                response_throttle = requests.get("https://ll.thespacedevs.com/2.3.0/api-throttle/") # Just use requests lib, this is a small JSON
-                self.lastrequesttime = time.time() + response_throttle.json()["next_use_secs"]
+                self.sync_budget()
                 return
             elif response.status_code == 200: return response
             else: return
         except OSError as e:
             if e.errno == errno.EHOSTUNREACH:
+                medea.pool.close() # Pooled connections will not survive a new WIFI connection
                 connect() # WIFI connection likely lost
                 return self.request(endpoint)
             else:
@@ -136,164 +247,191 @@ class LL2Sync:
             log_exc(e)
             connect()
     
-    def update_launch_data(self, lazyreq: medea.LazyRequest, detailed: bool = False): # Puts relevant information from an LL2 launch response into self.launches.
-        """ When <detailed> is True, the ["detailed"] field of affected launches is set to True, preventing further detailed requests. """
-        new = [{}] # List of launches in the response. We will build this up during the JSONgen, and merge with self.launches later.
-        
-        JSONgen = lazyreq.tokenize()
-        path = []
-        i = d = 0
-        def check_field(*keypath): return path[d:] == list(keypath)
-
-        for tok, val in JSONgen:
-            if medea.extendpath(path, tok, val): continue # Not at a key-value pair
-            # API either returns a pure launch, or an object like {<request_metadata>, "results": [<launch(es)>]}
-            if path[0] == "results": # Response includes some metadata, so ignore that
-                i = int(path[1]) # Number of launch we are at in the response (for indexing <new>)
-                d = 2 # Offset for indexing (because we have to skip ["results"][i])
-                if len(new) <= i: new.append({})
-
-            l = new[i]
-            if check_field("id"):
-                l["id"] = val
-            elif check_field("net"):
-                l["net"] = val
-                l["net_epoch"] = iso8601_to_unix(l["net"])
-            elif check_field("net_precision", "id"):
-                l["net_precision_id"] = val # >2: Uncertainty >1h, so probably not interesting to show on clock
-            elif path[d] == "status": # Dict with "id", "name", "abbrev" and "description"
-                l.setdefault("status", {}) # Setting a dict requires some extra effort
-                l["status"][path[d+1]] = val
-            elif check_field("image", "thumbnail_url"):
-                l["image_thumbnail_url"] = val
-            elif check_field("name"):
-                split = val.split(" | ") # Failsafe when not using detailed mode
-                if len(split) != 2: continue
-                l.setdefault("rocket_name", split[0])
-                l.setdefault("payload_name", split[1])
-            elif check_field("rocket", "configuration", "full_name"):
-                l["rocket_name"] = val
-            elif check_field("mission", "name"):
-                l["payload_name"] = val
-            elif check_field("pad", "name"):
-                l["pad"] = val
-            elif check_field("pad", "location", "name"):
-                l["pad_location"] = val
-            elif check_field("launch_service_provider", "name"):
-                l["lsp"] = val
-            elif "country" in path: # Country codes are found in many places. Set country in increasing order of importance.
-                priorities = [ # First has highest priority
-                    ("rocket", "configuration", "manufacturer", "country", 0, "alpha_2_code"),
-                    ("launch_service_provider", "country", 0, "alpha_2_code"),
-                    ("mission", "agencies", 0, "country", 0, "alpha_2_code"),
-                    ("pad", "country", "alpha_2_code"),
-                    ("pad", "agencies", 0, "country", 0, "alpha_2_code")
-                ]
-                for i, p in enumerate(priorities):
-                    if check_field(*p):
-                        if l.get("country_priority", 100) >= i:
-                            l["country"] = val
-                            l["country_priority"] = i
-                            break
+    def sync_budget(self): # Updates self.budget with the count of the API (which does not count this request)
+        throttle, response = {}, None
+        try:
+            response = medea.LazyRequest(self.base_url + "api-throttle/", timeout=10.)
+            if response.status_code == 200: self.throttle_keypaths(throttle).walk(response.tokenize(lazy=True))
+            else: response.close()
+        except (OSError, AssertionError, ValueError) as e: # No connection, or not the JSON of the endpoint (e.g. an HTML error page)
+            log_exc(e)
+            if response is not None: response.close(drain=False) # Not returned to the connection pool
+            throttle = {}
+        self.apply_throttle(throttle)
+
+    @staticmethod
+    def throttle_keypaths(throttle: dict) -> "medea.KeyPaths": # Puts the fields of an api-throttle response into <throttle>
+        keypaths = medea.KeyPaths()
+        for key in ("current_use", "next_use_secs", "your_request_limit"):
+            keypaths.register((key,), lambda val, stars, key=key: throttle.__setitem__(key, val))
+        return keypaths
+
+    def apply_throttle(self, throttle: dict):
+        if "current_use" in throttle:
+            self.budget.sync(throttle["current_use"], throttle.get("next_use_secs", 0), throttle.get("your_request_limit"))
+        else: # Invalid response: wait as long as between two normal requests, and keep our own count until the next sync
+            self.budget.synced = time.time()
+            self.budget.block(self.request_dt)
+
+    def update_launch_data(self, lazyreq: "medea.LazyRequest", detailed: bool = False, delta: bool = False, count: int = None) -> list[Launch] | None:
+        """ Puts relevant information from an LL2 launch response into self.launches, and returns the launches of the response
+            (None if the response broke off or was invalid, in which case nothing is stored).
+            When <detailed> is True, the .detailed field of affected launches is set to True, preventing further detailed requests.
+            When <delta> is True, the response only has the upcoming launches that changed (see store_launches()).
+            Once <count> launches are complete, the rest of the response is not read (e.g. the number of requested IDs).
+        """
+        try:
+            new = self.parser.parse(lazyreq.tokenize(lazy=True), count=count) # List of launches in the response, to be merged with self.launches.
+        except (OSError, AssertionError) as e: # Connection lost, or invalid JSON
+            return self.read_failed(lazyreq, e)
+        if lazyreq.bytes_saved: print("Stopped reading the response early, saving %d bytes" % lazyreq.bytes_saved)
+        self.store_launches(new, detailed, delta)
+        return new
+
+    def read_failed(self, lazyreq: "medea.LazyRequest", e: Exception) -> None:
+        log_exc(e)
+        lazyreq.close(drain=False) # Not returned to the connection pool
+        self.read_errors += 1
 
+    def store_launches(self, new: list[Launch], detailed: bool = False, delta: bool = False): # Merges the launches <new> of a response into self.launches, and saves them.
+        edge = self.launches[-1].net_epoch if len(self.launches) >= self.upcoming_limit else None # Last NET of a full upcoming list
+        head = self.launches.head()
         # Update <self.launches> with <new>
         for launch in new:
-            if (ID := launch.get("id")) is None: continue
-            launch.pop("country_priority", None)
-            
-            # Have we requested this ID yet?
-            ls = [l for l in self.launches if l["id"] == ID]
-            if ls: # Known launch
-                l = ls[0]
-            else: # New launch: add and fetch details
-                l = {"id": ID, "detailed": False}
-                self.launches.append(l)
-                self.queue_details(ID)
-            
-            merge(l, launch) # <launch> will overwrite fields in <l>
-            
-            if detailed: l["detailed"] = True
+            if launch.id is None: continue
+            if not detailed and launch.last_updated is not None and (self.last_updated is None or launch.last_updated > self.last_updated):
+                self.last_updated = launch.last_updated # Also for launches that do not fit in the list, so the next delta skips them
+            known = self.launches.get(launch.id)
+            stale = known is not None and launch.last_updated != known.last_updated # LL2 changed the launch since we got it
+            l, added, changed = self.launches.upsert(launch) # A known launch is overwritten in place (and moved if its NET changed)
+            self.changes.record(l.id, changed)
+            if added: self.queue_details(l.id) # New launch: fetch details
+            if detailed: l.detailed = True
+            elif stale: l.detailed = False # Details may be outdated
+            if delta and known is not None and edge is not None and (l.net_epoch or 0) > edge: # Moved out of the list, so we do not know which launch took its place
+                self.full_due = True
         
         # Remove launches that are not in the upcoming
         if not detailed: # Only do this when we are making an "upcoming" request
-            IDs = [l["id"] for l in new]
-            self.launches = list(filter(lambda launch: launch["id"] in IDs, self.launches))
+            if delta: # Only the changed launches: keep the others, but no more than fit in the list
+                self.launches.trim(self.upcoming_limit)
+                if len(new) >= self.upcoming_limit: self.full_due = True # Possibly more changes than fit in a response
+                self.refreshes["delta"] += 1
+                self.refreshes["delta_launches"] += len(new)
+            else:
+                self.launches.retain(set(l.id for l in new))
+                self.full_due = False
+                self.last_full = time.time()
+                self.refreshes["full"] += 1
+            self.queue.discard(lambda ID: ID in self.launches)
+        if self.launches.head() is not head: self.changes.head = True
         
-        # Sort and save
-        self.launches.sort(key=lambda launch: launch["net_epoch"]) # Keep ordered if times would have changed
+        # Save
         self.lastrequesttime = time.time() # Just to be safe, because update_launch_data() can take a while to run
         self.cache_save()
     
-    def get_upcoming(self, n=10):
+    def upcoming_endpoint(self, n=10, since=None): # Only the launches updated at or after <since> (ISO 8601), if given
         t_min = unix_to_iso8601(self.t_min)
         endpoint = f"/launches/upcoming/?limit={n:d}&mode=list&include_suborbital=false&ordering=net&net__gt={t_min}"
-        response = self.request(endpoint)
-        if response is None: return
-        self.update_launch_data(response, detailed=False)
-    
-    def get_details(self, ID): # Fetches launch <ID> in detailed mode
-        endpoint = f"/launches/upcoming/?id={ID}&mode=normal"
-        response = self.request(endpoint)
+        return endpoint if since is None else endpoint + f"&last_updated__gte={since}"
+
+    def details_endpoint(self, IDs):
+        return f"/launches/upcoming/?id__in={','.join(IDs)}&limit={len(IDs):d}&mode=normal"
+
+    def get_upcoming(self): # Refreshes the upcoming list, fully or only the launches that changed (see delta_since())
+        since = self.delta_since()
+        response = self.request(self.upcoming_endpoint(self.upcoming_limit, since))
         if response is None: return
-        self.update_launch_data(response, detailed=True)
+        self.update_launch_data(response, detailed=False, delta=since is not None)
     
-    def queue_details(self, ID):
-        self.queue.append(lambda: self.get_details(ID))
-        self.queue.append(self.get_upcoming) # After fetching details, make sure to update NETs before next element in queue
-
+    def get_details(self, IDs: list): # Fetches the launches <IDs> in detailed mode, with a single request
+        response = self.request(self.details_endpoint(IDs))
+        new = None if response is None else self.update_launch_data(response, detailed=True, count=len(IDs))
+        self.requeue_details(IDs, new or [], answered=new is not None)
 
-class Threshold:
-    def __init__(self, thresholds: list[float], start_value=0):
-        """ Given a list of <thresholds>, calling self.pass_check(value) will check if <value> passes any of
-            those thresholds when coming from the <old_value> of the previous self.pass_check(old_value) call
-            (most recently passed threshold is disabled until another is passed, so <len(thresholds)> must be > 2).
+    def requeue_details(self, IDs: list, new: list[Launch], answered: bool = True):
+        """ Queues the launches <IDs> that are not in the response <new> again, behind the others. If LL2 <answered> without
+            them, they are no longer upcoming (e.g. deleted), so a full refresh goes first: it drops them from the queue.
         """
-        self.thresholds = thresholds # List of thresholds where self.check() returns true if passed
-        self.value = start_value # Last seen value
-        self._last_th_passed = None # Used to make sure we don't activate the same threshold twice in row (is annoying)
-
-    def pass_check(self, value):
-        """ Returns True if a threshold was passed/reached when going from <value> to <self.value>. """
-        f = lambda threshold: (threshold - value)*(threshold - self.value) <= 0 and self.value != threshold
-        thresholds_passed = list(filter(f, self.thresholds))
-        self.value = value
-
-        if len(thresholds_passed) == 0: return False # No thresholds passed
-        if self._last_th_passed is not None:
-            if len(thresholds_passed) == 1:
-                if self._last_th_passed == thresholds_passed[0]: # The only passed threshold is the last passed one
-                    return False
-
-        # Find the nearest passed threshold and return True
-        deltas = [abs(threshold - value) for threshold in self.thresholds]
-        nearest_th_i = deltas.index(min(deltas)) # Get argmin of <deltas> without numpy
-        self._last_th_passed = nearest_th_i
-        return True
-
-    def __len__(self): return len(self.thresholds)
-
-
-def merge(a, b, path=None, update=True):
-    """ From https://stackoverflow.com/a/25270947 """
-    if path is None: path = []
-    for key in b:
-        if key in a:
-            if isinstance(a[key], dict) and isinstance(b[key], dict):
-                merge(a[key], b[key], path + [str(key)])
-            elif a[key] == b[key]:
-                pass # same leaf value
-            elif isinstance(a[key], list) and isinstance(b[key], list):
-                for idx, val in enumerate(b[key]):
-                    a[key][idx] = merge(a[key][idx], b[key][idx], path + [str(key), str(idx)], update=update)
-            elif update:
-                a[key] = b[key]
+        received = set(launch.id for launch in new)
+        missing = [ID for ID in IDs if ID not in received and ID in self.launches]
+        for ID in missing: self.queue.push(DETAILS, ID, priority=-1)
+        if missing and answered:
+            self.full_due = True
+            self.queue.push(UPCOMING)
+
+    def queue_details(self, ID, priority: int = 0):
+        self.queue.push(DETAILS, ID, priority)
+        self.queue.push(UPCOMING, priority=priority) # After fetching details, make sure to update NETs before next element in queue
+
+
+class AsyncLL2Sync(LL2Sync):
+    """ LL2Sync for asyncio: tick() is a coroutine, which the scheduler runs as its own asyncio task, and responses are
+        read by medea.AsyncLazyRequest, so other tasks (like the display) keep running while a response comes in.
+    """
+    async def tick(self):
+        self.ticks += 1
+        gc.collect()
+        try:
+            for request in self.tick_requests(): await request()
+        finally:
+            self.arm()
+
+    async def request(self, endpoint) -> "medea.AsyncLazyRequest | None":
+        url = self.request_url(endpoint)
+        if url is None: return
+        try:
+            response = await medea.AsyncLazyRequest(url, timeout=10.).open()
+            print("Response status code:", response.status_code, "(connection pool hits/misses: %d/%d)" % (medea.asyncPool.hits, medea.asyncPool.misses))
+            if response.status_code != 200: response.close()
+            if response.status_code == 429: # Too many requests
+                await self.sync_budget()
+                return
+            elif response.status_code == 200: return response
+            else: return
+        except OSError as e:
+            if e.errno == errno.EHOSTUNREACH:
+                medea.asyncPool.close() # Pooled connections will not survive a new WIFI connection
+                await connect_async() # WIFI connection likely lost
+                return await self.request(endpoint)
             else:
-                raise Exception('Conflict at %s' % '.'.join(path + [str(key)]))
-        else:
-            a[key] = b[key]
-    return a
+                log_exc(e)
+                raise e
+
+    async def sync_budget(self): # See LL2Sync.sync_budget()
+        throttle, response = {}, None
+        try:
+            response = await medea.AsyncLazyRequest(self.base_url + "api-throttle/", timeout=10.).open()
+            if response.status_code == 200: await response.drive(self.throttle_keypaths(throttle).steps(response.tokenize(lazy=True)))
+            else: response.close()
+        except (OSError, AssertionError, ValueError) as e:
+            log_exc(e)
+            if response is not None: response.close(drain=False) # Not returned to the connection pool
+            throttle = {}
+        self.apply_throttle(throttle)
+
+    async def update_launch_data(self, lazyreq: "medea.AsyncLazyRequest", detailed: bool = False, delta: bool = False, count: int = None) -> list[Launch] | None: # See LL2Sync.update_launch_data()
+        try:
+            new = await lazyreq.drive(self.parser.steps(lazyreq.tokenize(lazy=True), count=count))
+        except (OSError, AssertionError) as e:
+            return self.read_failed(lazyreq, e)
+        if lazyreq.bytes_saved: print("Stopped reading the response early, saving %d bytes" % lazyreq.bytes_saved)
+        self.store_launches(new, detailed, delta)
+        return new
+
+    async def get_upcoming(self): # See LL2Sync.get_upcoming()
+        since = self.delta_since()
+        response = await self.request(self.upcoming_endpoint(self.upcoming_limit, since))
+        if response is None: return
+        await self.update_launch_data(response, detailed=False, delta=since is not None)
+
+    async def get_details(self, IDs: list): # See LL2Sync.get_details()
+        response = await self.request(self.details_endpoint(IDs))
+        new = None if response is None else await self.update_launch_data(response, detailed=True, count=len(IDs))
+        self.requeue_details(IDs, new or [], answered=new is not None)
+
 
 if __name__ == "__main__":
     LL2 = LL2Sync()
     if len(LL2.launches):
-        LL2.get_details(LL2.launches[0]["id"])
+        LL2.get_details([LL2.launches[0].id])
@@ -1,35 +1,95 @@
-import gc
-import krequests
-import time
+from lazy import ImportProfiler, LazyModule
+with ImportProfiler(): # Records the duration and heap delta of the imports at boot (see lazy.report())
+    import asyncio
+    import gc
+    import lazy
+    import time
 
-from machine import Timer
+    from lcd import LCD_1inch8
+    from ldr import LDR
+    from launch import Launch
+    from ll2 import AsyncLL2Sync
+    from scheduler import scheduler
+    from segmentdisplay import SegmentDisplay
+    from utils import PhaseTimer, isdst_CET, log_exc, wrap_text
 
-from lcd import LCD_1inch8
-from ldr import LDR
-from ll2 import LL2Sync
-from segmentdisplay import SegmentDisplay
-from utils import isdst_CET, log_exc, wrap_text, wrap_timer
-from web import connect
+medea = LazyModule("medea") # Loaded by the first flag download (unless a response of LL2 loaded it before)
+web = LazyModule("web") # Loaded by go_online(), with network and ntptime
+
+
+STATUS_HEIGHT, TIME_HEIGHT = 16, 10 # Pixels of the status bar and the launch time, at the bottom of the LCD
+INFO, TIME, STATUS = 0, 1, 2 # Regions of the LCD, from the top
+REGIONS = {"country": INFO, "rocket_name": INFO, "payload_name": INFO, "pad": INFO, "pad_location": INFO, "net_epoch": TIME,
+           "status_id": STATUS, "status_name": STATUS, "status_abbrev": STATUS} # Region of the LCD that shows each field of a launch
+FRAME_INTERVAL = 60 # Seconds between writes of the LCD frame (40 kB) for the next boot, which update_LCD() only marks as due
+FLAG_URL = "https://raw.githubusercontent.com/yammadev/flag-icons/bd4bcf4f4829002cd10416029e05ba89a7554af4/png/%s.png"
 
 
 class CountdownClock:
     def __init__(self, SegmentDisplay_kwargs: dict = None, LCD_kwargs: dict = None, LDR_kwargs: dict = None, show_CET: bool = False):
+        """ Boots offline first: the countdown and the LCD are shown from the cache (and the frame of the LCD that was shown
+            last), and only then does go_online() connect to WIFI in the background. The duration of each phase is logged
+            to boot.log once online.
+        """
+        self.boot = PhaseTimer()
         if SegmentDisplay_kwargs is None: SegmentDisplay_kwargs = {}
         if LCD_kwargs is None: LCD_kwargs = {}
         if LDR_kwargs is None: LDR_kwargs = {}
         self.segmentdisplay = SegmentDisplay(**SegmentDisplay_kwargs)
         self.LCDdisplay = LCD_1inch8(**LCD_kwargs)
-        self.LCD_last_update = 0 # Seconds since epoch.
+        self.frames = {"full": 0, "partial": 0, "avoided": 0} # LCD updates for the changes of LL2: redrawn fully, partly, or not at all because no field shown changed
+        self.flag = (None, None) # (country, PNG) of the flag that was downloaded last
+        self.flag_skipped = None # ID of the launch of which the flag was not drawn (while offline, or not downloaded yet)
         self.LDR = LDR(**LDR_kwargs)
         self.brightness_update(delta=None)
         self.show_CET = show_CET
-
-        self.segmentdisplay.display_message("CONNECT..")
-        connect() # LL2 does this as well, but can't hurt to try already
         self.segmentdisplay.display_message("LOADING..")
-        self.LL2 = LL2Sync(dev=False)
-        self.timer_display = Timer()
-        self.timer_display.init(freq=1, mode=Timer.PERIODIC, callback=lambda timer: wrap_timer(self.show))
+        self.boot.mark("displays")
+
+        stamp = self.LCDdisplay.load_frame() # Shown as is until LL2 changes something
+        self.frame_loaded = stamp is not None
+        if self.frame_loaded: self.LCDdisplay.show()
+        self.boot.mark("frame")
+        self.LL2 = AsyncLL2Sync(dev=False, online=False)
+        if self.frame_loaded and stamp == self.frame_stamp(): self.LL2.take_changes() # The frame shows the cache already (unless power was lost before one of both was written)
+        self.frame_pending = None # Stamp of the frame on the LCD while it was not saved yet (see save_frame())
+        self.boot.mark("cache")
+        self.task_show = scheduler.every(1, self.show, name="show", priority=10, deadline=0.5) # Showing a second late is pointless
+        self.task_frame = scheduler.every(FRAME_INTERVAL, self.save_frame, name="frame", priority=-1, delay=FRAME_INTERVAL)
+        self.task_online = scheduler.after(0, self.go_online, name="online")
+        self.task_flag = scheduler.after(0, self.fetch_flag, name="flag") # Rescheduled by draw_info() whenever a flag is missing
+
+    async def go_online(self): # Connects to WIFI without blocking the countdown, and then lets LL2 make requests
+        await web.connect_async()
+        self.boot.mark("network")
+        self.LL2.set_online()
+        if self.flag_skipped is not None: # Drawn while offline, so without flag: draw it again
+            self.LL2.changes.record(self.flag_skipped, ["country"])
+        if "countdown" in dict(self.boot.phases): self.log_boot() # Otherwise, the first show() logs
+
+    async def fetch_flag(self): # Downloads the flag of the first launch without holding up show(), and then has it drawn
+        l = self.LL2.launches[0] if len(self.LL2.launches) != 0 else Launch()
+        country = l.country
+        if country is None or not self.LL2.online or self.flag[0] == country: return
+        try:
+            gc.collect()
+            response = await medea.AsyncLazyRequest(FLAG_URL % country.upper(), timeout=10., pool=None).open()
+            if response.status_code != 200: # E.g. no flag for this country: tried again when the INFO region is redrawn
+                print("Flag of %s: status %d" % (country, response.status_code))
+                response.close()
+                return
+            self.flag = (country, await response.read())
+        except Exception as e:
+            log_exc(e)
+            self.flag = (None, None)
+            await web.connect_async() # WIFI connection likely lost
+            return
+        if len(self.LL2.launches) != 0 and self.LL2.launches[0].country == country: # Redraw the INFO region, now with the flag
+            self.LL2.changes.record(self.LL2.launches[0].id, ["country"])
+
+    def log_boot(self): # Once online and counting down
+        self.boot.log()
+        print(lazy.report())
 
     def brightness_update(self, delta: float|None = 0.05):
         """ Sets the brightness based on the LDR connected to the system.
@@ -46,6 +106,116 @@ class CountdownClock:
         self.LCDdisplay.brightness = self.brightness
         self.segmentdisplay.brightness = self.brightness*16 - 1
 
+    def update_LCD(self, changes): # Redraws the regions of the LCD that show a field in <changes> (a ChangeSet)
+        l = self.LL2.launches[0] if len(self.LL2.launches) != 0 else Launch()
+        fields = changes.launch(l.id)
+        regions = set(REGIONS.values()) if changes.head else set(REGIONS[name] for name in fields if name in REGIONS)
+        if not regions: # The response did not change anything that is shown
+            self.frames["avoided"] += 1
+        else:
+            if INFO in regions: self.draw_info(l)
+            if TIME in regions: self.draw_time(l)
+            if STATUS in regions: self.draw_status(l)
+            self.LCDdisplay.show()
+            self.frame_pending = self.frame_stamp() # Written by save_frame(), outside of show()
+            self.frames["full" if len(regions) == len(set(REGIONS.values())) else "partial"] += 1
+        pushed, (n, ms) = self.LCDdisplay.pushed, self.LCDdisplay.last_push
+        print("LCD frames:", " ".join(f"{key}={value}" for key, value in self.frames.items()),
+              f"| pushed {n} bytes in {ms} ms (mean {pushed['bytes']//max(1, pushed['frames'])} bytes, {pushed['ms']/max(1, pushed['frames']):.1f} ms per frame)")
+
+    def frame_stamp(self) -> bytes: # What the LCD shows of the first launch (after update_LCD()), to check at boot whether the saved frame matches the cache
+        l = self.LL2.launches[0] if len(self.LL2.launches) != 0 else Launch()
+        return repr([l.id, self.flag_skipped != l.id] + [getattr(l, name) for name in sorted(REGIONS)]).encode()
+
+    def save_frame(self): # Stores the LCD frame for the next boot (see __init__()), if it changed since the last write
+        if self.frame_pending is None: return
+        self.LCDdisplay.save_frame(self.frame_pending)
+        self.frame_pending = None
+
+    def draw_info(self, l: Launch): # Flag, rocket, payload and pad
+        c = int(self.LCDdisplay.width/2) # Center pixel
+        self.LCDdisplay.fill_rect(0, 0, self.LCDdisplay.width, self.LCDdisplay.height - STATUS_HEIGHT - 1 - TIME_HEIGHT, self.LCDdisplay.BLACK)
+        # Flag
+        country = l.country
+        flag_shown = country is not None and self.flag[0] == country # Downloaded by fetch_flag(), only when the country changed
+        if country is not None and not flag_shown and self.LL2.online:
+            scheduler.reschedule(self.task_flag, 0) # Drawn without flag for now
+        if flag_shown:
+            try:
+                self.LCDdisplay.show_image_PNG(0, 0, self.flag[1])
+            except Exception as e: # Not a valid PNG
+                log_exc(e)
+                self.flag = (None, None)
+                flag_shown = False
+        self.flag_skipped = l.id if country is not None and not flag_shown else None
+        # Rocket name
+        row = 4
+        name = wrap_text(l.rocket_name or "", 20 - 3*flag_shown).split("\n")
+        for part in name:
+            self.LCDdisplay.text(part, c + 12*flag_shown - len(part)*4, row, self.LCDdisplay.WHITE)
+            row += 9
+        row = max(row, 15) # Flag is 15 pixels high
+        self.LCDdisplay.hline(0, row, self.LCDdisplay.width, self.LCDdisplay.WHITE)
+        # Payload name
+        row += 8
+        name = wrap_text(l.payload_name or "", 20).split("\n")
+        for part in name:
+            self.LCDdisplay.text(part, c - len(part)*4, row, self.LCDdisplay.GREEN)
+            row += 9
+        # Pad name
+        row += 8
+        pad = l.pad
+        if pad is None: pad = ""
+        loc = l.pad_location
+        if loc is None: loc = ""
+        name = pad + (", " if pad else "") + loc
+        for part in wrap_text(name).split("\n"):
+            self.LCDdisplay.text(part, c - len(part)*4, row, self.LCDdisplay.color(128, 128, 128))
+            row += 9
+
+    def draw_status(self, l: Launch): # Status bar at the bottom
+        c = int(self.LCDdisplay.width/2) # Center pixel
+        status_id = l.status_id
+        status_text = l.status_name if l.status_name is not None else "Status Unknown"
+        if len(status_text) > 20: status_text = l.status_abbrev
+        colors = {
+            1: self.LCDdisplay.GREEN, # Go for launch
+            5: self.LCDdisplay.color(0, 0, 128), # Hold
+            6: self.LCDdisplay.WHITE, # In flight
+            9: self.LCDdisplay.GREEN, # Payload deployed
+            3: self.LCDdisplay.GREEN, # Launch successful
+            4: self.LCDdisplay.color(160, 0, 0), # Launch failure
+            7: self.LCDdisplay.RED, # Launch partial failure
+        } # 2: TBD, 8: TBC
+        col = colors.get(status_id, self.LCDdisplay.BLACK)
+        R, G, B = self.LCDdisplay.RGB(col)
+        brightness = 1e-4*(456*R*R + 896*G*G + 174*B*B)**.5 # From https://stackoverflow.com/a/24213274
+        anticol = self.LCDdisplay.WHITE if brightness < 0.5 else self.LCDdisplay.BLACK
+        self.LCDdisplay.fill_rect(0, self.LCDdisplay.height - STATUS_HEIGHT, self.LCDdisplay.width, STATUS_HEIGHT, col)
+        self.LCDdisplay.hline(0, self.LCDdisplay.height - STATUS_HEIGHT - 1, self.LCDdisplay.width, self.LCDdisplay.WHITE)
+        self.LCDdisplay.text(status_text, c - len(status_text)*4, self.LCDdisplay.height - 8 - int(STATUS_HEIGHT/2 - 4), anticol)
+
+    def draw_time(self, l: Launch): # Launch time, above the status bar
+        c = int(self.LCDdisplay.width/2) # Center pixel
+        top = self.LCDdisplay.height - STATUS_HEIGHT - 1 - TIME_HEIGHT
+        self.LCDdisplay.fill_rect(0, top, self.LCDdisplay.width, TIME_HEIGHT, self.LCDdisplay.BLACK)
+        if l.net_epoch is None: return
+        try:
+            dst = isdst_CET(l.net_epoch)
+        except ValueError as e:
+            log_exc(e)
+            self.show_CET = dst = False
+        TZ = ("CEST" if dst else "CET") if self.show_CET else "UTC"
+        T = int(l.net_epoch) + self.show_CET*(7200 if dst else 3600)
+        weekday = (T // 86400 + 4) % 7
+        hour = T // 3600 % 24
+        minute = T // 60 % 60
+        second = T % 60
+        weekdays = ["Zo", "Ma", "Di", "Wo", "Do", "Vr", "Za"]
+        time_text = f":{second:02d}"*bool(second)
+        time_text = f"{weekdays[weekday]}, {hour}:{minute:02d}{time_text} {TZ}"
+        self.LCDdisplay.text(time_text, c - len(time_text)*4, top + TIME_HEIGHT - 8 - int(TIME_HEIGHT/2 - 4), self.LCDdisplay.WHITE)
+
     def show(self): # Runs every second
         gc.collect()
         print(gc.mem_alloc(), gc.mem_free())
@@ -54,6 +224,9 @@ class CountdownClock:
         if self.LL2.NETepoch in specials.keys():
             self.segmentdisplay.display_message(specials[self.LL2.NETepoch])
             return
+        if time.time() < self.LL2.lastrequesttime: # Clock not set yet (by NTP, once connected)
+            self.segmentdisplay.display_message("CONNECT..")
+            return
         dt = self.LL2.dt_tuple
         tstr = f"{dt[1]:2d}.{dt[2]:02d}.{dt[3]:02d}"
         if dt[1] == 0: # <1h
@@ -68,100 +241,21 @@ class CountdownClock:
         else: self.segmentdisplay.flash(False)
         
         # LCD display
-        if self.LCD_last_update < self.LL2.lastrequesttime: # Only update LCD when LL2 was updated.
-            self.LCD_last_update = max(self.LL2.lastrequesttime, time.time())
-            l = self.LL2.launches[0] if len(self.LL2.launches) != 0 else {}
-            c = int(self.LCDdisplay.width/2) # Center pixel
-            
-            self.LCDdisplay.fill(self.LCDdisplay.BLACK)
-            # Flag
-            country = l.get("country")
-            flag_shown = country is not None
-            if flag_shown:
-                try:
-                    gc.collect()
-                    response = krequests.get(f"https://raw.githubusercontent.com/yammadev/flag-icons/bd4bcf4f4829002cd10416029e05ba89a7554af4/png/{country.upper()}.png", recvsize=2048)[1]
-                    self.LCDdisplay.show_image_PNG(0, 0, response)
-                except Exception as e:
-                    log_exc(e)
-                    flag_shown = False
-                    connect()
-            # Rocket name
-            row = 4
-            name = wrap_text(l.get("rocket_name", ""), 20 - 3*flag_shown).split("\n")
-            for part in name:
-                self.LCDdisplay.text(part, c + 12*flag_shown - len(part)*4, row, self.LCDdisplay.WHITE)
-                row += 9
-            row = max(row, 15) # Flag is 15 pixels high
-            self.LCDdisplay.hline(0, row, self.LCDdisplay.width, self.LCDdisplay.WHITE)
-            # Payload name
-            row += 8
-            name = wrap_text(l.get("payload_name", ""), 20).split("\n")
-            for part in name:
-                self.LCDdisplay.text(part, c - len(part)*4, row, self.LCDdisplay.GREEN)
-                row += 9
-            # Pad name
-            row += 8
-            pad = l.get("pad")
-            if pad is None: pad = ""
-            loc = l.get("pad_location")
-            if loc is None: loc = ""
-            name = pad + (", " if pad else "") + loc
-            for part in wrap_text(name).split("\n"):
-                self.LCDdisplay.text(part, c - len(part)*4, row, self.LCDdisplay.color(128, 128, 128))
-                row += 9
-
-            # Status
-            status = l.get("status", {})
-            status_id = status.get("id")
-            status_text = status.get("name", "Status Unknown")
-            if len(status_text) > 20: status_text = status.get("abbrev")
-            colors = {
-                1: self.LCDdisplay.GREEN, # Go for launch
-                5: self.LCDdisplay.color(0, 0, 128), # Hold
-                6: self.LCDdisplay.WHITE, # In flight
-                9: self.LCDdisplay.GREEN, # Payload deployed
-                3: self.LCDdisplay.GREEN, # Launch successful
-                4: self.LCDdisplay.color(160, 0, 0), # Launch failure
-                7: self.LCDdisplay.RED, # Launch partial failure
-            } # 2: TBD, 8: TBC
-            col = colors.get(status_id, self.LCDdisplay.BLACK)
-            R, G, B = self.LCDdisplay.RGB(col)
-            brightness = 1e-4*(456*R*R + 896*G*G + 174*B*B)**.5 # From https://stackoverflow.com/a/24213274
-            anticol = self.LCDdisplay.WHITE if brightness < 0.5 else self.LCDdisplay.BLACK
-            status_height = 16
-            self.LCDdisplay.fill_rect(0, self.LCDdisplay.height - status_height, self.LCDdisplay.width, status_height, colors.get(status_id, self.LCDdisplay.BLACK))
-            self.LCDdisplay.hline(0, self.LCDdisplay.height - status_height - 1, self.LCDdisplay.width, self.LCDdisplay.WHITE)
-            self.LCDdisplay.text(status_text, c - len(status_text)*4, self.LCDdisplay.height - 8 - int(status_height/2 - 4), anticol)
-
-            # Launch time
-            try:
-                dst = isdst_CET(l["net_epoch"])
-            except ValueError as e:
-                log_exc(e)
-                self.show_CET = dst = False
-            TZ = ("CEST" if dst else "CET") if self.show_CET else "UTC"
-            T = l["net_epoch"] + self.show_CET*(7200 if dst else 3600)
-            weekday = (int(T // 86400) + 4) % 7
-            hour = int( T // 3600 ) % 24
-            minute = int( T // 60 ) % 60
-            second = T % 60
-            weekdays = ["Zo", "Ma", "Di", "Wo", "Do", "Vr", "Za"]
-            time_height = 10
-            time_text = f":{second:02d}"*bool(second)
-            time_text = f"{weekdays[weekday]}, {hour}:{minute:02d}{time_text} {TZ}"
-            self.LCDdisplay.fill_rect(0, self.LCDdisplay.height - status_height - 1 - time_height, self.LCDdisplay.width, time_height, self.LCDdisplay.BLACK)
-            self.LCDdisplay.text(time_text, c - len(time_text)*4, self.LCDdisplay.height - status_height - 1 - 8 - int(time_height/2 - 4), self.LCDdisplay.WHITE)
-
-            self.LCDdisplay.show()
+        if self.LL2.changes: # Only update LCD when LL2 stored changes (not when a request starts, or fails)
+            self.update_LCD(self.LL2.take_changes())
         
         ## Light level
         self.brightness_update()
+        if "countdown" not in dict(self.boot.phases): # First countdown of this boot
+            self.boot.mark("countdown")
+            if self.LL2.online: self.log_boot() # Otherwise, go_online() logs
 
 
 if __name__ == "__main__":
     try:
         display = CountdownClock(show_CET=True)
+        scheduler.every(600, scheduler.report, name="report", priority=-1, delay=600) # Task statistics
+        asyncio.run(scheduler.run())
     except KeyboardInterrupt:
         exit()
     except Exception as e:
@@ -0,0 +1,62 @@
+import time
+
+from budget import DETAILS, UPCOMING
+
+
+class RequestQueue:
+    def __init__(self):
+        """ Pending LL2 requests as data: [kind, ID, priority, time], where <kind> is a request class of budget.py
+            (UPCOMING or DETAILS), <ID> the launch of a DETAILS request (None for UPCOMING) and <time> when it was queued.
+            A request is keyed by (kind, ID), so queueing a request that is already pending does not add another one:
+            they collapse into the pending one, unless the new one has a higher priority. Since every UPCOMING request has the
+            same key, the refreshes queued after every detailed request merge into a single one.
+            The next request is the one with the highest priority, and of those the one queued first.
+        """
+        self.entries = {} # (kind, ID): [kind, ID, priority, time, n], where n orders requests queued in the same second
+        self.n = 0
+
+    def push(self, kind: int, ID=None, priority: int = 0, now=None) -> bool: # Whether a new request was queued
+        key = (kind, ID)
+        entry = self.entries.get(key)
+        if entry is not None and entry[2] >= priority: # Collapse into the pending request
+            return False
+        self.entries[key] = [kind, ID, priority, time.time() if now is None else now, self.n] # Replaces a pending request of lower priority
+        self.n += 1
+        return entry is None
+
+    def peek(self) -> tuple | None: # (kind, ID) of the next request, or None if the queue is empty
+        best = None
+        for entry in self.entries.values():
+            if best is None or entry[2] > best[2] or entry[2] == best[2] and (entry[3], entry[4]) < (best[3], best[4]):
+                best = entry
+        return None if best is None else (best[0], best[1])
+
+    def pop(self) -> tuple | None:
+        key = self.peek()
+        if key is not None: del self.entries[key]
+        return key
+
+    def batch(self, kind: int, n: int) -> list: # IDs of the first <n> pending requests of <kind>, in queue order
+        return [entry[1] for entry in self.to_list() if entry[0] == kind][:n]
+
+    def remove(self, kind: int, ID=None):
+        self.entries.pop((kind, ID), None)
+
+    def discard(self, keep) -> int: # Removes the DETAILS requests of the launch IDs for which keep(ID) is False
+        keys = [key for key in self.entries if key[0] == DETAILS and not keep(key[1])]
+        for key in keys: del self.entries[key]
+        return len(keys)
+
+    def __len__(self): return len(self.entries)
+
+    def __contains__(self, key): return key in self.entries
+
+    def to_list(self) -> list: # To be stored alongside the cache, in queue order
+        return [entry[:4] for entry in sorted(self.entries.values(), key=lambda entry: (-entry[2], entry[3], entry[4]))]
+
+    @classmethod
+    def from_list(cls, entries: list):
+        queue = cls()
+        for kind, ID, priority, t in entries:
+            if kind in (UPCOMING, DETAILS): queue.push(kind, ID, priority, t)
+        return queue
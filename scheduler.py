@@ -0,0 +1,146 @@
+import asyncio
+
+from utils import log_exc, ticks_add, ticks_diff, ticks_ms
+
+
+class Task:
+    """ A function that a Scheduler runs once, or every <period> ms, with statistics of its runs (all times in ms). """
+    __slots__ = ("name", "func", "args", "period", "priority", "deadline", "due", "running",
+                 "runs", "run_total", "run_max", "late_total", "late_max", "missed", "overruns", "errors")
+
+    def __init__(self, name, func, args, period, priority, deadline, due):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.period = period # None for a one-shot task
+        self.priority = priority # Of the tasks that are due, the one with the highest priority runs first
+        self.deadline = deadline # A run that cannot start within <deadline> ms after it was due is skipped (None: never skip)
+        self.due = due # ticks_ms() when the task should run next
+        self.running = False # Whether a coroutine of the task is still running
+        self.runs = 0
+        self.run_total = self.run_max = 0 # Duration of the runs (for a coroutine: until it finished)
+        self.late_total = self.late_max = 0 # How long after being due the runs started
+        self.missed = 0 # Runs skipped because of the deadline, or because the previous run took longer than the period
+        self.overruns = 0 # Runs skipped because the coroutine of the previous run was still running
+        self.errors = 0
+
+    def record(self, late, duration):
+        self.runs += 1
+        self.late_total += late
+        self.late_max = max(self.late_max, late)
+        self.run_total += duration
+        self.run_max = max(self.run_max, duration)
+
+    def stats(self) -> dict:
+        n = max(1, self.runs)
+        return {"runs": self.runs, "run_avg": self.run_total//n, "run_max": self.run_max, "late_avg": self.late_total//n,
+                "late_max": self.late_max, "missed": self.missed, "overruns": self.overruns, "errors": self.errors}
+
+
+class Scheduler:
+    """ Runs periodic and one-shot tasks from a single asyncio task (run()), instead of a machine.Timer per job.
+        Due tasks run one at a time, highest priority first. A function returning a coroutine (e.g. an async def method)
+        is run as its own asyncio task, so its I/O does not hold up the other tasks. Errors are logged and counted.
+        All times in the API are in seconds.
+    """
+    def __init__(self):
+        self.tasks = []
+        self.wake = asyncio.Event() # Set when a task is added, to wake up run()
+
+    def every(self, period, func, *args, name=None, priority=0, deadline=None, delay=0) -> Task: # Runs func(*args) every <period> seconds, the first time after <delay> seconds
+        return self.add(Task(name or getattr(func, "__name__", "task"), func, args, int(period*1000), priority,
+                             None if deadline is None else int(deadline*1000), ticks_add(ticks_ms(), int(delay*1000))))
+
+    def after(self, delay, func, *args, name=None, priority=0, deadline=None) -> Task: # Runs func(*args) once, after <delay> seconds
+        return self.add(Task(name or getattr(func, "__name__", "task"), func, args, None, priority,
+                             None if deadline is None else int(deadline*1000), ticks_add(ticks_ms(), int(delay*1000))))
+
+    def add(self, task: Task) -> Task:
+        self.tasks.append(task)
+        self.wake.set()
+        return task
+
+    def cancel(self, task: Task):
+        if task in self.tasks: self.tasks.remove(task)
+
+    def reschedule(self, task: Task, delay) -> Task: # Makes <task> due after <delay> seconds, adding it again if it was a one-shot task that ran
+        task.due = ticks_add(ticks_ms(), int(delay*1000))
+        if task not in self.tasks: self.tasks.append(task)
+        self.wake.set()
+        return task
+
+    @staticmethod
+    def waiting(task: Task) -> bool: # A one-shot task that was rescheduled while its coroutine runs, which waits for it to finish
+        return task.running and task.period is None
+
+    def next_task(self, now) -> Task | None: # The due task with the highest priority (and of those the earliest due), or None
+        best = None
+        for task in self.tasks:
+            if ticks_diff(now, task.due) < 0 or self.waiting(task): continue
+            if best is None or task.priority > best.priority or task.priority == best.priority and ticks_diff(task.due, best.due) < 0:
+                best = task
+        return best
+
+    async def run(self):
+        while True:
+            now = ticks_ms()
+            task = self.next_task(now)
+            if task is None: # Sleep until the next task is due, or a task was added
+                wait = min([max(0, ticks_diff(task.due, now)) for task in self.tasks if not self.waiting(task)], default=1000)
+                self.wake.clear()
+                try:
+                    await asyncio.wait_for(self.wake.wait(), wait/1000)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.dispatch(task, now)
+            await asyncio.sleep(0) # Let the coroutines of tasks run in between
+
+    def dispatch(self, task: Task, now):
+        late = ticks_diff(now, task.due)
+        if task.period is None:
+            self.tasks.remove(task)
+        else:
+            task.due = ticks_add(task.due, task.period)
+            if ticks_diff(task.due, now) <= 0: # Fell behind by more than a period: skip the runs in between
+                skipped = ticks_diff(now, task.due)//task.period + 1
+                task.missed += skipped
+                task.due = ticks_add(task.due, skipped*task.period)
+        if task.running:
+            task.overruns += 1
+            return
+        if task.deadline is not None and late > task.deadline:
+            task.missed += 1
+            return
+        start = ticks_ms()
+        try:
+            result = task.func(*task.args)
+        except Exception as e:
+            task.errors += 1
+            log_exc(e)
+            result = None
+        if hasattr(result, "send"): # Coroutine
+            task.running = True
+            asyncio.create_task(self.finish(task, result, late, start))
+        else:
+            task.record(late, ticks_diff(ticks_ms(), start))
+
+    async def finish(self, task: Task, coroutine, late, start):
+        try:
+            await coroutine
+        except Exception as e:
+            task.errors += 1
+            log_exc(e)
+        task.running = False
+        task.record(late, ticks_diff(ticks_ms(), start))
+        self.wake.set() # In case the task was rescheduled while it ran
+
+    def stats(self) -> dict: # Statistics of every task, by name
+        return {task.name: task.stats() for task in self.tasks}
+
+    def report(self): # Prints the statistics of every task
+        for name, stats in self.stats().items():
+            print(name, " ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+scheduler = Scheduler()
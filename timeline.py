@@ -0,0 +1,42 @@
+import heapq
+
+
+CROSSING, EXPIRY = 0, 1 # Kinds of instant
+
+
+class Timeline:
+    def __init__(self, thresholds: list[int]):
+        """ The coming instants (unix time) at which LL2Sync has something to do, as a min-heap of (time, kind, threshold):
+            the crossings of the <thresholds> (seconds until launch, <0 is T+) by the countdown of the next launch, and the
+            expiry of that launch (see LL2Sync.t_min). They are only computed again by plan() when those NETs change, so
+            the time until the next instant can be slept away instead of checking every few seconds.
+            The most recently crossed threshold does not count again until another one is crossed (e.g. after a small slip).
+        """
+        self.thresholds = thresholds
+        self.heap = []
+        self.key = None # (NET, expiry) of the current instants
+        self.last_crossed = None
+        self.crossings = 0 # Number of threshold crossings that counted
+
+    def plan(self, net, expiry, now) -> bool: # Computes the instants for a launch at <net> that expires at <expiry>, if either changed
+        if (net, expiry) == self.key: return False
+        self.key = (net, expiry)
+        self.heap = [(net - threshold, CROSSING, threshold) for threshold in self.thresholds if net and net - threshold > now]
+        if expiry: self.heap.append((expiry, EXPIRY, None))
+        heapq.heapify(self.heap)
+        return True
+
+    def next(self): # Time of the earliest instant, or None
+        return self.heap[0][0] if self.heap else None
+
+    def crossed(self, now) -> bool: # Removes the instants up to <now>, and returns whether a threshold was crossed
+        crossed = False
+        while self.heap and self.heap[0][0] <= now:
+            t, kind, threshold = heapq.heappop(self.heap)
+            if kind == CROSSING and threshold != self.last_crossed:
+                self.last_crossed = threshold
+                self.crossings += 1
+                crossed = True
+        return crossed
+
+    def __len__(self): return len(self.thresholds)
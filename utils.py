@@ -1,7 +1,20 @@
-from machine import Timer
+import gc
+import os
 import sys
 import time
 
+try:
+    print_exception = sys.print_exception
+except AttributeError: # CPython (e.g. for simulations on a host)
+    import traceback
+    def print_exception(e, file=None): traceback.print_exception(type(e), e, e.__traceback__, file=file or sys.stdout)
+try:
+    from time import ticks_add, ticks_diff, ticks_ms
+except ImportError: # CPython
+    def ticks_ms(): return int(time.monotonic()*1000)
+    def ticks_add(ticks, delta): return ticks + delta
+    def ticks_diff(a, b): return a - b
+
 
 ## EXCEPTION HANDLING
 def log_exc(e):
@@ -14,20 +27,26 @@ def log_exc(e):
     # Add this error to the log
     with open("err.log", "w") as logfile:
         logfile.write(f"{unix_to_iso8601(time.time())}\n")
-        sys.print_exception(e, logfile)
-        sys.print_exception(e)
+        print_exception(e, logfile)
+        print_exception(e)
         logfile.write("-"*16 + "\n")
         for line in lines: logfile.write(line)
 
-def wrap_timer(func, *args, **kwargs):
-    """ Logs any errors that occur, which otherwise get hidden by a Timer. """
+## FILES
+def replace_file(path: str, write): # Calls write(f) for <path>.tmp, which then replaces <path>, so a power cut while writing leaves the previous file intact
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
     try:
-        func(*args, **kwargs)
-    except Exception as e:
-        log_exc(e)
-        raise e
+        os.rename(tmp, path)
+    except OSError: # File system that does not replace an existing file. If we lose power now, only the complete <tmp> is left
+        os.remove(path)
+        os.rename(tmp, path)
 
 ## PRINTING
+def print_mem(): # Prints the allocated and free bytes of the heap (only available on MicroPython)
+    if hasattr(gc, "mem_alloc"): print(gc.mem_alloc(), gc.mem_free())
+
 def wrap_text(text: str, line_length: int = 20): # LCD screen is 20 characters wide
     lines = ['']
     for word in text.split():
@@ -44,9 +63,9 @@ def isdst_CET(unix): # Adapted from https://github.com/micropython/micropython-l
     year = time.gmtime(unix)[0]
     if not 2000 <= year < 2100: raise ValueError("isdst() was only implmented for years in range [2000; 2100)")
     day = 31 - (5 * year // 4 + 4) % 7  # last Sunday of March
-    beg = time.mktime((year, 3, day, 1, 0, 0, 0, 0))
+    beg = time.mktime((year, 3, day, 1, 0, 0, 0, 0, 0))
     day = 31 - (5 * year // 4 + 1) % 7  # last Sunday of October
-    end = time.mktime((year, 10, day, 1, 0, 0, 0, 0))
+    end = time.mktime((year, 10, day, 1, 0, 0, 0, 0, 0))
     return beg <= unix < end
 
 def unix_to_iso8601(unix: int) -> str:
@@ -56,8 +75,36 @@ def unix_to_iso8601(unix: int) -> str:
 def iso8601_to_unix(iso: str) -> int:
     if iso[19] != "Z": raise ValueError("Must receive ISO8601 time in UTC")
     year, month, day, hour, minute, second = int(iso[0:4]), int(iso[5:7]), int(iso[8:10]), int(iso[11:13]), int(iso[14:16]), int(iso[17:19])
-    return time.mktime((year, month, day, hour, minute, second, 0, 0)) # Last two zeroes are day of week and day of year, but ignore those
+    return time.mktime((year, month, day, hour, minute, second, 0, 0, 0)) # Last zeroes are day of week, day of year and DST (needed by CPython), but ignore those
+
+class PhaseTimer:
+    """ Durations (ms) of consecutive phases, e.g. of booting: each mark(name) ends the phase <name>, which started at the
+        previous mark (or at the creation of the PhaseTimer).
+    """
+    def __init__(self):
+        self.start = self.last = ticks_ms()
+        self.phases = [] # (name, ms)
+
+    def mark(self, name: str) -> int: # Ends phase <name>, and returns its duration
+        now = ticks_ms()
+        self.phases.append((name, ticks_diff(now, self.last)))
+        self.last = now
+        return self.phases[-1][1]
+
+    def summary(self) -> str:
+        return " ".join(f"{name}={ms}" for name, ms in self.phases) + f" total={ticks_diff(self.last, self.start)} ms"
+
+    def log(self, path: str = "boot.log", keep: int = 50): # Prints the summary, and puts it on top of the <keep> most recent ones in <path>
+        print("Boot phases:", self.summary())
+        try:
+            with open(path, "r") as logfile:
+                lines = [line for i, line in enumerate(logfile) if i < keep - 1]
+        except OSError:
+            lines = []
+        with open(path, "w") as logfile:
+            logfile.write(f"{unix_to_iso8601(time.time())} {self.summary()}\n")
+            for line in lines: logfile.write(line)
 
 def schedule(t, f, *args, **kwargs): # Run function <f> after <t> seconds
-    timer = Timer()
-    timer.init(mode=Timer.ONE_SHOT, period=int(t*1000), callback=lambda timer: wrap_timer(f, *args, **kwargs))
+    from scheduler import scheduler # Imported here, because scheduler imports this module
+    return scheduler.after(t, lambda: f(*args, **kwargs), name=getattr(f, "__name__", "schedule"))
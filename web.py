@@ -1,14 +1,20 @@
+import asyncio
 import errno
 import json
 import network
 import ntptime
-import requests
+import select
+import socket
+import struct
 import time
-from machine import Pin
+from machine import Pin, RTC
 
 from utils import log_exc
 
 
+NTP_DELTA = 2208988800 if time.gmtime(0)[0] == 1970 else 3155673600 # Seconds from the NTP epoch (1900) to that of time
+
+
 def get_credentials(file: str = "wlan.json"):
     """ Load WiFi credentials from a JSON file.
         The JSON file can contain either:
@@ -22,18 +28,62 @@ def get_credentials(file: str = "wlan.json"):
     return {c["ssid"]: c.get("password", None) for c in cred}
 
 
-def internet_check():
-    """ Check if an internet connection is available by performing a simple HTTP request. """
+def blocking(steps): # Runs a generator like connecting() to the end, sleeping as long as it yields. Returns its return value.
+    try:
+        while True: time.sleep(next(steps))
+    except StopIteration as e:
+        return e.value
+
+def waiting(s, event: int, timeout: float, dt: float = 0.05):
+    """ Generator like connecting(), that yields <dt> until non-blocking socket <s> is ready for <event> (select.POLLIN or
+        select.POLLOUT). Returns whether it became ready within <timeout> seconds.
+    """
+    poller = select.poll()
+    poller.register(s, event)
+    for _ in range(int(timeout/dt)):
+        for entry in poller.poll(0):
+            return not entry[1] & (select.POLLERR | select.POLLHUP)
+        yield dt
+    return False
+
+
+def internet_check(): return blocking(internet_checking())
+
+def internet_checking(host: str = "www.google.com", timeout: float = 3.):
+    """ Generator like connecting(), that checks if an internet connection is available by connecting to <host>:80.
+        Returns whether that succeeded within <timeout> seconds. Only the DNS lookup blocks (up to its own timeout).
+    """
+    s = None
     try:
-        response = requests.get("http://www.google.com")
-        response.close()
-        return True
-    except Exception:
+        addr = socket.getaddrinfo(host, 80)[0][-1]
+        s = socket.socket()
+        s.setblocking(False)
+        try:
+            s.connect(addr)
+        except OSError as e:
+            if e.errno != errno.EINPROGRESS: return False
+        return (yield from waiting(s, select.POLLOUT, timeout))
+    except (OSError, IndexError):
         return False
+    finally:
+        if s is not None: s.close()
 
 
 def connect(threshold_db: int = 100, credfile: str = "wlan.json", timeout: float = 10.) -> str|None:
+    """ Connect to the strongest available WiFi network based on signal strength (see connecting()). Blocks until done. """
+    return blocking(connecting(threshold_db, credfile, timeout))
+
+async def connect_async(threshold_db: int = 100, credfile: str = "wlan.json", timeout: float = 10.) -> str|None:
+    """ connect() for asyncio: other tasks (like the countdown) keep running while waiting for a network. """
+    steps = connecting(threshold_db, credfile, timeout)
+    try:
+        while True: await asyncio.sleep(next(steps))
+    except StopIteration as e:
+        return e.value
+
+def connecting(threshold_db: int = 100, credfile: str = "wlan.json", timeout: float = 10.):
     """ Connect to the strongest available WiFi network based on signal strength.
+        Generator that yields the number of seconds to wait whenever it waits, which is up to connect() or connect_async().
 
         Args:
             threshold_db (int): Signal strength difference threshold in dB to consider switching.
@@ -50,8 +100,12 @@ def connect(threshold_db: int = 100, credfile: str = "wlan.json", timeout: float
     wlan.active(True)
 
     credentials = get_credentials(credfile)
+    if wlan.isconnected() and wlan.status('rssi') + abs(threshold_db) >= 0: # No network can be that much stronger (RSSI <= 0 dBm)
+        print(f"Already connected to {wlan.config('ssid')}, not scanning.")
+        return wlan.ifconfig()[0]
+    yield 0 # Lets the countdown update first, since the scan blocks for a few seconds
     available_networks = wlan.scan()
-    
+
     # Put networks that require authentication (bool(x[4])) first, then sort by signal strength (RSSI = x[3]).
     # This way, we first try networks that require passwords which we might have in <credfile>, and only then
     # do we try open networks (because they often don't work as they require some form of login anyway).
@@ -78,7 +132,7 @@ def connect(threshold_db: int = 100, credfile: str = "wlan.json", timeout: float
         dt = 0.2
         for j in range(int(timeout/dt)): # Wait up to 10 seconds
             if wlan.isconnected():
-                if not internet_check() and authmode == 0:
+                if authmode == 0 and not (yield from internet_checking()):
                     print(f'Connected to {ssid}, but no internet access.')
                     wlan.disconnect()
                     break
@@ -86,11 +140,11 @@ def connect(threshold_db: int = 100, credfile: str = "wlan.json", timeout: float
                     ip = wlan.ifconfig()[0]
                     print(f'Connected to {ssid} with IP {ip}')
                     pico_led.on()
-                    setUTCtime()
+                    yield from settingUTCtime()
                     pico_led.off()
                     return ip
             pico_led.toggle()
-            time.sleep(dt)
+            yield dt
 
     if wlan.isconnected():
         print(f"Already connected to sufficiently strong WIFI network {wlan.config('ssid')}.")
@@ -100,12 +154,27 @@ def connect(threshold_db: int = 100, credfile: str = "wlan.json", timeout: float
         print("No suitable networks found or connection failed.")
         return None
 
-def setUTCtime():
-    try: # Fetch and set the correct UTC time
-        ntptime.settime()
+def setUTCtime(): blocking(settingUTCtime())
+
+def settingUTCtime(timeout: float = 1.):
+    """ Generator like connecting(), that sets the RTC to the UTC time of the NTP server (ntptime.host), like
+        ntptime.settime() but without blocking while waiting for the answer. Gives up after <timeout> seconds.
+    """
+    s = None
+    try:
+        addr = socket.getaddrinfo(ntptime.host, 123)[0][-1]
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setblocking(False)
+        query = bytearray(48)
+        query[0] = 0x1B # Version 3, client mode
+        s.sendto(query, addr)
+        if not (yield from waiting(s, select.POLLIN, timeout)): return # Timed out: the time is set at the next connect
+        tm = time.gmtime(struct.unpack("!I", s.recv(48)[40:44])[0] - NTP_DELTA) # Transmit timestamp (seconds)
+        RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
     except Exception as e:
-        if e.errno != errno.ETIMEDOUT:
-            log_exc(e)
+        log_exc(e)
+    finally:
+        if s is not None: s.close()
 
 if __name__ == "__main__":
     try: